@@ -0,0 +1,72 @@
+# analytics.py
+from datetime import datetime, timezone
+
+from ttl_cache import TTLCache
+
+# Computed dashboards, keyed by (user_id, write_version)
+_cache = TTLCache(maxsize=1024)
+
+
+def get_write_version(scheduler, user_id):
+    """A user's write counter and last write time (UTC), bumped by task triggers"""
+    with scheduler.connect_db(user_id) as conn:
+        row = conn.execute(
+            'SELECT write_version, last_write_at FROM user_versions WHERE user_id = ?', (user_id,)
+        ).fetchone()
+    if row is None:
+        return 0, None
+    last_write_at = datetime.strptime(row[1], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return row[0], last_write_at
+
+
+def compute_analytics(scheduler, user_id):
+    """Dashboard chart series from one pass over labeled tasks plus the aggregates"""
+    accuracy = {'labels': [], 'predicted': [], 'actual': []}
+    difficulty = []
+    with scheduler.connect_db(user_id) as conn:
+        for course, predicted_time, actual_time, task_difficulty in conn.execute('''
+            SELECT course, predicted_time, actual_time, difficulty
+            FROM all_tasks
+            WHERE user_id = ? AND actual_time IS NOT NULL
+            ORDER BY created_at DESC, id DESC
+        ''', (user_id,)):
+            accuracy['labels'].append(course)
+            accuracy['predicted'].append(predicted_time)
+            accuracy['actual'].append(actual_time)
+            difficulty.append({'x': int(task_difficulty), 'y': float(actual_time)})
+
+        totals = conn.execute(
+            'SELECT sum_actual_time, sum_available_time FROM user_stats WHERE user_id = ?', (user_id,)
+        ).fetchone() or (0.0, 0.0)
+        task_types = conn.execute('''
+            SELECT task_type, sum_actual_time / labeled_count FROM user_task_type_stats
+            WHERE user_id = ? AND labeled_count > 0
+            ORDER BY task_type
+        ''', (user_id,)).fetchall()
+
+    return {
+        'accuracy': accuracy,
+        'utilization': {
+            'used': float(totals[0]),
+            'available': float(totals[1]),
+        },
+        'taskType': {
+            'labels': [task_type for task_type, _ in task_types],
+            'data': [mean for _, mean in task_types],
+        },
+        'difficulty': {
+            'data': difficulty,
+        },
+    }
+
+
+def get_analytics(scheduler, user_id, version=None):
+    """Analytics for a user, reusing the last result until the user writes again"""
+    if version is None:
+        version, _ = get_write_version(scheduler, user_id)
+    key = (scheduler.db_path, user_id, version)
+    data = _cache.get(key)
+    if data is None:
+        data = compute_analytics(scheduler, user_id)
+        _cache.put(key, data)
+    return data
@@ -1,20 +1,75 @@
 from flask import Flask, render_template, request, jsonify, redirect, url_for
 from datetime import datetime, date
-from smart_scheduler import SmartScheduler
-import pandas as pd
-from flask import session, flash, g
+from flask import session, flash, g, stream_with_context
 from functools import wraps
 from models import User
+from sweeper import OverdueSweeper, TaskArchiver
+from storage import ShardRouter
+from warmup import Warmup
+from ttl_cache import TTLCache
+from planner import Planner, daily_availability, DEFAULT_HOURS_PER_DAY, DEFAULT_DAY_START
+import analytics
+import csv
+import auth
+import db
+import io
+import metrics
+import os
+import json
+import signal
+import tempfile
  # Change this to a secure secret key
 
+# Storage locations, overridable for deployments and tests
+DB_PATH = os.environ.get('SCHEDULER_DB', 'scheduler.db')
+MODEL_DIR = os.environ.get('SCHEDULER_MODEL_DIR')  # default: model_store.DEFAULT_ARTIFACT_DIR
+TRAINING_DATA = os.environ.get('SCHEDULER_TRAINING_DATA', 'training_data.csv')
+MODEL_BACKEND = os.environ.get('SCHEDULER_BACKEND', 'forest')
+# Days after its deadline a completed task moves to the archive (0 disables;
+# default: smart_scheduler.ARCHIVE_AFTER_DAYS)
+ARCHIVE_DAYS = os.environ.get('SCHEDULER_ARCHIVE_DAYS')
+# Task shards next to SCHEDULER_DB, which also holds users and placements
+SHARD_COUNT = int(os.environ.get('SCHEDULER_SHARDS', '1'))
+# Seconds between checks for a newly saved model version (0 disables)
+RELOAD_INTERVAL = float(os.environ.get('SCHEDULER_RELOAD_INTERVAL', '5'))
+# Set by serve.py, which starts the background threads itself after forking
+PREFORK = os.environ.get('SCHEDULER_PREFORK') == '1'
+# How the ML stack is loaded: 'background' warms up in a thread while routes
+# that don't need it already serve, 'eager' finishes before the import
+# returns, and 'off' leaves it to the caller (serve.py runs it before forking)
+WARMUP_MODE = os.environ.get('SCHEDULER_WARMUP', 'background')
+# Seconds a request that needs the model waits for warm-up before a 503
+WARMUP_WAIT = float(os.environ.get('SCHEDULER_WARMUP_WAIT', '30'))
+
 app = Flask(__name__)
-scheduler = SmartScheduler()
+db.init_app(app)
+metrics.init_app(app)
+router = ShardRouter.from_count(DB_PATH, SHARD_COUNT)
+
+# Modules that pull in pandas, NumPy and scikit-learn, and the objects built
+# from them; all are set by the warm-up
+smart_scheduler = transfer = None
+scheduler = model_store = None
+
+metrics.REGISTRY.gauge('scheduler_model_version', 'Version of the live model',
+                       lambda: (scheduler.model_version or 0) if scheduler else 0)
+metrics.REGISTRY.gauge('scheduler_prediction_cache_hits', 'predict_time cache hits',
+                       lambda: scheduler.prediction_cache.hits if scheduler else 0)
+metrics.REGISTRY.gauge('scheduler_prediction_cache_misses', 'predict_time cache misses',
+                       lambda: scheduler.prediction_cache.misses if scheduler else 0)
 
 # Initialize User model
-user_model = User()
+user_model = User(router=router)
 
 app.secret_key = 'lidi' 
 
+# Upper bound on tasks accepted by one bulk request
+MAX_BULK_TASKS = 1000
+
+# Schedule rows per page (default and maximum)
+SCHEDULE_PAGE_SIZE = 50
+MAX_SCHEDULE_PAGE_SIZE = 500
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -22,15 +77,41 @@ def login_required(f):
             flash('Please log in first.', 'error')
             return redirect(url_for('login'))
         return f(*args, **kwargs)
+    # Lets wait_for_warmup send logged-out visitors on to the login redirect
+    decorated_function.login_required = True
     return decorated_function
 
+# Endpoints that never touch the model or the task shards; they serve during warm-up
+NO_WARMUP_ENDPOINTS = {'index', 'login', 'register', 'logout', 'static', 'healthz', 'readyz',
+                       'metrics_endpoint'}
+
+@app.before_request
+def wait_for_warmup():
+    if request.endpoint in NO_WARMUP_ENDPOINTS or warmup.wait(WARMUP_WAIT):
+        return None
+    view = app.view_functions.get(request.endpoint)
+    if 'user_id' not in session and getattr(view, 'login_required', False):
+        return None  # login_required redirects without touching the model
+    return jsonify(warmup.status()), 503, {'Retry-After': '1'}
+
 @app.before_request
 def load_user():
+    # The signed session carries the identity, so most requests skip the database
     user_id = session.get('user_id')
     if user_id is None:
         g.user = None
+    elif 'username' in session:
+        g.user = (user_id, session['username'], session.get('email'))
     else:
         g.user = user_model.get_user_by_id(user_id)
+        if g.user:
+            session['username'], session['email'] = g.user[1], g.user[2]
+
+def log_in(user_id):
+    """Store the user's identity in the session"""
+    user = user_model.get_user_by_id(user_id)
+    session['user_id'] = user_id
+    session['username'], session['email'] = user[1], user[2]
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -38,12 +119,22 @@ def login():
         username = request.form.get('username')
         password = request.form.get('password')
         
-        user_id = user_model.verify_user(username, password)
+        retry_after = auth.login_throttle.retry_after(username)
+        if retry_after:
+            flash(f'Too many failed attempts. Try again in {retry_after} seconds.', 'error')
+            return render_template('auth/login.html'), 429, {'Retry-After': str(retry_after)}
+        try:
+            user_id = user_model.verify_user(username, password)
+        except auth.Busy:
+            flash('The server is busy. Please try again.', 'error')
+            return render_template('auth/login.html'), 503, {'Retry-After': '1'}
         if user_id:
-            session['user_id'] = user_id
+            auth.login_throttle.record_success(username)
+            log_in(user_id)
             flash('Successfully logged in!', 'success')
             return redirect(url_for('dashboard'))
         
+        auth.login_throttle.record_failure(username)
         flash('Invalid username or password', 'error')
     
     return render_template('auth/login.html')
@@ -55,7 +146,12 @@ def register():
         password = request.form.get('password')
         email = request.form.get('email')
         
-        if user_model.create_user(username, password, email):
+        try:
+            created = user_model.create_user(username, password, email)
+        except auth.Busy:
+            flash('The server is busy. Please try again.', 'error')
+            return render_template('auth/register.html'), 503, {'Retry-After': '1'}
+        if created:
             flash('Registration successful! Please log in.', 'success')
             return redirect(url_for('login'))
         
@@ -69,15 +165,65 @@ def logout():
     flash('You have been logged out.', 'success')
     return redirect(url_for('login'))
 
-# Load and train the model with our dataset
-try:
-    training_data = pd.read_csv('training_data.csv')
-    scheduler.train_model(training_data)
-except Exception as e:
-    print(f"Warning: Could not load training data: {e}")
-    # Generate some sample data if training data is not available
-    training_data = scheduler.generate_sample_data()
-    scheduler.train_model(training_data)
+def import_ml():
+    """Import the modules that pull in pandas, NumPy and scikit-learn"""
+    global smart_scheduler, transfer
+    import smart_scheduler
+    import transfer
+
+def open_scheduler():
+    """Open the task shards, migrating their schema"""
+    global scheduler
+    scheduler = smart_scheduler.SmartScheduler(backend=MODEL_BACKEND, router=router)
+
+def load_model():
+    """Load the saved model, retraining only when the training data has changed"""
+    global model_store
+    from model_store import ModelStore, DEFAULT_ARTIFACT_DIR
+    model_store = ModelStore(MODEL_DIR or DEFAULT_ARTIFACT_DIR)
+    # A failure fails the warm-up: the app never serves without a model
+    model_store.load_or_train(scheduler, TRAINING_DATA)
+
+def start_maintenance():
+    """Start the background jobs that must run in only one process per deployment"""
+    global retrain_worker, overdue_sweeper, task_archiver
+    from model_store import fingerprint_file
+    from retrainer import RetrainWorker
+
+    # Learn from reported completion times in the background
+    if os.environ.get('SCHEDULER_RETRAIN', '1') == '1' and os.path.exists(TRAINING_DATA):
+        retrain_worker = RetrainWorker(scheduler, base_data=TRAINING_DATA, store=model_store,
+                                       fingerprint=fingerprint_file(TRAINING_DATA))
+        retrain_worker.start()
+
+    # Move tasks to 'overdue' as their deadlines pass (or run `manage.py sweep-overdue` from cron)
+    if os.environ.get('SCHEDULER_SWEEP', '1') == '1':
+        overdue_sweeper = OverdueSweeper(scheduler)
+        overdue_sweeper.start()
+
+    # Keep the live tasks table small (or run `manage.py archive-tasks` from cron)
+    archive_days = int(ARCHIVE_DAYS or smart_scheduler.ARCHIVE_AFTER_DAYS)
+    if archive_days > 0:
+        task_archiver = TaskArchiver(scheduler, archive_days)
+        task_archiver.start()
+
+def start_model_reloader():
+    """Start this process's watcher for newly saved model versions"""
+    global model_reloader
+    from reloader import ModelReloader
+
+    if RELOAD_INTERVAL > 0:
+        model_reloader = ModelReloader(scheduler, model_store, RELOAD_INTERVAL)
+        model_reloader.start()
+    return model_reloader
+
+def start_background_jobs():
+    # serve.py starts these per worker, after forking
+    if not PREFORK:
+        start_maintenance()
+        start_model_reloader()
+
+retrain_worker = overdue_sweeper = task_archiver = model_reloader = None
 
 @app.route('/')
 def index():
@@ -97,37 +243,127 @@ def add_task():
                 'difficulty': int(request.form.get('difficulty')),
                 'total_available_time': float(request.form.get('total_available_time')),
                 'deadline_days': int(request.form.get('deadline_days')),
-                'due_date': request.form.get('due_date'),
-                'due_time': request.form.get('due_time', '23:59')
             }
+            task_data['due_date'], task_data['due_time'] = smart_scheduler.parse_due(
+                request.form.get('due_date'), request.form.get('due_time'))
             
             task_id, predicted_time = scheduler.add_task(**task_data)
-            
-            return jsonify({
-                'task_id': task_id,
-                'predicted_time': round(predicted_time, 2)
-            })
         except Exception as e:
             return jsonify({'error': str(e)}), 400
+
+        # The task is committed; from here on only the plan cache is touched
+        replan_cached(session['user_id'], added={
+            'id': task_id,
+            'due_at': f"{task_data['due_date']} {task_data['due_time']}",
+            'hours': predicted_time,
+        })
+        return jsonify({
+            'task_id': task_id,
+            'predicted_time': round(predicted_time, 2)
+        })
     
     return render_template('add_task.html', today=date.today().isoformat())
 
+@app.route('/api/tasks/bulk', methods=['POST'])
+@login_required
+def add_tasks_bulk():
+    payload = request.get_json(silent=True)
+    tasks = payload.get('tasks') if isinstance(payload, dict) else payload
+    if not isinstance(tasks, list) or not tasks:
+        return jsonify({'error': 'Expected a non-empty list of tasks'}), 400
+    if len(tasks) > MAX_BULK_TASKS:
+        return jsonify({'error': f'At most {MAX_BULK_TASKS} tasks per request'}), 413
+
+    try:
+        results = scheduler.add_tasks_bulk(session['user_id'], tasks)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid task data: {e}'}), 400
+
+    return jsonify({
+        'tasks': [
+            {'task_id': task_id, 'predicted_time': round(predicted_time, 2)}
+            for task_id, predicted_time in results
+        ]
+    })
+
+@app.route('/api/tasks/complete', methods=['POST'])
+@login_required
+def complete_tasks_bulk():
+    payload = request.get_json(silent=True)
+    tasks = payload.get('tasks') if isinstance(payload, dict) else payload
+    if not isinstance(tasks, list) or not tasks:
+        return jsonify({'error': 'Expected a non-empty list of tasks'}), 400
+    if len(tasks) > MAX_BULK_TASKS:
+        return jsonify({'error': f'At most {MAX_BULK_TASKS} tasks per request'}), 413
+
+    try:
+        updates = []
+        for task in tasks:
+            actual_time = task.get('actual_time')
+            updates.append((int(task['task_id']), None if actual_time is None else float(actual_time)))
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid task data: {e}'}), 400
+
+    updated = scheduler.complete_tasks(session['user_id'], updates)
+    skipped = set(task_id for task_id, _ in updates) - set(updated)
+    return jsonify({'updated': updated, 'not_found': sorted(skipped)})
+
+@app.route('/api/tasks/import', methods=['POST'])
+@login_required
+def import_tasks():
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': 'Expected a file upload named "file"'}), 400
+    fmt = request.form.get('format') or transfer.guess_format(upload.filename)
+    if fmt not in transfer.FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(transfer.FORMATS)}'}), 400
+    # Flask closes uploads when the view returns, before the response streams
+    spool = tempfile.TemporaryFile()
+    upload.save(spool)
+    spool.seek(0)
+    stream = io.TextIOWrapper(spool, encoding='utf-8-sig', newline='')
+    try:
+        records = transfer.read_tasks(stream, fmt)
+    except (UnicodeDecodeError, ValueError) as e:
+        stream.close()
+        return jsonify({'error': str(e)}), 400
+    user_id = session['user_id']
+
+    def generate():
+        # One progress line per inserted chunk, then the full report
+        report = {}
+        try:
+            for report in transfer.iter_import(scheduler, user_id, records):
+                yield json.dumps({key: report[key] for key in ('rows', 'imported', 'failed')}) + '\n'
+        except (csv.Error, UnicodeDecodeError, ValueError) as e:
+            # Chunks already inserted stay; the report says how far it got
+            report = dict(report, error=f'Unreadable file: {e}')
+        finally:
+            stream.close()
+        yield json.dumps(dict(report, done=True)) + '\n'
+
+    return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/tasks/export')
+@login_required
+def export_tasks():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in transfer.FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(transfer.FORMATS)}'}), 400
+    rows = scheduler.iter_export_rows(session['user_id'])
+    response = app.response_class(stream_with_context(transfer.iter_export(rows, fmt)),
+                                  mimetype='text/calendar' if fmt == 'ics' else 'text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename=tasks.{fmt}'
+    return response
+
 @app.route('/update_task/<int:task_id>', methods=['POST'])
 @login_required
 def update_task(task_id):
     try:
-        # First verify that the task belongs to the current user
-        conn = scheduler.connect_db()
-        c = conn.cursor()
-        c.execute('SELECT user_id FROM tasks WHERE id = ?', (task_id,))
-        task = c.fetchone()
-        conn.close()
-
-        if not task or task[0] != session['user_id']:
-            return jsonify({'error': 'Unauthorized'}), 403
-
         actual_time = float(request.form['actual_time'])
-        scheduler.update_actual_time(task_id, actual_time)
+        # The update only matches the task if it belongs to the current user
+        if not scheduler.update_actual_time(task_id, actual_time, user_id=session['user_id']):
+            return jsonify({'error': 'Unauthorized'}), 403
         
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({'success': True})
@@ -141,143 +377,212 @@ def update_task(task_id):
 @login_required
 def update_status(task_id):
     try:
-        # First verify that the task belongs to the current user
-        conn = scheduler.connect_db()
-        c = conn.cursor()
-        c.execute('SELECT user_id FROM tasks WHERE id = ?', (task_id,))
-        task = c.fetchone()
-        conn.close()
-
-        if not task or task[0] != session['user_id']:
-            return jsonify({'error': 'Unauthorized'}), 403
-
         status = request.form['status']
-        scheduler.update_task_status(task_id, status)
-        
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return jsonify({'success': True})
-        return redirect(url_for('schedule'))
+        if status not in smart_scheduler.TASK_STATUSES:
+            raise ValueError(f"Unknown status {status!r}")
+        # The update only matches the task if it belongs to the current user
+        if not scheduler.update_task_status(task_id, status, user_id=session['user_id']):
+            return jsonify({'error': 'Unauthorized'}), 403
     except Exception as e:
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({'error': str(e)}), 400
         return f"Error updating task status: {str(e)}", 400
 
+    if status == 'completed':
+        replan_cached(session['user_id'], completed=task_id)
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify({'success': True})
+    return redirect(url_for('schedule'))
+
+# Process the hours overdue into a more readable format
+def format_overdue_time(hours):
+    if hours == 0:
+        return None
+    if hours < 24:
+        return f"{int(hours)} hour{'s' if hours != 1 else ''}"
+    days = int(hours // 24)
+    remaining_hours = int(hours % 24)
+    if remaining_hours == 0:
+        return f"{days} day{'s' if days != 1 else ''}"
+    return f"{days} day{'s' if days != 1 else ''} and {remaining_hours} hour{'s' if remaining_hours != 1 else ''}"
+
+def iter_schedule_page(user_id, limit, cursor=None):
+    """Schedule rows with formatted overdue time; yields the next cursor last"""
+    # Every page of one listing classifies tasks against the same clock
+    now = smart_scheduler.decode_schedule_cursor(cursor)[0] if cursor else datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    last = None
+    count = 0
+    for task in scheduler.iter_schedule(user_id, limit=limit, cursor=cursor, now=now):
+        if task['current_status'] == 'overdue':
+            task['overdue_time'] = format_overdue_time(task['hours_overdue'])
+        last = task
+        count += 1
+        yield task
+    yield smart_scheduler.encode_schedule_cursor(now, last) if count == limit else None
+
 @app.route('/schedule')
 @login_required
 def schedule():
     try:
-        conn = scheduler.connect_db()
-        
-        # Get current timestamp in local timezone
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M')
-        
-        # Updated query with explicit datetime comparison
-        tasks_df = pd.read_sql_query(f'''
-            WITH task_status AS (
-                SELECT *,
-                    CASE 
-                        WHEN status = 'completed' THEN 'completed'
-                        WHEN datetime(due_date || ' ' || due_time) < datetime(?) THEN 'overdue'
-                        ELSE 'pending'
-                    END as current_status,
-                    CASE
-                        WHEN datetime(due_date || ' ' || due_time) < datetime(?)
-                        THEN ROUND((julianday(?) - julianday(due_date || ' ' || due_time)) * 24, 1)
-                        ELSE 0
-                    END as hours_overdue
-                FROM tasks
-                WHERE user_id = ?
-            )
-            SELECT * FROM task_status
-            ORDER BY 
-                CASE current_status
-                    WHEN 'completed' THEN 3
-                    WHEN 'pending' THEN 1
-                    ELSE 2  -- overdue tasks
-                END,
-                datetime(due_date || ' ' || due_time) ASC
-        ''', conn, params=(current_time, current_time, current_time, session['user_id']))
-        
-        # Process the hours overdue into a more readable format
-        def format_overdue_time(hours):
-            if hours == 0:
-                return None
-            if hours < 24:
-                return f"{int(hours)} hour{'s' if hours != 1 else ''}"
-            days = int(hours // 24)
-            remaining_hours = int(hours % 24)
-            if remaining_hours == 0:
-                return f"{days} day{'s' if days != 1 else ''}"
-            return f"{days} day{'s' if days != 1 else ''} and {remaining_hours} hour{'s' if remaining_hours != 1 else ''}"
-
-        # Add formatted overdue time to each task
-        tasks = tasks_df.replace({float('nan'): None, pd.NaT: None}).to_dict('records')
-        for task in tasks:
-            if task['current_status'] == 'overdue':
-                task['overdue_time'] = format_overdue_time(task['hours_overdue'])
-                print(f"Task {task['course']} is overdue by {task['overdue_time']}")  # Debug print
-        
-        # Debug print
-        print(f"Total tasks: {len(tasks)}")
-        for task in tasks:
-            print(f"Task: {task['course']}, Status: {task['current_status']}, Due: {task['due_date']} {task['due_time']}")
-        
+        # The whole schedule, streamed from the same keyset query /api/schedule pages through
+        tasks = list(iter_schedule_page(session['user_id'], None))[:-1]
         return render_template('schedule.html', tasks=tasks)
     except Exception as e:
-        print("Error in schedule:", str(e))  # For debugging
         return f"Error loading schedule: {str(e)}", 500
 
+@app.route('/api/schedule')
+@login_required
+def schedule_api():
+    limit = request.args.get('limit', SCHEDULE_PAGE_SIZE, type=int)
+    cursor = request.args.get('cursor')
+    if not 0 < limit <= MAX_SCHEDULE_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_SCHEDULE_PAGE_SIZE}'}), 400
+    if cursor:
+        try:
+            smart_scheduler.decode_schedule_cursor(cursor)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    def generate():
+        for item in iter_schedule_page(session['user_id'], limit, cursor):
+            if isinstance(item, dict):
+                yield json.dumps(item) + '\n'
+            else:
+                yield json.dumps({'next_cursor': item}) + '\n'
+
+    return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/dashboard')
 @login_required
 def dashboard():
     try:
-        conn = scheduler.connect_db()
-        tasks_df = pd.read_sql_query('''
-            SELECT *, 
-                   CASE 
-                       WHEN status = 'completed' THEN 'completed'
-                       WHEN datetime(due_date || ' ' || due_time) < datetime('now', 'localtime') THEN 'overdue'
-                       ELSE 'pending'
-                   END as current_status
-            FROM tasks 
-            WHERE user_id = ?
-            ORDER BY created_at DESC
-        ''', conn, params=(session['user_id'],))
+        tasks_df = scheduler.get_dashboard_tasks(session['user_id'])
         
         tasks = tasks_df.replace({float('nan'): None}).to_dict('records')
         insights = scheduler.get_user_insights(session['user_id'])
+        overdue_count = scheduler.count_overdue(session['user_id'])
         
-        # Prepare analytics data for completed tasks
-        completed_tasks = tasks_df[tasks_df['actual_time'].notna()]
-        
-        analytics_data = {
-            'accuracy': {
-                'labels': completed_tasks['course'].tolist(),
-                'predicted': completed_tasks['predicted_time'].tolist(),
-                'actual': completed_tasks['actual_time'].tolist()
-            },
-            'utilization': {
-                'used': float(completed_tasks['actual_time'].sum() or 0),
-                'available': float(completed_tasks['total_available_time'].sum() or 0)
-            },
-            'taskType': {
-                'labels': completed_tasks.groupby('task_type')['actual_time'].mean().index.tolist(),
-                'data': completed_tasks.groupby('task_type')['actual_time'].mean().tolist()
-            },
-            'difficulty': {
-                'data': [
-                    {'x': int(row['difficulty']), 'y': float(row['actual_time'])} 
-                    for _, row in completed_tasks.iterrows()
-                ]
-            }
-        }
+        analytics_data = analytics.get_analytics(scheduler, session['user_id'])
         
         return render_template('dashboard.html', 
                              tasks=tasks, 
                              insights=insights,
+                             overdue_count=overdue_count,
                              analytics_data=analytics_data)
     except Exception as e:
         return f"Error loading dashboard: {str(e)}", 500
 
+@app.route('/api/analytics')
+@login_required
+def analytics_api():
+    user_id = session['user_id']
+    version, last_write_at = analytics.get_write_version(scheduler, user_id)
+    etag = f'analytics-{user_id}-{version}'
+
+    # Revalidation only needs the version row; the analytics stay untouched
+    if request.if_none_match:
+        not_modified = etag in request.if_none_match
+    else:
+        not_modified = bool(last_write_at and request.if_modified_since
+                            and last_write_at <= request.if_modified_since)
+
+    if not_modified:
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(analytics.get_analytics(scheduler, user_id, version))
+    response.set_etag(etag)
+    if last_write_at:
+        response.last_modified = last_write_at
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+# Latest plan per (database, user): (hours_per_day, day_start, day, write_version, planner)
+plans = TTLCache(maxsize=1024)
+
+def get_plan(user_id, hours_per_day, day_start):
+    """The user's plan, rebuilt when their tasks or the planning options changed
+    or study time has passed since it was made"""
+    version, _ = analytics.get_write_version(scheduler, user_id)
+    options = (hours_per_day, day_start)
+    cached = plans.get((scheduler.db_path, user_id))
+    if cached is not None and cached[:2] == options and cached[2] == version and cached[3].is_current():
+        return cached[3]
+    planner = Planner(daily_availability(hours_per_day, day_start))
+    planner.plan(scheduler.get_plan_tasks(user_id))
+    plans.put((scheduler.db_path, user_id), options + (version, planner))
+    return planner
+
+def replan_cached(user_id, added=None, completed=None):
+    """Apply one committed task change to a cached plan instead of rebuilding it.
+
+    Never raises: if the change can't be applied, the plan is dropped and
+    rebuilt on the next read.
+    """
+    key = (scheduler.db_path, user_id)
+    try:
+        cached = plans.get(key)
+        if cached is None:
+            return
+        # Only our own write may have happened since (one version bump); otherwise rebuild
+        version, _ = analytics.get_write_version(scheduler, user_id)
+        planner = cached[3]
+        if cached[2] is None or version != cached[2] + 1 or not planner.is_current():
+            plans.invalidate(key)
+            return
+        if added is not None:
+            planner.add(added)
+        if completed is not None:
+            planner.complete(completed)
+        plans.put(key, cached[:2] + (version, planner))
+    except Exception as e:
+        plans.invalidate(key)
+        print(f"Warning: could not update the cached plan of user {user_id}: {e}")
+
+@app.route('/api/plan')
+@login_required
+def plan_api():
+    hours_per_day = request.args.get('hours_per_day', DEFAULT_HOURS_PER_DAY, type=float)
+    day_start = request.args.get('day_start', DEFAULT_DAY_START)
+    try:
+        datetime.strptime(day_start, '%H:%M')
+        if not 0 < hours_per_day <= 24:
+            raise ValueError('hours_per_day must be between 0 and 24')
+        planner = get_plan(session['user_id'], hours_per_day, day_start)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(planner.to_dict())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return app.response_class(metrics.REGISTRY.render(),
+                              mimetype='text/plain; version=0.0.4')
+
+@app.route('/healthz')
+def healthz():
+    # Liveness only: answers as soon as the process serves, even mid warm-up
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    status = warmup.status()
+    status['model_version'] = scheduler.model_version if scheduler else None
+    return jsonify(status), 200 if warmup.ready else 503
+
+# Defined last: the warm-up thread calls the functions above
+warmup = Warmup([
+    ('imports', import_ml),
+    ('database', open_scheduler),
+    ('model', load_model),
+    ('background jobs', start_background_jobs),
+])
+if WARMUP_MODE == 'eager':
+    warmup.run()
+elif WARMUP_MODE == 'background':
+    warmup.start()
+
 if __name__ == '__main__':
+    if hasattr(signal, 'SIGHUP'):
+        # `kill -HUP <pid>` loads a newly saved model without waiting for the next poll
+        signal.signal(signal.SIGHUP, lambda signum, frame: model_reloader and model_reloader.trigger())
     app.run(debug=True, port=5001) 
\ No newline at end of file
@@ -0,0 +1,86 @@
+# auth.py
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Password hashing is CPU-bound; cap the cores it may use and the queue behind them
+HASH_WORKERS = int(os.environ.get('SCHEDULER_HASH_WORKERS', '2'))
+HASH_MAX_PENDING = int(os.environ.get('SCHEDULER_HASH_MAX_PENDING', '32'))
+
+
+class Busy(Exception):
+    """Raised when too many password operations are already queued"""
+
+
+class PasswordPool:
+    """Bounded worker pool for password hashing and verification.
+
+    hashlib releases the GIL while hashing, so at most `workers` cores are
+    spent on passwords and request threads for other routes keep running.
+    Calls beyond `max_pending` are rejected with Busy instead of queueing.
+    """
+
+    def __init__(self, workers=HASH_WORKERS, max_pending=HASH_MAX_PENDING):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise Busy("Too many password operations in progress")
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self.run(generate_password_hash, password)
+
+    def check(self, password_hash, password):
+        return self.run(check_password_hash, password_hash, password)
+
+
+class LoginThrottle:
+    """Per-username limit on failed logins within a sliding window"""
+
+    def __init__(self, max_failures=5, window=300, max_usernames=10000):
+        self.max_failures = max_failures
+        self.window = window
+        self.max_usernames = max_usernames
+        self._failures = OrderedDict()  # username -> deque of failure times
+        self._lock = threading.Lock()
+
+    def retry_after(self, username):
+        """Seconds until this username may try again (0 if it may now)"""
+        now = time.monotonic()
+        with self._lock:
+            failures = self._failures.get(username)
+            if not failures:
+                return 0
+            while failures and failures[0] <= now - self.window:
+                failures.popleft()
+            if len(failures) < self.max_failures:
+                return 0
+            return int(failures[0] + self.window - now) + 1
+
+    def record_failure(self, username):
+        now = time.monotonic()
+        with self._lock:
+            failures = self._failures.get(username)
+            if failures is None:
+                failures = self._failures[username] = deque(maxlen=self.max_failures)
+            failures.append(now)
+            self._failures.move_to_end(username)
+            if len(self._failures) > self.max_usernames:
+                self._failures.popitem(last=False)
+
+    def record_success(self, username):
+        with self._lock:
+            self._failures.pop(username, None)
+
+
+passwords = PasswordPool()
+login_throttle = LoginThrottle()
@@ -0,0 +1,85 @@
+# backends.py
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Ridge
+
+from forest_eval import CompiledForest
+
+DEFAULT_BACKEND = 'forest'
+
+# Unfitted estimators for each backend; the fitted model is compiled for serving
+BACKENDS = {
+    'forest': lambda: RandomForestRegressor(random_state=42),
+    'small-forest': lambda: RandomForestRegressor(
+        n_estimators=30, max_depth=8, min_samples_leaf=2, random_state=42),
+    'hgb': lambda: HistGradientBoostingRegressor(max_iter=100, max_depth=6, random_state=42),
+    'ridge': lambda: Ridge(alpha=1.0),
+}
+
+
+def make_model(backend=DEFAULT_BACKEND):
+    """A new, unfitted estimator for a backend name"""
+    try:
+        return BACKENDS[backend]()
+    except KeyError:
+        raise ValueError(f"Unknown model backend {backend!r}; choose from {', '.join(BACKENDS)}")
+
+
+class LinearPredictor:
+    """A fitted linear model reduced to its coefficients"""
+
+    def __init__(self, coef, intercept):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self._coef = self.coef.tolist()
+
+    def arrays(self):
+        return {'coef': self.coef, 'intercept': self.intercept}
+
+    def predict(self, X):
+        """Predict a batch of feature rows"""
+        return np.asarray(X, dtype=np.float64) @ self.coef + self.intercept
+
+    def predict_row(self, features):
+        """Predict one feature row given as a list of floats"""
+        total = self.intercept
+        for weight, value in zip(self._coef, features):
+            total += weight * value
+        return total
+
+
+class EstimatorPredictor:
+    """Fallback serving wrapper that calls the estimator itself"""
+
+    def __init__(self, model):
+        self.model = model
+
+    def arrays(self):
+        return None
+
+    def predict(self, X):
+        return self.model.predict(np.atleast_2d(X))
+
+    def predict_row(self, features):
+        return float(self.model.predict([features])[0])
+
+
+def compile_model(model, arrays=None):
+    """Serving predictor for a fitted model, optionally rebuilt from saved arrays"""
+    if isinstance(model, RandomForestRegressor):
+        return CompiledForest(**arrays) if arrays else CompiledForest.from_sklearn(model)
+    if hasattr(model, 'coef_'):
+        return LinearPredictor(**arrays) if arrays else LinearPredictor(model.coef_, model.intercept_)
+    return EstimatorPredictor(model)
+
+
+def backend_name(model):
+    """Best-effort backend name for a model, matched on class and parameters"""
+    params = model.get_params()
+    for name, factory in BACKENDS.items():
+        candidate = factory()
+        if type(candidate) is type(model) and all(
+                params.get(key) == value for key, value in candidate.get_params().items()
+                if key != 'n_jobs'):
+            return name
+    return type(model).__name__
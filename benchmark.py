@@ -0,0 +1,282 @@
+# benchmark.py
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from timing import time_call
+
+SAMPLE_TASK = ("Computer Science", "Assignment", 3, 5.0, 7)
+
+# Rows generated and inserted per transaction while seeding
+SEED_CHUNK = 50000
+
+
+def load_app(db_path, data, artifacts, shards=1):
+    """Import app.py against the scratch database, with background threads off"""
+    os.environ['SCHEDULER_DB'] = db_path
+    os.environ['SCHEDULER_SHARDS'] = str(shards)
+    os.environ['SCHEDULER_MODEL_DIR'] = artifacts
+    os.environ['SCHEDULER_TRAINING_DATA'] = data
+    os.environ['SCHEDULER_RETRAIN'] = '0'
+    os.environ['SCHEDULER_SWEEP'] = '0'
+    os.environ['SCHEDULER_ARCHIVE_DAYS'] = '0'
+    os.environ['SCHEDULER_WARMUP'] = 'eager'
+    import app
+    return app
+
+
+def seed_database(scheduler, user_model, users=1000, tasks_per_user=100, seed=0):
+    """Fill the database with synthetic users and tasks; returns the user ids"""
+    rng = np.random.default_rng(seed)
+    courses = np.array(sorted(scheduler.pipeline.vocabularies['course']))
+    task_types = np.array(sorted(scheduler.pipeline.vocabularies['task_type']))
+
+    with user_model.db.transaction() as conn:
+        first = conn.execute('SELECT COALESCE(MAX(id), 0) FROM users').fetchone()[0] + 1
+        conn.executemany(
+            'INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)',
+            ((f'bench{first + i}', 'x', f'bench{first + i}@example.com') for i in range(users)),
+        )
+    user_ids = np.arange(first, first + users)
+
+    today = date.today()
+    total = users * tasks_per_user
+    for start in range(0, total, SEED_CHUNK):
+        n = min(SEED_CHUNK, total - start)
+        chunk = pd.DataFrame({
+            'user_id': np.repeat(user_ids, tasks_per_user)[start:start + n],
+            'course': rng.choice(courses, n),
+            'task_type': rng.choice(task_types, n),
+            'difficulty': rng.integers(1, 6, n),
+            'total_available_time': np.round(rng.uniform(1, 10, n), 1),
+            'deadline_days': rng.integers(1, 15, n),
+        })
+        chunk['predicted_time'] = scheduler.predict_many(chunk)
+        offsets = rng.integers(-60, 60, n)
+        chunk['due_date'] = [(today + timedelta(days=int(d))).isoformat() for d in offsets]
+        chunk['due_time'] = '23:59'
+        completed = rng.random(n) < 0.3
+        chunk['status'] = np.where(completed, 'completed', 'pending')
+        chunk['actual_time'] = np.where(completed, np.round(rng.uniform(0.5, 10, n), 1), np.nan)
+
+        rows = (
+            (int(r.user_id), r.course, r.task_type, int(r.difficulty), float(r.total_available_time),
+             int(r.deadline_days), float(r.predicted_time),
+             None if np.isnan(r.actual_time) else float(r.actual_time),
+             r.due_date, r.due_time, r.due_date, r.due_time, r.status)
+            for r in chunk.itertuples(index=False)
+        )
+        by_shard = {}
+        for row in rows:
+            by_shard.setdefault(scheduler.router.shard_for(row[0]), []).append(row)
+        for shard, shard_rows in by_shard.items():
+            with scheduler.router.shards[shard].transaction() as conn:
+                conn.executemany('''
+                    INSERT INTO tasks (
+                        user_id, course, task_type, difficulty, total_available_time, deadline_days,
+                        predicted_time, actual_time, due_date, due_time, due_at, status
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime(? || ' ' || ?), ?)
+                ''', shard_rows)
+    return [int(u) for u in user_ids]
+
+
+def refitting_preprocess(df, label_encoders, scaler):
+    """The preprocessing predict_time used before the compiled pipeline.
+
+    Kept as the benchmark baseline: every call copies the frame and refits
+    each LabelEncoder on its known classes plus the new values.
+    """
+    X = df.copy()
+    y = X.pop('actual_time') if 'actual_time' in X else None
+    for col in ['course', 'task_type']:
+        unique_values = list(label_encoders[col].classes_)
+        all_values = list(set(unique_values + list(X[col].unique())))
+        label_encoders[col].fit(all_values)
+        X[col] = label_encoders[col].transform(X[col])
+    numerical_cols = ['difficulty', 'total_available_time', 'deadline_days']
+    X[numerical_cols] = scaler.transform(X[numerical_cols].to_numpy(dtype=np.float64))
+    return X, y
+
+
+def bench_feature_pipeline(scheduler, repeat=1000):
+    """One-row DataFrame preprocessing (the old refitting path) versus the compiled pipeline"""
+    course, task_type, difficulty, total_available_time, deadline_days = SAMPLE_TASK
+    # Private copies: the baseline refits encoders, which must not touch the live state
+    label_encoders = copy.deepcopy(scheduler.label_encoders)
+    scaler = scheduler.scaler
+
+    def dataframe_path():
+        data = pd.DataFrame({
+            'course': [course],
+            'task_type': [task_type],
+            'difficulty': [difficulty],
+            'total_available_time': [total_available_time],
+            'deadline_days': [deadline_days]
+        })
+        refitting_preprocess(data, label_encoders, scaler)
+
+    def compiled_path():
+        scheduler.pipeline.transform_row(*SAMPLE_TASK)
+
+    return {
+        'dataframe': time_call(dataframe_path, repeat),
+        'compiled': time_call(compiled_path, repeat),
+    }
+
+
+def bench_predict_time(scheduler, repeat=200):
+    """End-to-end single-task prediction, with and without the prediction cache"""
+    def uncached():
+        scheduler.prediction_cache.clear()
+        scheduler.predict_time(*SAMPLE_TASK)
+
+    return {
+        'uncached': time_call(uncached, repeat),
+        'cached': time_call(lambda: scheduler.predict_time(*SAMPLE_TASK), repeat),
+    }
+
+
+def bench_forest(scheduler, repeat=200):
+    """Single-row forest evaluation: sklearn versus the compiled arrays"""
+    features = scheduler.pipeline.transform_row(*SAMPLE_TASK)
+    return {
+        'sklearn': time_call(lambda: scheduler.model.predict([features]), repeat),
+        'compiled': time_call(lambda: scheduler.forest.predict_row(features), repeat),
+    }
+
+
+def bench_storage(scheduler, user_ids, repeat=200, seed=0):
+    """add_task, get_schedule and get_user_insights for random seeded users"""
+    rng = np.random.default_rng(seed)
+    picks = iter(rng.choice(user_ids, 3 * repeat).tolist())
+    due_date = (date.today() + timedelta(days=7)).isoformat()
+
+    def add_task():
+        scheduler.add_task(next(picks), *SAMPLE_TASK, due_date, '23:59')
+
+    return {
+        'add_task': time_call(add_task, repeat),
+        'get_schedule': time_call(lambda: scheduler.get_schedule(next(picks)), repeat),
+        'get_user_insights': time_call(lambda: scheduler.get_user_insights(next(picks)), repeat),
+    }
+
+
+def bench_concurrent_writes(scheduler, user_ids, threads=8, repeat=200, seed=0):
+    """add_task from several threads at once, each for random users; shows shard write scaling"""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(user_ids, (threads, repeat)).tolist()
+    due_date = (date.today() + timedelta(days=7)).isoformat()
+
+    def writer(users):
+        for user_id in users:
+            scheduler.add_task(user_id, *SAMPLE_TASK, due_date, '23:59')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(writer, picks))
+    elapsed = time.perf_counter() - start
+    return {
+        'threads': threads,
+        'shards': len(scheduler.router),
+        'writes': threads * repeat,
+        'seconds': round(elapsed, 3),
+        'throughput_per_s': round(threads * repeat / elapsed, 1),
+    }
+
+
+def bench_routes(app_module, user_ids, routes, repeat=200, seed=0, sessions=50):
+    """Full requests through the Flask test client, logged in as random seeded users"""
+    rng = np.random.default_rng(seed)
+    clients = []
+    for user_id in rng.choice(user_ids, min(sessions, len(user_ids)), replace=False).tolist():
+        client = app_module.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+        clients.append(client)
+
+    results = {}
+    for route in routes:
+        statuses = {}
+        picks = iter(rng.choice(len(clients), repeat).tolist())
+
+        def request():
+            response = clients[next(picks)].get(route)
+            response.get_data()
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        results[route] = time_call(request, repeat)
+        results[route]['statuses'] = {str(code): count for code, count in sorted(statuses.items())}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scheduler's hot paths")
+    parser.add_argument('--db', help="scratch SQLite database (default: a new temporary file)")
+    parser.add_argument('--data', default='training_data.csv', help="training CSV")
+    parser.add_argument('--users', type=int, default=1000, help="synthetic users to seed")
+    parser.add_argument('--tasks-per-user', type=int, default=100, help="synthetic tasks per user")
+    parser.add_argument('--no-seed', action='store_true', help="reuse the tasks already in --db")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for data and request mix")
+    parser.add_argument('--repeat', type=int, default=1000)
+    parser.add_argument('--routes', nargs='*', default=['/schedule', '/api/schedule', '/dashboard', '/api/analytics'])
+    parser.add_argument('--shards', type=int, default=1, help="task shard databases")
+    parser.add_argument('--writers', type=int, default=8, help="threads in the concurrent write benchmark")
+    parser.add_argument('--output', help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='scheduler-bench-')
+    db_path = args.db or os.path.join(workdir, 'bench.db')
+    app_module = load_app(db_path, os.path.abspath(args.data), os.path.join(workdir, 'artifacts'), args.shards)
+    scheduler = app_module.scheduler
+
+    started = time.perf_counter()
+    if args.no_seed:
+        user_ids = [user_id for shard in range(len(scheduler.router))
+                    for user_id in scheduler.router.users_on(shard)]
+    else:
+        user_ids = seed_database(scheduler, app_module.user_model, args.users,
+                                 args.tasks_per_user, args.seed)
+    seed_seconds = time.perf_counter() - started
+    task_count = 0
+    for db in scheduler.router.shards:
+        with db.connection() as conn:
+            task_count += conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+
+    small = max(1, args.repeat // 5)
+    results = {
+        'environment': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'db': db_path,
+            'shards': args.shards,
+            'users': len(user_ids),
+            'tasks': task_count,
+            'seed': args.seed,
+            'seed_seconds': round(seed_seconds, 2),
+        },
+        'feature_pipeline': bench_feature_pipeline(scheduler, args.repeat),
+        'forest': bench_forest(scheduler, small),
+        'predict_time': bench_predict_time(scheduler, small),
+        'storage': bench_storage(scheduler, user_ids, small, args.seed),
+        'concurrent_writes': bench_concurrent_writes(scheduler, user_ids, args.writers, small, args.seed),
+        'routes': bench_routes(app_module, user_ids, args.routes, small, args.seed),
+    }
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
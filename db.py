@@ -0,0 +1,290 @@
+# db.py
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context
+
+from metrics import CONNECTION_WAIT, SQL_LATENCY, statement_kind
+
+EXTENSION_KEY = 'scheduler_db'
+
+# Pragmas applied to every pooled connection
+PRAGMAS = (
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA mmap_size = 134217728',
+)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that records whole-statement time: execution plus fetching its rows.
+
+    SQLite does most of a query's work while rows are stepped through, so
+    the time spent in fetch calls and iteration is added to the statement.
+    It is recorded once the rows run out, or when the cursor is reused,
+    closed or released without reading them all.
+    """
+
+    _kind = None
+    _elapsed = 0.0
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            self._elapsed += time.perf_counter() - start
+
+    def _finish(self):
+        if self._kind is not None:
+            SQL_LATENCY.observe(self._elapsed, self._kind)
+            self._kind = None
+            self._elapsed = 0.0
+
+    def _run(self, method, sql, parameters):
+        self._finish()
+        self._kind = statement_kind(sql)
+        try:
+            return self._timed(method, sql, parameters)
+        finally:
+            if self.description is None:  # nothing to fetch
+                self._finish()
+
+    def execute(self, sql, parameters=()):
+        return self._run(sqlite3.Cursor.execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(sqlite3.Cursor.executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        row = self._timed(sqlite3.Cursor.fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(sqlite3.Cursor.fetchmany, self.arraysize if size is None else size)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(sqlite3.Cursor.fetchall)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        # Inlined rather than going through _timed: this runs once per row
+        start = time.perf_counter()
+        try:
+            row = sqlite3.Cursor.__next__(self)
+        except StopIteration:
+            self._elapsed += time.perf_counter() - start
+            self._finish()
+            raise
+        self._elapsed += time.perf_counter() - start
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose statements, including those run by pandas, are timed"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def _is_locked(error):
+    """Check whether an OperationalError was caused by lock contention"""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+class Database:
+    """Pool of tuned, WAL-mode SQLite connections for one database file"""
+
+    def __init__(self, db_path, pool_size=8, busy_timeout=5.0, retries=5, retry_delay=0.05,
+                 cached_statements=256):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.busy_timeout = busy_timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.cached_statements = cached_statements
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._created = 0
+
+    def _open(self):
+        """Open a new connection with WAL journaling and tuned pragmas"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            isolation_level=None,  # transactions are managed explicitly
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            factory=TimedConnection,
+        )
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}')
+        conn.execute('PRAGMA journal_mode = WAL')
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        """Take a connection from the pool, opening one if the pool is not full"""
+        start = time.perf_counter()
+        try:
+            return self._acquire()
+        finally:
+            CONNECTION_WAIT.observe(time.perf_counter() - start)
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._pool.get(timeout=self.busy_timeout)
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding any open transaction"""
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    def close_all(self):
+        """Close every idle pooled connection"""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, reusing the one bound to this request or thread"""
+        if has_app_context() and EXTENSION_KEY in current_app.extensions:
+            # Request-scoped: kept on g and released in teardown_appcontext
+            connections = g.setdefault('_db_connections', {})
+            conn = connections.get(self)
+            if conn is None:
+                conn = connections[self] = self.acquire()
+            yield conn
+            return
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self._local.conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self.release(conn)
+
+    def _begin(self, conn):
+        """Start a write transaction, retrying with backoff while the database is locked"""
+        for attempt in range(self.retries + 1):
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                return
+            except sqlite3.OperationalError as e:
+                if not _is_locked(e) or attempt == self.retries:
+                    raise
+                time.sleep(self.retry_delay * (2 ** attempt))
+
+    @contextmanager
+    def transaction(self):
+        """Run a block inside a single write transaction (joins an open one)"""
+        with self.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+
+            self._begin(conn)
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(db_path):
+    """Get the shared Database for a file so every model uses the same pool"""
+    key = os.path.abspath(db_path)
+    with _databases_lock:
+        db = _databases.get(key)
+        if db is None:
+            db = _databases[key] = Database(db_path)
+        return db
+
+
+def close_request_connections(exc=None):
+    """Release connections borrowed during the current request"""
+    connections = g.pop('_db_connections', None)
+    if not connections:
+        return
+    for db, conn in connections.items():
+        db.release(conn)
+
+
+def init_app(app):
+    """Enable request-scoped connection reuse for a Flask app"""
+    app.extensions[EXTENSION_KEY] = True
+    app.teardown_appcontext(close_request_connections)
+
+
+def close_all_databases():
+    """Close the idle connections of every shared Database (before forking workers)"""
+    with _databases_lock:
+        databases = list(_databases.values())
+    for db in databases:
+        db.close_all()
@@ -0,0 +1,60 @@
+# feature_pipeline.py
+import numpy as np
+
+CATEGORICAL_FEATURES = ['course', 'task_type']
+NUMERICAL_FEATURES = ['difficulty', 'total_available_time', 'deadline_days']
+# Column order of the model's feature matrix
+FEATURES = CATEGORICAL_FEATURES + NUMERICAL_FEATURES
+
+
+class FeaturePipeline:
+    """Frozen encoding and scaling of task features, compiled from fitted encoders.
+
+    Categories seen during training keep the codes their LabelEncoder gave
+    them; anything else maps to one extra "unknown" code instead of refitting
+    the encoder and renumbering the vocabulary.
+    """
+
+    def __init__(self, vocabularies, mean, scale):
+        self.vocabularies = {col: dict(vocabularies[col]) for col in CATEGORICAL_FEATURES}
+        self.unknown_codes = {col: len(vocab) for col, vocab in self.vocabularies.items()}
+        self.mean = tuple(float(m) for m in mean)
+        self.scale = tuple(float(s) for s in scale)
+
+        # Bound locals for the single-row fast path
+        self._course_codes = self.vocabularies['course']
+        self._task_type_codes = self.vocabularies['task_type']
+        self._unknown_course = float(self.unknown_codes['course'])
+        self._unknown_task_type = float(self.unknown_codes['task_type'])
+
+    @classmethod
+    def from_fitted(cls, label_encoders, scaler):
+        """Compile a pipeline from fitted LabelEncoders and a StandardScaler"""
+        vocabularies = {
+            col: {value: code for code, value in enumerate(label_encoders[col].classes_)}
+            for col in CATEGORICAL_FEATURES
+        }
+        return cls(vocabularies, scaler.mean_, scaler.scale_)
+
+    def transform_row(self, course, task_type, difficulty, total_available_time, deadline_days):
+        """Feature vector for one task, built straight from Python scalars"""
+        mean = self.mean
+        scale = self.scale
+        return [
+            float(self._course_codes.get(course, self._unknown_course)),
+            float(self._task_type_codes.get(task_type, self._unknown_task_type)),
+            (difficulty - mean[0]) / scale[0],
+            (total_available_time - mean[1]) / scale[1],
+            (deadline_days - mean[2]) / scale[2],
+        ]
+
+    def transform_frame(self, df, dtype=np.float64):
+        """Feature matrix for a DataFrame of tasks"""
+        X = np.empty((len(df), len(FEATURES)), dtype=dtype)
+        for i, col in enumerate(CATEGORICAL_FEATURES):
+            codes = df[col].map(self.vocabularies[col])
+            X[:, i] = codes.fillna(self.unknown_codes[col]).to_numpy(dtype=np.float64)
+        for j, col in enumerate(NUMERICAL_FEATURES):
+            values = df[col].to_numpy(dtype=np.float64)
+            X[:, len(CATEGORICAL_FEATURES) + j] = (values - self.mean[j]) / self.scale[j]
+        return X
@@ -0,0 +1,98 @@
+# forest_eval.py
+import numpy as np
+
+LEAF = -1
+
+
+class CompiledForest:
+    """A fitted tree ensemble flattened into contiguous NumPy arrays.
+
+    All trees share one set of node arrays; `roots` holds the index of each
+    tree's root node. Leaves point back at themselves, so every row can be
+    advanced `max_depth` times without branching on whether it has stopped.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_trees = len(roots)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Compile a fitted RandomForestRegressor (or any bagged tree regressor)"""
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            nodes = np.arange(offset, offset + n_nodes, dtype=np.intp)
+            is_leaf = tree.children_left == LEAF
+
+            left = np.where(is_leaf, nodes, tree.children_left + offset).astype(np.intp)
+            right = np.where(is_leaf, nodes, tree.children_right + offset).astype(np.intp)
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(left)
+            rights.append(right)
+            values.append(tree.value[:, 0, 0].astype(np.float64))
+            roots.append(offset)
+
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            np.ascontiguousarray(np.concatenate(features)),
+            np.ascontiguousarray(np.concatenate(thresholds)),
+            np.ascontiguousarray(np.concatenate(lefts)),
+            np.ascontiguousarray(np.concatenate(rights)),
+            np.ascontiguousarray(np.concatenate(values)),
+            np.asarray(roots, dtype=np.intp),
+            max_depth,
+        )
+
+    def arrays(self):
+        """Arrays and sizes needed to rebuild the forest (for persistence)"""
+        return {
+            'feature': self.feature,
+            'threshold': self.threshold,
+            'left': self.left,
+            'right': self.right,
+            'value': self.value,
+            'roots': self.roots,
+            'max_depth': self.max_depth,
+        }
+
+    def predict(self, X):
+        """Predict a batch of feature rows"""
+        # sklearn compares float32 inputs against float64 thresholds; do the same
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        n_rows, n_features = X.shape
+        flat = np.ascontiguousarray(X).ravel()
+        row_offset = (np.arange(n_rows) * n_features)[:, None]
+        node = np.repeat(self.roots[None, :], n_rows, axis=0)
+        for _ in range(self.max_depth):
+            x = flat.take(row_offset + self.feature.take(node))
+            go_left = x <= self.threshold.take(node)
+            node = np.where(go_left, self.left.take(node), self.right.take(node))
+
+        # Sum trees left to right, as sklearn accumulates them, before averaging
+        return np.cumsum(self.value.take(node), axis=1)[:, -1] / self.n_trees
+
+    def predict_row(self, features):
+        """Predict a single feature vector"""
+        x = np.asarray(features, dtype=np.float32)
+        node = self.roots
+        feature, threshold, left, right = self.feature, self.threshold, self.left, self.right
+        for _ in range(self.max_depth):
+            go_left = x.take(feature.take(node)) <= threshold.take(node)
+            node = np.where(go_left, left.take(node), right.take(node))
+        return float(np.cumsum(self.value.take(node))[-1] / self.n_trees)
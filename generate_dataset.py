@@ -1,72 +1,209 @@
+import argparse
+import multiprocessing
+import os
+import time
+from collections import deque
+from datetime import date
+
 import pandas as pd
 import numpy as np
 
-# Set random seed for reproducibility
-np.random.seed(42)
+# Define possible values
+COURSES = ['Mathematics', 'Physics', 'Computer Science', 'History', 'Literature',
+           'Chemistry', 'Biology', 'Economics']
+TASK_TYPES = ['Assignment', 'Project', 'Exam Preparation', 'Quiz', 'Lab Report']
+
+# Task type specific modifications (unlisted types use 1.0)
+TYPE_FACTORS = {
+    'Assignment': 1.0,
+    'Project': 1.4,
+    'Exam Preparation': 1.3,
+    'Quiz': 0.7,
+    'Lab Report': 1.2
+}
 
-# Create a list of sample data
-data = []
+# Rows generated per chunk; each chunk has its own seed
+CHUNK_SIZE = 100000
+# Chunks each worker may have generated ahead of the consumer
+CHUNKS_AHEAD = 2
+
+
+def generate_chunk(index, size, seed=42, courses=COURSES, task_types=TASK_TYPES, users=0):
+    """Generate one chunk of realistic tasks with whole-array operations.
+
+    The chunk's generator is seeded from (seed, index), so a chunk's rows never
+    depend on which worker produced it or on the chunks before it.
+    """
+    rng = np.random.default_rng([seed, index])
+    courses = np.asarray(courses)
+    task_types = np.asarray(task_types)
+
+    course = courses[rng.integers(0, len(courses), size)]
+    type_codes = rng.integers(0, len(task_types), size)
+    difficulty = rng.integers(1, 6, size)  # 1-5 scale
+    total_available_time = np.round(rng.uniform(2, 12, size), 1)  # 2-12 hours
+    deadline_days = rng.integers(1, 15, size)  # 1-14 days
 
-# Define possible values
-courses = ['Mathematics', 'Physics', 'Computer Science', 'History', 'Literature', 
-          'Chemistry', 'Biology', 'Economics']
-task_types = ['Assignment', 'Project', 'Exam Preparation', 'Quiz', 'Lab Report']
-
-# Generate 30 realistic entries
-for _ in range(30):
-    course = np.random.choice(courses)
-    task_type = np.random.choice(task_types)
-    difficulty = np.random.randint(1, 6)  # 1-5 scale
-    total_available_time = round(np.random.uniform(2, 12), 1)  # 2-12 hours
-    deadline_days = np.random.randint(1, 15)  # 1-14 days
-    
     # Calculate actual_time based on realistic factors with some randomness
     base_time = difficulty * 1.2  # Base time increases with difficulty
-    deadline_factor = max(0.8, 1 - (deadline_days / 20))  # Urgent tasks take more time
-    available_time_factor = min(1.2, total_available_time / 8)  # More available time might mean more thorough work
-    
-    # Add some task type specific modifications
-    type_factors = {
-        'Assignment': 1.0,
-        'Project': 1.4,
-        'Exam Preparation': 1.3,
-        'Quiz': 0.7,
-        'Lab Report': 1.2
-    }
-    
-    # Calculate actual time with some random variation
-    actual_time = round(base_time * deadline_factor * available_time_factor * 
-                       type_factors[task_type] * np.random.uniform(0.8, 1.2), 1)
-    
+    deadline_factor = np.maximum(0.8, 1 - deadline_days / 20)  # Urgent tasks take more time
+    available_time_factor = np.minimum(1.2, total_available_time / 8)  # More available time might mean more thorough work
+    type_factor = np.array([TYPE_FACTORS.get(t, 1.0) for t in task_types])[type_codes]
+
+    actual_time = np.round(base_time * deadline_factor * available_time_factor *
+                           type_factor * rng.uniform(0.8, 1.2, size), 1)
+
     # Ensure actual_time is reasonable
-    actual_time = min(actual_time, total_available_time * 0.9)  # Can't take more than available time
-    actual_time = max(actual_time, 0.5)  # Minimum 30 minutes
-    
-    data.append({
+    actual_time = np.minimum(actual_time, total_available_time * 0.9)  # Can't take more than available time
+    actual_time = np.maximum(actual_time, 0.5)  # Minimum 30 minutes
+
+    df = pd.DataFrame({
         'course': course,
-        'task_type': task_type,
+        'task_type': task_types[type_codes],
         'difficulty': difficulty,
         'total_available_time': total_available_time,
         'deadline_days': deadline_days,
         'actual_time': actual_time
     })
+    if users:
+        df.insert(0, 'user_id', rng.integers(1, users + 1, size))
+    return df
+
+
+def _generate_chunk(args):
+    return generate_chunk(*args)
+
+
+def iter_chunks(rows, seed=42, courses=COURSES, task_types=TASK_TYPES, users=0,
+                chunk_size=CHUNK_SIZE, workers=1):
+    """Yield the dataset chunk by chunk, in order, using `workers` processes"""
+    jobs = [(index, min(chunk_size, rows - start), seed, courses, task_types, users)
+            for index, start in enumerate(range(0, rows, chunk_size))]
+    if workers <= 1:
+        for job in jobs:
+            yield _generate_chunk(job)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        # Results are taken in submission order, so the output matches a
+        # single-process run; bounding what is in flight keeps a slow writer
+        # from piling finished chunks up in memory
+        pending = deque()
+        for job in jobs:
+            if len(pending) >= workers * CHUNKS_AHEAD:
+                yield pending.popleft().get()
+            pending.append(pool.apply_async(_generate_chunk, (job,)))
+        while pending:
+            yield pending.popleft().get()
+
+
+def write_csv(chunks, path):
+    """Append chunks to a CSV file"""
+    rows = 0
+    for index, chunk in enumerate(chunks):
+        chunk.to_csv(path, mode='w' if index == 0 else 'a', header=index == 0, index=False)
+        rows += len(chunk)
+    return rows
+
+
+def write_parquet(chunks, path):
+    """Stream chunks into one Parquet file, one row group per chunk (needs pyarrow)"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet output requires pyarrow: pip install pyarrow")
+
+    rows = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def write_sqlite(chunks, path, labeled_fraction=1.0, seed=42, base_date=None, shards=1):
+    """Insert chunks into the tasks table of a scheduler database.
+
+    Labeled rows are stored as completed tasks; due dates are deadline_days
+    after `base_date`. Each user's rows go to the shard the router places
+    them on, as the app would.
+    """
+    from smart_scheduler import SmartScheduler
+    from storage import ShardRouter
+
+    scheduler = SmartScheduler(router=ShardRouter.from_count(path, shards))
+    router = scheduler.router
+    base = np.datetime64(base_date or date.today().isoformat(), 'D')
+    rows = 0
+    for index, chunk in enumerate(chunks):
+        rng = np.random.default_rng([seed, index, 1])
+        labeled = (rng.random(len(chunk)) < labeled_fraction).tolist()
+        due_dates = np.datetime_as_string(base + chunk['deadline_days'].to_numpy(), unit='D').tolist()
+        records = zip(
+            chunk['user_id'].tolist(), chunk['course'].tolist(), chunk['task_type'].tolist(),
+            chunk['difficulty'].tolist(), chunk['total_available_time'].tolist(),
+            chunk['deadline_days'].tolist(),
+            [actual if done else None for actual, done in zip(chunk['actual_time'].tolist(), labeled)],
+            due_dates, due_dates,
+            ['completed' if done else 'pending' for done in labeled],
+        )
+        placements = {user_id: router.shard_for(user_id) for user_id in chunk['user_id'].unique().tolist()}
+        by_shard = {}
+        for record in records:
+            by_shard.setdefault(placements[record[0]], []).append(record)
+        for shard, shard_records in sorted(by_shard.items()):
+            with router.shards[shard].transaction() as conn:
+                conn.executemany('''
+                    INSERT INTO tasks (
+                        user_id, course, task_type, difficulty, total_available_time,
+                        deadline_days, actual_time, due_date, due_time, due_at, status
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, '23:59', datetime(? || ' 23:59'), ?)
+                ''', shard_records)
+        rows += len(chunk)
+    return rows
+
 
-# Create DataFrame
-df = pd.DataFrame(data)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic task data")
+    parser.add_argument('--rows', type=int, default=30, help="number of rows")
+    parser.add_argument('--seed', type=int, default=42, help="random seed")
+    parser.add_argument('--courses', nargs='+', default=COURSES, help="course vocabulary")
+    parser.add_argument('--task-types', nargs='+', default=TASK_TYPES, help="task type vocabulary")
+    parser.add_argument('--users', type=int, default=0,
+                        help="add a user_id column drawn from this many users (sqlite needs at least 1)")
+    parser.add_argument('--format', choices=['csv', 'parquet', 'sqlite'], default='csv')
+    parser.add_argument('--output', default='training_data.csv', help="output file")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="rows per chunk")
+    parser.add_argument('--workers', type=int, default=1, help="worker processes")
+    parser.add_argument('--labeled-fraction', type=float, default=1.0,
+                        help="sqlite only: share of tasks stored as completed with actual_time")
+    parser.add_argument('--base-date', help="sqlite only: date due dates count from (default: today)")
+    parser.add_argument('--shards', type=int, default=int(os.environ.get('SCHEDULER_SHARDS', '1')),
+                        help="sqlite only: shard databases to spread users over, as the app is configured")
+    args = parser.parse_args(argv)
 
-# Save to CSV
-df.to_csv('training_data.csv', index=False)
+    if args.format == 'sqlite':
+        args.users = max(args.users, 1)
+    chunks = iter_chunks(args.rows, args.seed, args.courses, args.task_types, args.users,
+                         args.chunk_size, args.workers)
 
-# Display the first few rows
-print("First few rows of the generated dataset:")
-print(df.head())
+    started = time.perf_counter()
+    if args.format == 'csv':
+        rows = write_csv(chunks, args.output)
+    elif args.format == 'parquet':
+        rows = write_parquet(chunks, args.output)
+    else:
+        rows = write_sqlite(chunks, args.output, args.labeled_fraction, args.seed, args.base_date,
+                            args.shards)
+    print(f"Wrote {rows} rows to {args.output} in {time.perf_counter() - started:.1f}s")
 
-# Display summary statistics
-print("\nDataset summary:")
-print(df.describe())
 
-# Display value counts for categorical variables
-print("\nCourse distribution:")
-print(df['course'].value_counts())
-print("\nTask type distribution:")
-print(df['task_type'].value_counts())
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+# manage.py
+import argparse
+import json
+import os
+import sys
+
+import pandas as pd
+
+from smart_scheduler import SmartScheduler, ARCHIVE_AFTER_DAYS
+from model_store import ModelStore, DEFAULT_ARTIFACT_DIR
+from backends import BACKENDS, DEFAULT_BACKEND
+import storage
+import training
+import transfer
+
+
+def open_scheduler(args, backend=DEFAULT_BACKEND):
+    """SmartScheduler over the --db directory database and its --shards"""
+    return SmartScheduler(backend=backend, router=storage.ShardRouter.from_count(args.db, args.shards))
+
+
+def train(args):
+    """Retrain the model from a CSV and save a new artifact version"""
+    scheduler = open_scheduler(args, args.backend)
+    metadata = ModelStore(args.artifacts).train(scheduler, args.data)
+    print(f"Saved model version {metadata['version']} to {args.artifacts}")
+
+
+def train_tasks(args):
+    """Retrain from labeled rows in the tasks table, read in chunks, on all cores"""
+    scheduler = open_scheduler(args, args.backend)
+    report = training.train_from_tasks(
+        scheduler, ModelStore(args.artifacts),
+        base_data=args.data, include_base=not args.no_base,
+        chunksize=args.chunksize, fraction=args.sample,
+        stratify=args.stratify, n_jobs=args.n_jobs, seed=args.seed,
+    )
+    for key, value in report.items():
+        print(f"{key}: {value}")
+
+
+def evaluate(args):
+    """Compare model backends on the labeled task history with time-ordered splits"""
+    scheduler = open_scheduler(args)
+    df = training.load_labeled_tasks(scheduler, args.chunksize, args.sample)
+    if args.data:
+        df = pd.concat([pd.read_csv(args.data), df], ignore_index=True)
+    results = training.evaluate_backends(df, args.backends, args.folds, args.repeat)
+    print(json.dumps({'rows': len(df), 'folds': args.folds, 'backends': results}, indent=2))
+
+
+def model_info(args):
+    """Print metadata of the latest saved model"""
+    metadata = ModelStore(args.artifacts).metadata()
+    if metadata is None:
+        print(f"No model artifact in {args.artifacts}")
+        return
+    for key, value in metadata.items():
+        print(f"{key}: {value}")
+
+
+def rebuild_stats(args):
+    """Recompute the per-user insight aggregates from the tasks table"""
+    open_scheduler(args).rebuild_user_stats()
+    print("Rebuilt user statistics")
+
+
+def sweep_overdue(args):
+    """Mark pending tasks whose deadline has passed as overdue (for cron)"""
+    swept = open_scheduler(args).sweep_overdue(batch_size=args.batch_size)
+    print(f"Marked {swept} tasks overdue")
+
+
+def archive_tasks(args):
+    """Move completed tasks due more than N days ago into tasks_archive (for cron)"""
+    moved = open_scheduler(args).archive_completed(args.older_than_days, batch_size=args.batch_size)
+    print(f"Archived {moved} tasks")
+
+
+def rebalance(args):
+    """Move every user's tasks to their home shard for the current --shards"""
+    moved = storage.rebalance(open_scheduler(args))
+    print(f"Moved {moved} users")
+
+
+def move_user(args):
+    """Move one user's tasks to another shard"""
+    rows = open_scheduler(args).move_user(args.user_id, args.shard)
+    print(f"Moved {rows} tasks of user {args.user_id} to shard {args.shard}")
+
+
+def import_tasks(args):
+    """Import a user's tasks from a CSV or iCalendar file, chunk by chunk"""
+    scheduler = open_scheduler(args)
+    ModelStore(args.artifacts).load_or_train(scheduler, args.data)
+    fmt = args.format or transfer.guess_format(args.file)
+
+    def progress(report):
+        print(f"{report['rows']} rows read, {report['imported']} imported, {report['failed']} failed",
+              file=sys.stderr)
+
+    with open(args.file, encoding='utf-8-sig', newline='') as f:
+        report = transfer.import_tasks(scheduler, args.user_id, transfer.read_tasks(f, fmt),
+                                       chunk_size=args.chunk_size, progress=progress)
+    for error in report['errors']:
+        print(f"line {error['line']}: {error['error']}", file=sys.stderr)
+    print(f"Imported {report['imported']} of {report['rows']} tasks")
+
+
+def export_tasks(args):
+    """Write a user's tasks as CSV or iCalendar, streamed from the database"""
+    scheduler = open_scheduler(args)
+    fmt = args.format or transfer.guess_format(args.output)
+    rows = scheduler.iter_export_rows(args.user_id)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as f:
+            f.writelines(transfer.iter_export(rows, fmt))
+    else:
+        sys.stdout.writelines(transfer.iter_export(rows, fmt))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Smart Scheduler management commands")
+    parser.add_argument('--db', default='scheduler.db', help="SQLite database path")
+    parser.add_argument('--artifacts', default=DEFAULT_ARTIFACT_DIR, help="model artifact directory")
+    parser.add_argument('--shards', type=int, default=int(os.environ.get('SCHEDULER_SHARDS', '1')),
+                        help="number of task shard databases")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = commands.add_parser('train', help=train.__doc__)
+    train_parser.add_argument('--data', default='training_data.csv', help="training CSV")
+    train_parser.add_argument('--backend', choices=list(BACKENDS), default=DEFAULT_BACKEND)
+    train_parser.set_defaults(func=train)
+
+    tasks_parser = commands.add_parser('train-tasks', help=train_tasks.__doc__)
+    tasks_parser.add_argument('--data', default='training_data.csv', help="base CSV included in training")
+    tasks_parser.add_argument('--no-base', action='store_true',
+                              help="train on the tasks table only (the model is kept until --data changes)")
+    tasks_parser.add_argument('--chunksize', type=int, default=100000, help="rows read per chunk")
+    tasks_parser.add_argument('--sample', type=float, default=1.0, help="fraction of labeled rows to keep")
+    tasks_parser.add_argument('--stratify', nargs='+', choices=['course', 'task_type'],
+                              help="sample the same fraction within each group")
+    tasks_parser.add_argument('--n-jobs', type=int, default=-1, help="cores used by the fit (-1: all)")
+    tasks_parser.add_argument('--seed', type=int, default=42, help="sampling seed")
+    tasks_parser.add_argument('--backend', choices=list(BACKENDS), default=DEFAULT_BACKEND)
+    tasks_parser.set_defaults(func=train_tasks)
+
+    eval_parser = commands.add_parser('evaluate', help=evaluate.__doc__)
+    eval_parser.add_argument('--backends', nargs='+', choices=list(BACKENDS), help="default: all")
+    eval_parser.add_argument('--data', help="CSV of older labeled rows placed before the task history")
+    eval_parser.add_argument('--folds', type=int, default=3)
+    eval_parser.add_argument('--repeat', type=int, default=200, help="latency samples per backend")
+    eval_parser.add_argument('--chunksize', type=int, default=100000, help="rows read per chunk")
+    eval_parser.add_argument('--sample', type=float, default=1.0, help="fraction of labeled rows to keep")
+    eval_parser.set_defaults(func=evaluate)
+
+    info_parser = commands.add_parser('model-info', help=model_info.__doc__)
+    info_parser.set_defaults(func=model_info)
+
+    stats_parser = commands.add_parser('rebuild-stats', help=rebuild_stats.__doc__)
+    stats_parser.set_defaults(func=rebuild_stats)
+
+    sweep_parser = commands.add_parser('sweep-overdue', help=sweep_overdue.__doc__)
+    sweep_parser.add_argument('--batch-size', type=int, default=500, help="tasks updated per transaction")
+    sweep_parser.set_defaults(func=sweep_overdue)
+
+    archive_parser = commands.add_parser('archive-tasks', help=archive_tasks.__doc__)
+    archive_parser.add_argument('--older-than-days', type=int, default=ARCHIVE_AFTER_DAYS)
+    archive_parser.add_argument('--batch-size', type=int, default=500, help="tasks moved per transaction")
+    archive_parser.set_defaults(func=archive_tasks)
+
+    rebalance_parser = commands.add_parser('rebalance', help=rebalance.__doc__)
+    rebalance_parser.set_defaults(func=rebalance)
+
+    move_parser = commands.add_parser('move-user', help=move_user.__doc__)
+    move_parser.add_argument('--user-id', type=int, required=True)
+    move_parser.add_argument('--shard', type=int, required=True)
+    move_parser.set_defaults(func=move_user)
+
+    import_parser = commands.add_parser('import-tasks', help=import_tasks.__doc__)
+    import_parser.add_argument('file', help="CSV or .ics file")
+    import_parser.add_argument('--user-id', type=int, required=True)
+    import_parser.add_argument('--format', choices=transfer.FORMATS, help="default: from the file name")
+    import_parser.add_argument('--chunk-size', type=int, default=transfer.IMPORT_CHUNK_SIZE,
+                               help="rows predicted and inserted per transaction")
+    import_parser.add_argument('--data', default='training_data.csv', help="training CSV if no model is saved")
+    import_parser.set_defaults(func=import_tasks)
+
+    export_parser = commands.add_parser('export-tasks', help=export_tasks.__doc__)
+    export_parser.add_argument('--user-id', type=int, required=True)
+    export_parser.add_argument('--format', choices=transfer.FORMATS, help="default: from the output name, else csv")
+    export_parser.add_argument('--output', help="file to write (default: stdout)")
+    export_parser.set_defaults(func=export_tasks)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+# metrics.py
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from 50us to 10s
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return '{' + body + '}'
+
+
+class Histogram:
+    """Cumulative latency histogram with optional labels, in Prometheus style"""
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        """Record one observation for the given label values"""
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += 1
+            series[2] += value
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe the duration of a block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(s[0]), s[1], s[2]) for labels, s in self._series.items())
+        for labels, counts, count, total in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, ("le", bound))} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, ("le", "+Inf"))} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {count}')
+        return '\n'.join(lines)
+
+
+class Gauge:
+    """Value read from a callback each time metrics are rendered"""
+
+    def __init__(self, name, help, callback):
+        self.name = name
+        self.help = help
+        self.callback = callback
+
+    def render(self):
+        return '\n'.join([
+            f'# HELP {self.name} {self.help}',
+            f'# TYPE {self.name} gauge',
+            f'{self.name} {self.callback()}',
+        ])
+
+
+class Registry:
+    """Collection of metrics rendered together at /metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name, help, callback):
+        return self.register(Gauge(name, help, callback))
+
+    def render(self):
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    'scheduler_http_request_duration_seconds', 'HTTP request latency by route',
+    ('method', 'endpoint', 'status'))
+SQL_LATENCY = REGISTRY.histogram(
+    'scheduler_sql_statement_duration_seconds', 'SQLite statement execution time by statement kind',
+    ('statement',))
+CONNECTION_WAIT = REGISTRY.histogram(
+    'scheduler_db_connection_wait_seconds', 'Time spent waiting for a pooled connection')
+INFERENCE_LATENCY = REGISTRY.histogram(
+    'scheduler_inference_duration_seconds', 'predict_time latency by stage', ('stage',))
+TRAINING_DURATION = REGISTRY.histogram(
+    'scheduler_training_duration_seconds', 'Model fit duration',
+    buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0))
+
+
+def statement_kind(sql):
+    """Low-cardinality label for a SQL statement: its leading keyword"""
+    words = sql.lstrip(' \t\r\n(').split(None, 1)
+    return words[0].upper() if words else 'EMPTY'
+
+
+# Sampling profiler for slow requests, enabled with SCHEDULER_PROFILE_SLOW_MS
+PROFILE_SLOW_MS = float(os.environ.get('SCHEDULER_PROFILE_SLOW_MS', '0') or 0)
+PROFILE_DIR = os.environ.get('SCHEDULER_PROFILE_DIR', 'profiles')
+PROFILE_SAMPLE_RATE = int(os.environ.get('SCHEDULER_PROFILE_SAMPLE_EVERY', '1') or 1)
+
+# Only one request is profiled at a time
+_profile_lock = threading.Lock()
+_profile_counter = 0
+
+
+def init_app(app):
+    """Install request timing (and the optional slow-request profiler) on a Flask app"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        global _profile_counter
+        g._metrics_started = time.perf_counter()
+        if PROFILE_SLOW_MS > 0:
+            _profile_counter += 1
+            if _profile_counter % PROFILE_SAMPLE_RATE == 0 and _profile_lock.acquire(blocking=False):
+                g._profiler = cProfile.Profile()
+                g._profiler.enable()
+
+    @app.after_request
+    def _record_latency(response):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return response
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        labels = (request.method, endpoint, response.status_code)
+        name = request.endpoint or 'unmatched'
+        profiler = g.pop('_profiler', None)
+
+        def record():
+            elapsed = time.perf_counter() - started
+            REQUEST_LATENCY.observe(elapsed, *labels)
+            if profiler is not None:
+                profiler.disable()
+                _profile_lock.release()
+                if elapsed * 1000 >= PROFILE_SLOW_MS:
+                    os.makedirs(PROFILE_DIR, exist_ok=True)
+                    filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{int(elapsed * 1000)}ms.prof"
+                    profiler.dump_stats(os.path.join(PROFILE_DIR, filename))
+
+        if response.is_streamed:
+            # The body is produced while it is sent; time the request until the stream closes
+            response.call_on_close(record)
+        else:
+            record()
+        return response
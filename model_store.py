@@ -0,0 +1,160 @@
+# model_store.py
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import joblib
+import pandas as pd
+import sklearn
+
+from backends import backend_name, compile_model
+from generate_dataset import generate_chunk
+from smart_scheduler import ModelState
+
+# Bump when the layout of the saved payload changes
+ARTIFACT_FORMAT = 3
+DEFAULT_ARTIFACT_DIR = 'model_artifacts'
+METADATA_FILE = 'latest.json'
+# Synthetic rows fitted when there is neither an artifact nor training data
+SAMPLE_ROWS = 1000
+
+
+def fingerprint_file(path):
+    """SHA-256 of a training data file, used to detect when it changes"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelStore:
+    """Versioned on-disk store for the fitted model, encoders and scaler"""
+
+    def __init__(self, directory=DEFAULT_ARTIFACT_DIR, keep=3):
+        self.directory = directory
+        self.keep = keep
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def metadata(self):
+        """Metadata of the latest artifact, or None if nothing has been saved"""
+        try:
+            with open(self._path(METADATA_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def is_current(self, metadata, fingerprint=None, backend=None):
+        """Check that an artifact is loadable here and was built from the given data"""
+        if not metadata:
+            return False
+        if backend is not None and metadata.get('backend', 'forest') != backend:
+            return False
+        if metadata.get('format') != ARTIFACT_FORMAT:
+            return False
+        if metadata.get('sklearn_version') != sklearn.__version__:
+            return False
+        return fingerprint is None or metadata.get('fingerprint') == fingerprint
+
+    def save(self, state, fingerprint=None, source=None):
+        """Write a fitted model state as a new artifact version; returns its metadata.
+
+        The state is left untouched; callers stamp the returned version on it
+        before publishing it with swap_state.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        previous = self.metadata()
+        version = (previous['version'] + 1) if previous else 1
+        filename = f'model-v{version}.joblib'
+
+        payload = {
+            'model': state.model,
+            'label_encoders': state.label_encoders,
+            'scaler': state.scaler,
+            'forest': state.forest.arrays(),
+        }
+        # Uncompressed so numpy arrays can be memory-mapped on load
+        tmp_path = self._path(filename + '.tmp')
+        joblib.dump(payload, tmp_path)
+        os.replace(tmp_path, self._path(filename))
+
+        metadata = {
+            'version': version,
+            'format': ARTIFACT_FORMAT,
+            'filename': filename,
+            'fingerprint': fingerprint,
+            'source': source,
+            'backend': backend_name(state.model),
+            'sklearn_version': sklearn.__version__,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        tmp_path = self._path(METADATA_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(tmp_path, self._path(METADATA_FILE))
+
+        self._prune(version)
+        return metadata
+
+    def publish(self, scheduler, state, fingerprint=None, source=None):
+        """Save a new state, then make it live under its saved version"""
+        metadata = self.save(state, fingerprint=fingerprint, source=source)
+        state.version = metadata['version']
+        scheduler.swap_state(state)
+        return metadata
+
+    def _prune(self, latest_version):
+        """Delete artifacts older than the last `keep` versions"""
+        for version in range(1, latest_version - self.keep + 1):
+            try:
+                os.remove(self._path(f'model-v{version}.joblib'))
+            except FileNotFoundError:
+                pass
+
+    def load(self, scheduler, metadata=None, mmap=True):
+        """Load the latest artifact into the scheduler"""
+        metadata = metadata or self.metadata()
+        if metadata is None:
+            raise FileNotFoundError(f"No model artifact in {self.directory}")
+
+        payload = joblib.load(self._path(metadata['filename']), mmap_mode='r' if mmap else None)
+        # The flattened tree arrays stay memory-mapped
+        scheduler.swap_state(ModelState(
+            payload['model'],
+            payload['label_encoders'],
+            payload['scaler'],
+            compile_model(payload['model'], payload['forest']),
+            version=metadata['version'],
+        ))
+        return metadata
+
+    def train(self, scheduler, data_path):
+        """Fit the scheduler on a training CSV and save the result"""
+        fingerprint = fingerprint_file(data_path)
+        state = scheduler.fit_state(pd.read_csv(data_path))
+        return self.publish(scheduler, state, fingerprint=fingerprint, source=data_path)
+
+    def train_sample(self, scheduler, rows=SAMPLE_ROWS):
+        """Fit the scheduler on generated sample data and save the result"""
+        return self.publish(scheduler, scheduler.fit_state(generate_chunk(0, rows)), source='sample')
+
+    def load_or_train(self, scheduler, data_path):
+        """Load the saved model, retraining only if the training data or backend changed"""
+        metadata = self.metadata()
+        backend = backend_name(scheduler.model)
+        if not os.path.exists(data_path):
+            # Nothing to retrain from, so any loadable artifact will do
+            if self.is_current(metadata):
+                return self.load(scheduler, metadata)
+            print(f"Warning: no training data at {data_path}; training on generated sample data")
+            return self.train_sample(scheduler)
+
+        # Models retrained from the task history record the CSV they started
+        # from, so they too are kept only until the CSV changes
+        fingerprint = fingerprint_file(data_path)
+        if self.is_current(metadata, fingerprint, backend):
+            return self.load(scheduler, metadata)
+        return self.train(scheduler, data_path)
@@ -1,66 +1,66 @@
 # models.py
-from werkzeug.security import generate_password_hash, check_password_hash
 import sqlite3
+from db import get_database
+from auth import passwords
+from ttl_cache import TTLCache
+
+# Cached marker for ids with no user row (None means "not cached")
+MISSING = ()
 
 class User:
-    def __init__(self, db_path='scheduler.db'):
-        self.db_path = db_path
+    def __init__(self, db_path='scheduler.db', cache_ttl=60, router=None):
+        # Users live in the shard router's directory database
+        self.db_path = router.directory_path if router else db_path
+        self.db = router.directory if router else get_database(db_path)
+        self.cache = TTLCache(maxsize=10000, ttl=cache_ttl)
         self.setup_database()
-    
+
     def setup_database(self):
         """Initialize users table"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-    
+        with self.db.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    password_hash TEXT NOT NULL,
+                    email TEXT UNIQUE NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
     def create_user(self, username, password, email):
         """Create a new user"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
+        password_hash = passwords.hash(password)
         try:
-            password_hash = generate_password_hash(password)
-            c.execute('INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)',
-                     (username, password_hash, email))
-            conn.commit()
+            with self.db.transaction() as conn:
+                c = conn.execute('INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)',
+                                 (username, password_hash, email))
+            self.invalidate(c.lastrowid)
             return True
         except sqlite3.IntegrityError:
             return False
-        finally:
-            conn.close()
-    
+
     def verify_user(self, username, password):
         """Verify user credentials"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        c.execute('SELECT id, password_hash FROM users WHERE username = ?', (username,))
-        user = c.fetchone()
-        conn.close()
-        
-        if user and check_password_hash(user[1], password):
+        with self.db.connection() as conn:
+            user = conn.execute('SELECT id, password_hash FROM users WHERE username = ?',
+                                (username,)).fetchone()
+
+        if user and passwords.check(user[1], password):
             return user[0]  # Return user_id
         return None
-    
+
     def get_user_by_id(self, user_id):
-        """Get user by ID"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        c.execute('SELECT id, username, email FROM users WHERE id = ?', (user_id,))
-        user = c.fetchone()
-        conn.close()
-        
-        return user if user else None
\ No newline at end of file
+        """Get user by ID (cached for `cache_ttl` seconds)"""
+        user = self.cache.get(user_id)
+        if user is None:
+            with self.db.connection() as conn:
+                user = conn.execute('SELECT id, username, email FROM users WHERE id = ?',
+                                    (user_id,)).fetchone() or MISSING
+            self.cache.put(user_id, user)
+
+        return user if user else None
+
+    def invalidate(self, user_id):
+        """Forget the cached row of a user whose data changed"""
+        self.cache.invalidate(user_id)
@@ -0,0 +1,189 @@
+# planner.py
+import bisect
+import heapq
+import math
+import threading
+from datetime import datetime, timedelta
+
+DEFAULT_HOURS_PER_DAY = 4.0
+DEFAULT_DAY_START = '18:00'
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def daily_availability(hours_per_day=DEFAULT_HOURS_PER_DAY, day_start=DEFAULT_DAY_START, weekdays=range(7)):
+    """Study windows as {weekday: [(start_minute, end_minute)]}, one window a day"""
+    hour, minute = (int(part) for part in day_start.split(':'))
+    start = hour * 60 + minute
+    end = min(MINUTES_PER_DAY, start + int(round(hours_per_day * 60)))
+    return {weekday: [(start, end)] if end > start else [] for weekday in weekdays}
+
+
+def _parse_time(value):
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+class Planner:
+    """Earliest-deadline-first allocation of predicted hours into study windows.
+
+    Tasks are taken in (due_at, id) order and each fills the free time left
+    after the tasks before it, so the plan is fully described by that order
+    plus the minute each task finishes. Adding or completing a task only
+    re-flows the tasks ordered after it. Times are whole minutes from
+    midnight of the start day.
+    """
+
+    def __init__(self, availability=None, start=None):
+        self.availability = availability if availability is not None else daily_availability()
+        if not any(self.availability.get(weekday) for weekday in range(7)):
+            raise ValueError("Availability must include at least one study window")
+        self.start = start or datetime.now()
+        self.origin = self.start.replace(hour=0, minute=0, second=0, microsecond=0)
+        # One week of windows in minutes from the origin; the week repeats
+        first = self.origin.weekday()
+        self._week = sorted(
+            (day * MINUTES_PER_DAY + start, day * MINUTES_PER_DAY + end)
+            for day in range(7)
+            for start, end in self.availability.get((first + day) % 7, ())
+        )
+        self._week_ends = [end for _, end in self._week]
+        self._start_minute = self._minute(self.start)
+        self._first_free = self._next_window_minute(self._start_minute)
+        self._keys = []       # (due minute, task id), in EDF order
+        self._tasks = []      # task dicts, parallel to _keys
+        self._blocks = []     # per task: [(start minute, end minute)]
+        self._finish = []     # per task: minute its last block ends
+        self._labels = {}     # minute -> ISO label, shared by adjacent blocks
+        self._snapshot = None  # to_dict() result until the plan changes
+        self._lock = threading.Lock()
+
+    def _minute(self, moment):
+        delta = _parse_time(moment) - self.origin
+        return math.ceil(delta.total_seconds() / 60)
+
+    def _next_window_minute(self, minute):
+        """First minute at or after `minute` that falls in a study window"""
+        week, offset = divmod(minute, MINUTES_PER_WEEK)
+        index = bisect.bisect_right(self._week_ends, offset)
+        if index == len(self._week):
+            return (week + 1) * MINUTES_PER_WEEK + self._week[0][0]
+        return week * MINUTES_PER_WEEK + max(self._week[index][0], offset)
+
+    def is_current(self, now=None):
+        """True while a plan started now would match this one.
+
+        That holds until the first minute of study time after `start`
+        passes; from then on this plan books time that is already gone.
+        """
+        return self._minute(now or datetime.now()) <= self._first_free
+
+    def _time(self, minute):
+        label = self._labels.get(minute)
+        if label is None:
+            day, rest = divmod(minute, MINUTES_PER_DAY)
+            date = (self.origin + timedelta(days=day)).date().isoformat()
+            label = self._labels[minute] = f'{date}T{rest // 60:02d}:{rest % 60:02d}'
+        return label
+
+    def _entry(self, task):
+        minutes = max(1, math.ceil(float(task['hours']) * 60))
+        return (self._minute(task['due_at']), task['id']), dict(task, minutes=minutes)
+
+    def _allocate(self, task, pointer):
+        """Blocks for one task starting at `pointer`; returns (blocks, finish minute)"""
+        remaining = task['minutes']
+        blocks = []
+        week, offset = divmod(pointer, MINUTES_PER_WEEK)
+        base = week * MINUTES_PER_WEEK
+        index = bisect.bisect_right(self._week_ends, offset)
+        windows = self._week
+        while True:
+            if index == len(windows):
+                index = 0
+                base += MINUTES_PER_WEEK
+            start, end = windows[index]
+            start = max(base + start, pointer)
+            take = min(remaining, base + end - start)
+            pointer = start + take
+            blocks.append((start, pointer))
+            remaining -= take
+            if remaining == 0:
+                return blocks, pointer
+            index += 1
+
+    def _reflow(self, index):
+        """Recompute blocks for the tasks from position `index` onwards"""
+        pointer = self._finish[index - 1] if index else self._start_minute
+        del self._blocks[index:]
+        del self._finish[index:]
+        for task in self._tasks[index:]:
+            blocks, pointer = self._allocate(task, pointer)
+            self._blocks.append(blocks)
+            self._finish.append(pointer)
+        self._snapshot = None
+
+    def plan(self, tasks):
+        """Plan a full set of tasks (dicts with id, due_at and hours)"""
+        heap = [self._entry(task) for task in tasks]
+        heapq.heapify(heap)
+        with self._lock:
+            self._keys, self._tasks = [], []
+            while heap:
+                key, task = heapq.heappop(heap)
+                self._keys.append(key)
+                self._tasks.append(task)
+            self._reflow(0)
+        return self
+
+    def add(self, task):
+        """Insert one task, re-flowing only the tasks due after it"""
+        key, task = self._entry(task)
+        with self._lock:
+            index = bisect.bisect_left(self._keys, key)
+            self._keys.insert(index, key)
+            self._tasks.insert(index, task)
+            self._blocks.insert(index, [])
+            self._finish.insert(index, 0)
+            self._reflow(index)
+
+    def complete(self, task_id):
+        """Drop a finished task and pull the tasks after it forward"""
+        with self._lock:
+            for index, (_, key_id) in enumerate(self._keys):
+                if key_id == task_id:
+                    break
+            else:
+                return False
+            del self._keys[index], self._tasks[index], self._blocks[index], self._finish[index]
+            self._reflow(index)
+            return True
+
+    def to_dict(self):
+        """The plan as JSON-ready tasks, blocks and infeasible task ids"""
+        with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+            tasks, blocks, infeasible = [], [], []
+            for (due, task_id), task, task_blocks, finish in zip(
+                    self._keys, self._tasks, self._blocks, self._finish):
+                late = max(0, finish - due)
+                if late:
+                    infeasible.append(task_id)
+                tasks.append({
+                    'id': task_id,
+                    'due_at': self._time(due),
+                    'hours': round(task['minutes'] / 60, 2),
+                    'finish_at': self._time(finish),
+                    'feasible': not late,
+                    'late_hours': round(late / 60, 2),
+                })
+                blocks.extend({'task_id': task_id, 'start': self._time(start), 'end': self._time(end)}
+                              for start, end in task_blocks)
+            self._snapshot = {
+                'start': self._time(self._start_minute),
+                'tasks': tasks,
+                'blocks': blocks,
+                'infeasible': infeasible,
+            }
+            return self._snapshot
@@ -0,0 +1,6 @@
+# prediction_cache.py
+from ttl_cache import TTLCache
+
+
+class PredictionCache(TTLCache):
+    """LRU cache of predict_time results, keyed by model state stamp and features"""
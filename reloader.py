@@ -0,0 +1,67 @@
+# reloader.py
+import os
+import threading
+
+from model_store import METADATA_FILE
+
+
+class ModelReloader(threading.Thread):
+    """Background thread that swaps in new model versions as they are saved.
+
+    Every process serving requests runs one, so a model saved by `manage.py
+    train` or by the retrain worker in one process reaches all of them
+    without a restart. It polls the artifact store's metadata every
+    `interval` seconds; `trigger()` (wired to SIGHUP) checks immediately.
+    Loading maps the tree arrays from the artifact file and publishes them
+    with swap_state, so requests in flight finish on the old state.
+    """
+
+    def __init__(self, scheduler, store, interval=5):
+        super().__init__(name='model-reloader', daemon=True)
+        self.scheduler = scheduler
+        self.store = store
+        self.interval = interval
+        self.reloads = 0
+        self._mtime = None
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """Ask the reloader to exit"""
+        self._stop_event.set()
+        self._wake.set()
+
+    def trigger(self):
+        """Check for a new model version now (safe to call from a signal handler)"""
+        self._wake.set()
+
+    def reload_if_changed(self, force=False):
+        """Load the latest artifact if it is newer than the live model; returns its version"""
+        try:
+            mtime = os.stat(os.path.join(self.store.directory, METADATA_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime == self._mtime and not force:
+            return None
+        self._mtime = mtime
+
+        metadata = self.store.metadata()
+        if not self.store.is_current(metadata) or metadata['version'] == self.scheduler.model_version:
+            return None
+        self.store.load(self.scheduler, metadata)
+        self.reloads += 1
+        return metadata['version']
+
+    def run(self):
+        while not self._stop_event.is_set():
+            forced = self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop_event.is_set():
+                return
+            try:
+                version = self.reload_if_changed(force=forced)
+            except Exception as e:
+                print(f"Warning: model reload failed: {e}")
+            else:
+                if version is not None:
+                    print(f"Loaded model version {version} (pid {os.getpid()})")
@@ -0,0 +1,109 @@
+# retrainer.py
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def mean_absolute_error(state, df):
+    """MAE of a model state's predictions on labeled rows"""
+    predictions = np.maximum(0.5, state.forest.predict(state.pipeline.transform_frame(df)))
+    return float(np.mean(np.abs(predictions - df['actual_time'].to_numpy(dtype=np.float64))))
+
+
+class RetrainWorker(threading.Thread):
+    """Background thread that retrains on reported actual times and swaps the model in.
+
+    Fitting happens entirely on a new ModelState; the live scheduler only
+    sees the finished state, so requests never wait on a fit. `base_data`
+    (a DataFrame or CSV path) is always included in training.
+    """
+
+    def __init__(self, scheduler, base_data=None, store=None, fingerprint=None,
+                 min_new_labels=50, max_interval=6 * 3600, poll_interval=30,
+                 holdout_fraction=0.2, tolerance=0.05):
+        super().__init__(name='retrain-worker', daemon=True)
+        self.scheduler = scheduler
+        self.base_data = base_data
+        self.store = store
+        self.fingerprint = fingerprint
+        self.min_new_labels = min_new_labels
+        self.max_interval = max_interval
+        self.poll_interval = poll_interval
+        self.holdout_fraction = holdout_fraction
+        self.tolerance = tolerance
+        self.trained_labels = scheduler.count_labeled_tasks()
+        self.last_run = time.monotonic()
+        self.last_result = None
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """Ask the worker to exit after its current step"""
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                if self.should_retrain():
+                    self.retrain_once()
+            except Exception as e:
+                print(f"Warning: background retraining failed: {e}")
+
+    def should_retrain(self):
+        """Enough new labels, or any new label once max_interval has passed"""
+        new_labels = self.scheduler.count_labeled_tasks() - self.trained_labels
+        if new_labels >= self.min_new_labels:
+            return True
+        return new_labels > 0 and time.monotonic() - self.last_run >= self.max_interval
+
+    def split(self, labeled):
+        """Time-ordered split: the latest-due labels are held out for validation.
+
+        Rows are ordered by due_at, not id, since imported or moved tasks get
+        new ids; rows without one count as oldest. No more rows are held out
+        than labels added since the live model was trained.
+        """
+        labeled = labeled.sort_values('due_at', kind='stable', na_position='first')
+        unseen = max(0, len(labeled) - self.trained_labels)
+        n_holdout = min(unseen, int(len(labeled) * self.holdout_fraction))
+        if n_holdout == 0:
+            return labeled, labeled.iloc[:0]
+        return labeled.iloc[:-n_holdout], labeled.iloc[-n_holdout:]
+
+    def retrain_once(self):
+        """Fit, validate and (if not worse) publish a new model; returns a summary"""
+        labeled = self.scheduler.get_labeled_tasks()
+        train, holdout = self.split(labeled)
+        if self.base_data is not None:
+            base = pd.read_csv(self.base_data) if isinstance(self.base_data, str) else self.base_data
+            train = pd.concat([base, train], ignore_index=True)
+
+        started = time.perf_counter()
+        candidate = self.scheduler.fit_state(train)
+        result = {
+            'labels': len(labeled),
+            'holdout': len(holdout),
+            'fit_seconds': round(time.perf_counter() - started, 3),
+            'accepted': True,
+        }
+
+        live = self.scheduler.state
+        if len(holdout) and live.forest is not None:
+            result['candidate_mae'] = mean_absolute_error(candidate, holdout)
+            result['live_mae'] = mean_absolute_error(live, holdout)
+            result['accepted'] = result['candidate_mae'] <= result['live_mae'] * (1 + self.tolerance)
+
+        if result['accepted']:
+            # Validated: refit on everything, including the holdout, then publish
+            if len(holdout):
+                candidate = self.scheduler.fit_state(pd.concat([train, holdout], ignore_index=True))
+            if self.store is not None:
+                self.store.publish(self.scheduler, candidate, fingerprint=self.fingerprint, source='tasks')
+            else:
+                self.scheduler.swap_state(candidate)
+
+        self.trained_labels = len(labeled)
+        self.last_run = time.monotonic()
+        self.last_result = result
+        return result
@@ -0,0 +1,152 @@
+# serve.py
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+# Seconds an idle keep-alive connection is held open; bounds a graceful stop
+KEEPALIVE_TIMEOUT = 5
+# Pause before replacing a worker that died, so a crashing worker cannot spin
+RESPAWN_DELAY = 1.0
+
+
+class RequestHandler(WSGIRequestHandler):
+    timeout = KEEPALIVE_TIMEOUT
+
+
+def load_app():
+    """Import app.py in the master: the model is loaded once, before any fork"""
+    os.environ['SCHEDULER_PREFORK'] = '1'
+    os.environ['SCHEDULER_WARMUP'] = 'off'
+    import app
+    import db
+
+    app.warmup.run()
+    if not app.warmup.ready:
+        sys.exit(f"Warm-up failed: {app.warmup.error}")
+    # Serve from the memory-mapped artifact even if the model was just trained,
+    # so workers share the tree arrays through the page cache
+    metadata = app.model_store.metadata()
+    if app.model_store.is_current(metadata):
+        app.model_store.load(app.scheduler, metadata)
+    # SQLite connections must not cross a fork; each worker opens its own
+    db.close_all_databases()
+    # Objects that exist now are never collected, so the collector does not
+    # write to (and un-share) their pages in every worker
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def run_worker(app_module, sock, index):
+    """Serve requests from the shared listening socket until SIGTERM"""
+    # Drop the master's handlers, which would signal this worker's siblings
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, app_module.app, threaded=True,
+                         request_handler=RequestHandler, fd=sock.fileno())
+    # Let requests in flight finish when stopping
+    server.daemon_threads = False
+
+    reloader = app_module.start_model_reloader()
+    if reloader is not None:
+        # A respawned worker starts from the master's model; catch up first
+        reloader.reload_if_changed()
+        signal.signal(signal.SIGHUP, lambda signum, frame: reloader.trigger())
+    if index == 0:
+        app_module.start_maintenance()
+
+    signal.signal(signal.SIGTERM,
+                  lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    server.serve_forever()
+    server.server_close()
+
+
+class PreforkServer:
+    """Master process that forks workers sharing one listening socket and model.
+
+    Workers that die are replaced. SIGHUP is forwarded to every worker to
+    load the newest saved model now; SIGTERM or SIGINT stops the workers
+    gracefully and exits once they have.
+    """
+
+    def __init__(self, app_module, sock, workers):
+        self.app_module = app_module
+        self.sock = sock
+        self.workers = workers
+        self.children = {}
+        self.stopping = False
+
+    def spawn(self, index):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.app_module, self.sock, index)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = index
+
+    def signal_workers(self, signum):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+        self.signal_workers(signal.SIGTERM)
+
+    def run(self):
+        signal.signal(signal.SIGHUP, lambda signum, frame: self.signal_workers(signal.SIGHUP))
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for index in range(self.workers):
+            self.spawn(index)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index = self.children.pop(pid, None)
+            if index is None or self.stopping:
+                continue
+            print(f"Worker {index} (pid {pid}) exited with status {status}; restarting",
+                  file=sys.stderr)
+            time.sleep(RESPAWN_DELAY)
+            if not self.stopping:
+                self.spawn(index)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the app from pre-forked worker processes")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+    if not hasattr(os, 'fork'):
+        parser.error("pre-forking needs os.fork; run app.py on this platform")
+
+    app_module = load_app()
+    sock = socket.create_server((args.host, args.port), backlog=128)
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers "
+          f"(master pid {os.getpid()})", file=sys.stderr)
+    PreforkServer(app_module, sock, args.workers).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,30 +2,283 @@ import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.ensemble import RandomForestRegressor
-import sqlite3
-from datetime import datetime, timedelta
+from sklearn.base import clone
+from datetime import date, datetime, timedelta, time as time_of_day
+import itertools
+import base64
+import json
+import time
+from contextlib import contextmanager
+from storage import SHARD_ID_BITS, ShardRouter
+from feature_pipeline import FeaturePipeline, CATEGORICAL_FEATURES, NUMERICAL_FEATURES
+from backends import DEFAULT_BACKEND, compile_model, make_model
+from prediction_cache import PredictionCache
+from metrics import INFERENCE_LATENCY, TRAINING_DURATION
 
-class SmartScheduler:
-    def __init__(self, db_path='scheduler.db'):
-        self.db_path = db_path
-        self.label_encoders = {}
-        self.scaler = StandardScaler()
-        self.model = RandomForestRegressor(random_state=42)
-        self.setup_database()
-    
-    def connect_db(self):
-        """Create a database connection"""
-        return sqlite3.connect(self.db_path)
-    
-    def setup_database(self):
-        """Initialize SQLite database with required tables"""
-        conn = self.connect_db()
-        c = conn.cursor()
-        
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+# Stamps identifying each model state, so cached predictions never outlive it
+_model_stamps = itertools.count(1)
+
+# Largest batch evaluated with the compiled forest instead of sklearn
+COMPILED_BATCH_LIMIT = 1000
+
+def _stats_delta(row, sign):
+    """Trigger body adding ('+') or removing ('-') one task row's contribution to the aggregates"""
+    labeled = f"{row}.actual_time IS NOT NULL"
+    return f'''
+        INSERT OR IGNORE INTO user_stats (user_id) VALUES ({row}.user_id);
+        UPDATE user_stats SET
+            completed_count = completed_count {sign} ({row}.status IS 'completed'),
+            labeled_count = labeled_count {sign} ({labeled}),
+            error_count = error_count {sign} ({labeled} AND {row}.predicted_time IS NOT NULL),
+            sum_abs_error = sum_abs_error {sign} COALESCE(ABS({row}.predicted_time - {row}.actual_time), 0),
+            sum_time_ratio = sum_time_ratio {sign} COALESCE({row}.actual_time * 100.0 / {row}.total_available_time, 0),
+            sum_actual_time = sum_actual_time {sign} COALESCE({row}.actual_time, 0),
+            sum_available_time = sum_available_time {sign} (CASE WHEN {labeled} THEN {row}.total_available_time ELSE 0 END)
+        WHERE user_id = {row}.user_id;
+        INSERT OR IGNORE INTO user_course_stats (user_id, course)
+            SELECT {row}.user_id, {row}.course WHERE {labeled};
+        UPDATE user_course_stats SET
+            labeled_count = labeled_count {sign} 1,
+            error_count = error_count {sign} ({row}.predicted_time IS NOT NULL),
+            sum_abs_error = sum_abs_error {sign} COALESCE(ABS({row}.predicted_time - {row}.actual_time), 0),
+            sum_actual_time = sum_actual_time {sign} {row}.actual_time
+        WHERE user_id = {row}.user_id AND course = {row}.course AND {labeled};
+        INSERT OR IGNORE INTO user_task_type_stats (user_id, task_type)
+            SELECT {row}.user_id, {row}.task_type WHERE {labeled};
+        UPDATE user_task_type_stats SET
+            labeled_count = labeled_count {sign} 1,
+            error_count = error_count {sign} ({row}.predicted_time IS NOT NULL),
+            sum_abs_error = sum_abs_error {sign} COALESCE(ABS({row}.predicted_time - {row}.actual_time), 0),
+            sum_actual_time = sum_actual_time {sign} {row}.actual_time
+        WHERE user_id = {row}.user_id AND task_type = {row}.task_type AND {labeled};
+    '''
+
+
+def parse_due(due_date, due_time=None):
+    """Validate a task's due date and time; returns them as ('YYYY-MM-DD', 'HH:MM').
+
+    A missing time (None, NaN, '') means end of day. Anything SQLite's
+    datetime() would not parse, like '9:00' or 'June 1', raises ValueError.
+    """
+    try:
+        day = date.fromisoformat(str(due_date).strip())
+    except ValueError:
+        raise ValueError(f"invalid due_date {due_date!r} (expected YYYY-MM-DD)") from None
+    if due_time is None or pd.isna(due_time) or str(due_time).strip() == '':
+        return day.isoformat(), '23:59'
+    try:
+        at = time_of_day.fromisoformat(str(due_time).strip())
+    except ValueError:
+        raise ValueError(f"invalid due_time {due_time!r} (expected HH:MM)") from None
+    return day.isoformat(), at.strftime('%H:%M')
+
+
+def rebuild_stats_statements(source, per_user=False):
+    """Statements recomputing every aggregate from `source` (tasks or all_tasks).
+
+    With `per_user`, only the rows of the `:user_id` parameter are rebuilt.
+    """
+    scope = 'user_id = :user_id' if per_user else '1'
+    return [
+        f"DELETE FROM user_stats WHERE {scope}",
+        f"DELETE FROM user_course_stats WHERE {scope}",
+        f"DELETE FROM user_task_type_stats WHERE {scope}",
+        f'''
+            INSERT INTO user_stats (
+                user_id, completed_count, labeled_count, error_count, sum_abs_error,
+                sum_time_ratio, sum_actual_time, sum_available_time
+            )
+            SELECT user_id,
+                SUM(status IS 'completed'),
+                SUM(actual_time IS NOT NULL),
+                SUM(actual_time IS NOT NULL AND predicted_time IS NOT NULL),
+                TOTAL(ABS(predicted_time - actual_time)),
+                TOTAL(actual_time * 100.0 / total_available_time),
+                TOTAL(actual_time),
+                TOTAL(CASE WHEN actual_time IS NOT NULL THEN total_available_time END)
+            FROM {source}
+            WHERE {scope}
+            GROUP BY user_id
+        ''',
+        f'''
+            INSERT INTO user_course_stats (user_id, course, labeled_count, error_count, sum_abs_error, sum_actual_time)
+            SELECT user_id, course, COUNT(*), SUM(predicted_time IS NOT NULL),
+                TOTAL(ABS(predicted_time - actual_time)), TOTAL(actual_time)
+            FROM {source}
+            WHERE actual_time IS NOT NULL AND {scope}
+            GROUP BY user_id, course
+        ''',
+        f'''
+            INSERT INTO user_task_type_stats (user_id, task_type, labeled_count, error_count, sum_abs_error, sum_actual_time)
+            SELECT user_id, task_type, COUNT(*), SUM(predicted_time IS NOT NULL),
+                TOTAL(ABS(predicted_time - actual_time)), TOTAL(actual_time)
+            FROM {source}
+            WHERE actual_time IS NOT NULL AND {scope}
+            GROUP BY user_id, task_type
+        ''',
+    ]
+
+
+# Recompute every aggregate from the live tasks table (as migration 2 did)
+REBUILD_STATS = rebuild_stats_statements('tasks')
+
+# Columns shared by the live and archived task tables
+TASK_COLUMNS = [
+    'id', 'user_id', 'course', 'task_type', 'difficulty', 'total_available_time', 'deadline_days',
+    'predicted_time', 'actual_time', 'due_date', 'due_time', 'status', 'created_at', 'due_at',
+]
+
+# Completed tasks past the archive cutoff, oldest deadline first
+ARCHIVE_BATCH_QUERY = '''
+    SELECT id FROM tasks
+    WHERE status = 'completed' AND due_at < ?
+    ORDER BY due_at
+    LIMIT ?
+'''
+
+# Completed tasks due more than this many days ago move to tasks_archive
+ARCHIVE_AFTER_DAYS = 90
+
+# Wall clock used for due comparisons inside SQLite
+NOW_SQL = "datetime('now', 'localtime')"
+
+# Schedule sort key: tasks without a due_at (unparseable legacy input) list last.
+# The plain >= bound lets SQLite seek the expression index; the row value alone does not
+NO_DUE_AT = '9999-12-31 23:59:59'
+SCHEDULE_DUE_KEY = f"COALESCE(due_at, '{NO_DUE_AT}')"
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+MIGRATIONS = [
+    # 1: materialized due timestamp kept in sync by triggers, plus indexes
+    [
+        "ALTER TABLE tasks ADD COLUMN due_at TIMESTAMP",
+        "UPDATE tasks SET due_at = datetime(due_date || ' ' || due_time)",
+        '''
+            CREATE TRIGGER IF NOT EXISTS tasks_due_at_insert
+            AFTER INSERT ON tasks WHEN NEW.due_at IS NULL
+            BEGIN
+                UPDATE tasks SET due_at = datetime(NEW.due_date || ' ' || NEW.due_time)
+                WHERE id = NEW.id;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS tasks_due_at_update
+            AFTER UPDATE OF due_date, due_time ON tasks
+            BEGIN
+                UPDATE tasks SET due_at = datetime(NEW.due_date || ' ' || NEW.due_time)
+                WHERE id = NEW.id;
+            END
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_tasks_user_status_due ON tasks (user_id, status, due_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_user_created ON tasks (user_id, created_at)",
+    ],
+    # 2: per-user aggregates for insights, maintained by triggers
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS user_stats (
+                user_id INTEGER PRIMARY KEY,
+                completed_count INTEGER NOT NULL DEFAULT 0,
+                labeled_count INTEGER NOT NULL DEFAULT 0,
+                error_count INTEGER NOT NULL DEFAULT 0,
+                sum_abs_error REAL NOT NULL DEFAULT 0,
+                sum_time_ratio REAL NOT NULL DEFAULT 0,
+                sum_actual_time REAL NOT NULL DEFAULT 0,
+                sum_available_time REAL NOT NULL DEFAULT 0
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS user_course_stats (
+                user_id INTEGER NOT NULL,
+                course TEXT NOT NULL,
+                labeled_count INTEGER NOT NULL DEFAULT 0,
+                error_count INTEGER NOT NULL DEFAULT 0,
+                sum_abs_error REAL NOT NULL DEFAULT 0,
+                sum_actual_time REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, course)
+            ) WITHOUT ROWID
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS user_task_type_stats (
+                user_id INTEGER NOT NULL,
+                task_type TEXT NOT NULL,
+                labeled_count INTEGER NOT NULL DEFAULT 0,
+                error_count INTEGER NOT NULL DEFAULT 0,
+                sum_abs_error REAL NOT NULL DEFAULT 0,
+                sum_actual_time REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, task_type)
+            ) WITHOUT ROWID
+        ''',
+        f'''
+            CREATE TRIGGER IF NOT EXISTS tasks_stats_insert
+            AFTER INSERT ON tasks
+            BEGIN
+                {_stats_delta('NEW', '+')}
+            END
+        ''',
+        f'''
+            CREATE TRIGGER IF NOT EXISTS tasks_stats_update
+            AFTER UPDATE OF user_id, course, task_type, total_available_time,
+                predicted_time, actual_time, status ON tasks
+            BEGIN
+                {_stats_delta('OLD', '-')}
+                {_stats_delta('NEW', '+')}
+            END
+        ''',
+        *REBUILD_STATS,
+    ],
+    # 3: per-user write version, used for dashboard cache validation
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS user_versions (
+                user_id INTEGER PRIMARY KEY,
+                write_version INTEGER NOT NULL DEFAULT 0,
+                last_write_at TIMESTAMP
+            )
+        ''',
+        '''
+            INSERT OR IGNORE INTO user_versions (user_id, write_version, last_write_at)
+            SELECT DISTINCT user_id, 1, CURRENT_TIMESTAMP FROM tasks
+        ''',
+        *[
+            f'''
+                CREATE TRIGGER IF NOT EXISTS tasks_version_{event.lower()}
+                AFTER {event} ON tasks
+                BEGIN
+                    INSERT OR IGNORE INTO user_versions (user_id) VALUES ({row}.user_id);
+                    UPDATE user_versions
+                    SET write_version = write_version + 1, last_write_at = CURRENT_TIMESTAMP
+                    WHERE user_id = {row}.user_id;
+                END
+            '''
+            for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD'))
+        ],
+    ],
+    # 4: stored 'overdue' status, set by the sweeper and kept honest by triggers
+    [
+        "CREATE INDEX IF NOT EXISTS idx_tasks_status_due ON tasks (status, due_at)",
+        f"UPDATE tasks SET status = 'overdue' WHERE status = 'pending' AND due_at < {NOW_SQL}",
+        f'''
+            CREATE TRIGGER IF NOT EXISTS tasks_overdue_insert
+            AFTER INSERT ON tasks WHEN NEW.status = 'pending'
+            BEGIN
+                UPDATE tasks SET status = 'overdue'
+                WHERE id = NEW.id AND due_at < {NOW_SQL};
+            END
+        ''',
+        f'''
+            CREATE TRIGGER IF NOT EXISTS tasks_overdue_reschedule
+            AFTER UPDATE OF due_at ON tasks
+            WHEN NEW.status = 'overdue' AND NEW.due_at >= {NOW_SQL}
+            BEGIN
+                UPDATE tasks SET status = 'pending' WHERE id = NEW.id;
+            END
+        ''',
+    ],
+    # 5: cold partition for old completed tasks, and a view over both partitions
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS tasks_archive (
+                id INTEGER PRIMARY KEY,
                 user_id INTEGER NOT NULL,
                 course TEXT NOT NULL,
                 task_type TEXT NOT NULL,
@@ -36,186 +289,816 @@ class SmartScheduler:
                 actual_time REAL,
                 due_date DATE NOT NULL,
                 due_time TIME NOT NULL DEFAULT '23:59',
-                status TEXT DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
+                status TEXT DEFAULT 'completed',
+                created_at TIMESTAMP,
+                due_at TIMESTAMP,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_tasks_archive_user_created ON tasks_archive (user_id, created_at)",
+        f'''
+            CREATE VIEW IF NOT EXISTS all_tasks AS
+            SELECT {', '.join(TASK_COLUMNS)} FROM tasks
+            UNION ALL
+            SELECT {', '.join(TASK_COLUMNS)} FROM tasks_archive
+        ''',
+    ],
+    # 6: tombstones for users moved off a shard, so stale placements find the new one
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS moved_users (
+                user_id INTEGER PRIMARY KEY,
+                shard INTEGER NOT NULL
+            )
+        ''',
+    ],
+    # 7: schedule order that keeps tasks without a due_at (listed last) in the keyset
+    [
+        f"CREATE INDEX IF NOT EXISTS idx_tasks_user_status_due_key ON tasks (user_id, status, {SCHEDULE_DUE_KEY}, id)",
+    ],
+    # 8: markers for rows a move has copied in but not yet finished, so it can be resumed or undone
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS moves_in (
+                user_id INTEGER PRIMARY KEY,
+                source INTEGER NOT NULL,
+                first_id INTEGER NOT NULL,
+                last_id INTEGER NOT NULL
+            )
+        ''',
+    ],
+]
+
+# Lookups of a user's shard before giving up on chasing moves
+MAX_PLACEMENT_ATTEMPTS = 3
+
+SCHEDULE_QUERY = '''
+    SELECT *, 
+        status as current_status,
+        CASE
+            WHEN status = 'overdue'
+            THEN ROUND((julianday('now', 'localtime') - julianday(due_at)) * 24, 1)
+            ELSE 0
+        END as hours_overdue
+    FROM tasks 
+    WHERE user_id = ?
+    ORDER BY 
+        CASE status
+            WHEN 'completed' THEN 3
+            WHEN 'pending' THEN 1
+            ELSE 2  -- overdue tasks
+        END,
+        due_at ASC
+'''
+
+INSERT_TASK_QUERY = '''
+    INSERT INTO tasks (
+        user_id, course, task_type, difficulty, total_available_time, 
+        deadline_days, predicted_time, actual_time, due_date, due_time, due_at, status
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime(? || ' ' || ?), ?)
+'''
+
+TASK_STATUSES = ('pending', 'overdue', 'completed')
+
+# Schedule ordering: (rank, current status, filter), pages walk ranks in order
+SCHEDULE_RANKS = [
+    (1, 'pending', "status = 'pending'"),
+    (2, 'overdue', "status = 'overdue'"),
+    (3, 'completed', "status = 'completed'"),
+]
+STATUS_RANKS = {status: rank for rank, status, _ in SCHEDULE_RANKS}
+
+SCHEDULE_PAGE_QUERY = '''
+    SELECT id, user_id, course, task_type, difficulty, total_available_time,
+        deadline_days, predicted_time, actual_time, due_date, due_time, due_at,
+        status, created_at,
+        CASE
+            WHEN due_at < :now
+            THEN ROUND((julianday(:now) - julianday(due_at)) * 24, 1)
+            ELSE 0
+        END as hours_overdue
+    FROM tasks
+    WHERE user_id = :user_id AND {condition}
+        AND {due_key} >= :after_due_at AND ({due_key}, id) > (:after_due_at, :after_id)
+    ORDER BY {due_key}, id
+    LIMIT :limit
+'''
+
+
+def encode_schedule_cursor(now, task):
+    """Opaque keyset cursor pointing just after a schedule row"""
+    position = [now, STATUS_RANKS[task['current_status']], task['due_at'] or NO_DUE_AT, task['id']]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+
+def decode_schedule_cursor(cursor):
+    """Inverse of encode_schedule_cursor; raises ValueError on malformed input"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        now, rank, due_at, task_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception as e:
+        raise ValueError(f"Invalid schedule cursor: {e}")
+    return now, int(rank), due_at, int(task_id)
+
+
+# Labeled rows plus due_at, for callers that order them by time themselves
+DUE_LABELED_TASKS_QUERY = '''
+    SELECT course, task_type, difficulty, total_available_time, deadline_days, actual_time, due_at
+    FROM all_tasks
+    WHERE actual_time IS NOT NULL
+'''
+
+# Archived history first, then live tasks, each in id order (two scans, no sort)
+LABELED_TASKS_QUERY = '''
+    SELECT * FROM (
+        SELECT course, task_type, difficulty, total_available_time, deadline_days, actual_time
+        FROM tasks_archive
+        WHERE actual_time IS NOT NULL
+        ORDER BY id
+    )
+    UNION ALL
+    SELECT * FROM (
+        SELECT course, task_type, difficulty, total_available_time, deadline_days, actual_time
+        FROM tasks
+        WHERE actual_time IS NOT NULL
+        ORDER BY id
+    )
+'''
+
+# One small batch of pending tasks whose deadline has passed
+SWEEP_OVERDUE_QUERY = '''
+    UPDATE tasks SET status = 'overdue'
+    WHERE id IN (
+        SELECT id FROM tasks
+        WHERE status = 'pending' AND due_at < :now
+        ORDER BY due_at
+        LIMIT :batch_size
+    )
+'''
+
+PLAN_TASKS_QUERY = '''
+    SELECT id, due_at, COALESCE(predicted_time, 0.5) AS hours
+    FROM tasks
+    WHERE user_id = ? AND status IS NOT 'completed' AND due_at IS NOT NULL
+'''
+
+# Compact dtypes for streaming training rows out of the tasks table
+TRAINING_DTYPES = {
+    'course': 'category',
+    'task_type': 'category',
+    'difficulty': 'int8',
+    'total_available_time': 'float32',
+    'deadline_days': 'int16',
+    'actual_time': 'float32',
+}
+
+# Columns of a task export, in file order
+EXPORT_COLUMNS = [
+    'id', 'course', 'task_type', 'difficulty', 'total_available_time', 'deadline_days',
+    'predicted_time', 'actual_time', 'due_date', 'due_time', 'due_at', 'status', 'created_at',
+]
+
+EXPORT_TASKS_QUERY = f'''
+    SELECT {', '.join(EXPORT_COLUMNS)}
+    FROM all_tasks
+    WHERE user_id = ?
+    ORDER BY id
+'''
+
+DASHBOARD_TASKS_QUERY = '''
+    SELECT *, 
+           status as current_status
+    FROM tasks 
+    WHERE user_id = ?
+    ORDER BY created_at DESC
+'''
+
+class ModelState:
+    """Everything a prediction needs, published to SmartScheduler as one object.
+
+    A state is never modified once it is live; retraining builds a new one
+    and swaps it in, so a prediction always sees one consistent model.
+    `forest` is the model compiled for serving (see backends.compile_model).
+    """
+
+    def __init__(self, model, label_encoders=None, scaler=None, forest=None, version=None):
+        self.model = model
+        self.label_encoders = label_encoders or {}
+        self.scaler = scaler
+        self.pipeline = FeaturePipeline.from_fitted(label_encoders, scaler) if scaler is not None else None
+        self.forest = forest
+        self.version = version
+        self.stamp = next(_model_stamps)
+
+    @classmethod
+    def fit(cls, df, model):
+        """Fit encoders, scaler and model on a training DataFrame"""
+        label_encoders = {col: LabelEncoder().fit(df[col]) for col in CATEGORICAL_FEATURES}
+        scaler = StandardScaler().fit(df[NUMERICAL_FEATURES].to_numpy(dtype=np.float64))
+        pipeline = FeaturePipeline.from_fitted(label_encoders, scaler)
+        # Trees train on float32 anyway; building it directly skips sklearn's copy
+        model.fit(pipeline.transform_frame(df, dtype=np.float32), df['actual_time'])
+        return cls(model, label_encoders, scaler, compile_model(model))
+
+class SmartScheduler:
+    def __init__(self, db_path='scheduler.db', backend=DEFAULT_BACKEND, router=None):
+        self.router = router or ShardRouter(db_path)
+        self.db_path = self.router.directory_path
+        self.db = self.router.shards[0]
+        self.state = ModelState(make_model(backend))
+        self.prediction_cache = PredictionCache()
+        for shard in range(len(self.router)):
+            self.setup_database(shard)
+        self.recover_moves()
+    
+    def database_for(self, user_id=None):
+        """The shard Database holding a user's tasks (the first shard without a user)"""
+        return self.db if user_id is None else self.router.database_for(user_id)
+    
+    def _moved_away(self, conn, user_id):
+        """Whether a user's tasks have been moved off the shard behind `conn`"""
+        if len(self.router) == 1:
+            return False
+        return conn.execute('SELECT 1 FROM moved_users WHERE user_id = ?', (user_id,)).fetchone() is not None
+
+    @contextmanager
+    def _on_user_shard(self, user_id, write):
+        """Connection (or write transaction) on a user's shard, following moves.
 
+        Placements are cached per process, so after another process moves
+        a user this one may still route to the drained shard. The tombstone
+        move_user leaves there sends it back to the directory. Writes check
+        inside their transaction, so none can land on a drained shard.
+        """
+        for _ in range(MAX_PLACEMENT_ATTEMPTS):
+            db = self.router.database_for(user_id)
+            with (db.transaction() if write else db.connection()) as conn:
+                if not self._moved_away(conn, user_id):
+                    yield conn
+                    return
+            self.router.forget(user_id)
+        raise LookupError(f"User {user_id} keeps moving between shards; try again")
+
+    def connect_db(self, user_id=None):
+        """Borrow a pooled connection to a user's shard (use as a context manager)"""
+        if user_id is None:
+            return self.db.connection()
+        return self._on_user_shard(user_id, write=False)
+
+    def user_transaction(self, user_id):
+        """Write transaction on a user's shard (use as a context manager)"""
+        return self._on_user_shard(user_id, write=True)
+    
+    def setup_database(self, shard=0):
+        """Initialize one shard database with the required tables"""
+        with self.router.shards[shard].transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    course TEXT NOT NULL,
+                    task_type TEXT NOT NULL,
+                    difficulty INTEGER NOT NULL,
+                    total_available_time REAL NOT NULL,
+                    deadline_days INTEGER NOT NULL,
+                    predicted_time REAL,
+                    actual_time REAL,
+                    due_date DATE NOT NULL,
+                    due_time TIME NOT NULL DEFAULT '23:59',
+                    status TEXT DEFAULT 'pending',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            ''')
+            # Each shard hands out task ids from its own range
+            conn.execute('''
+                INSERT INTO sqlite_sequence (name, seq)
+                SELECT 'tasks', ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'tasks')
+            ''', (shard << SHARD_ID_BITS,))
+            self.migrate(conn)
+
+    def migrate(self, conn):
+        """Apply pending schema migrations inside the current transaction"""
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {number}')
+
+    # Read-only views of the live model state
+    model = property(lambda self: self.state.model)
+    label_encoders = property(lambda self: self.state.label_encoders)
+    scaler = property(lambda self: self.state.scaler)
+    pipeline = property(lambda self: self.state.pipeline)
+    forest = property(lambda self: self.state.forest)
+    model_stamp = property(lambda self: self.state.stamp)
+    
+    @property
+    def model_version(self):
+        return self.state.version
+    
     def preprocess_data(self, df):
-        """Preprocess data for model training"""
-        # Create copies to avoid modifying original data
-        X = df.copy()
-        y = X.pop('actual_time') if 'actual_time' in X else None
-        
-        # Encode categorical variables
-        categorical_cols = ['course', 'task_type']
-        for col in categorical_cols:
-            if col not in self.label_encoders:
-                self.label_encoders[col] = LabelEncoder()
-            
-            # Get unique values including new ones
-            unique_values = list(self.label_encoders[col].classes_) if hasattr(self.label_encoders[col], 'classes_') else []
-            current_values = X[col].unique()
-            all_values = list(set(unique_values + list(current_values)))
-            
-            # Fit with all values and transform
-            self.label_encoders[col].fit(all_values)
-            X[col] = self.label_encoders[col].transform(X[col])
-        
-        # Scale numerical features
-        numerical_cols = ['difficulty', 'total_available_time', 'deadline_days']
-        if y is not None:  # Only fit during training
-            self.scaler.fit(X[numerical_cols])
-        X[numerical_cols] = self.scaler.transform(X[numerical_cols])
-        
+        """Turn a DataFrame of tasks into the model's feature matrix"""
+        y = df['actual_time'] if 'actual_time' in df else None
+        X = self.state.pipeline.transform_frame(df)
         return X, y
     
+    def fit_state(self, df, n_jobs=None):
+        """Fit a new model state on a DataFrame without touching the live one"""
+        model = clone(self.state.model)
+        serving_jobs = model.get_params().get('n_jobs')
+        if 'n_jobs' not in model.get_params():
+            n_jobs = None  # backend parallelizes on its own, or not at all
+        if n_jobs is not None:
+            model.set_params(n_jobs=n_jobs)
+        with TRAINING_DURATION.time():
+            state = ModelState.fit(df, model)
+        if n_jobs is not None:
+            # Parallelism is for this fit only; predictions keep the old setting
+            model.set_params(n_jobs=serving_jobs)
+        return state
+    
+    def swap_state(self, state):
+        """Atomically publish a new model state to every caller"""
+        self.state = state
+        # Keys carry the state's stamp; clearing just frees the stale entries
+        self.prediction_cache.clear()
+    
     def train_model(self, df):
         """Train the ML model"""
-        X, y = self.preprocess_data(df)
-        self.model.fit(X, y)
+        self.swap_state(self.fit_state(df))
     
     def predict_time(self, course, task_type, difficulty, total_available_time, deadline_days):
         """Predict time needed for a task"""
-        data = pd.DataFrame({
-            'course': [course],
-            'task_type': [task_type],
-            'difficulty': [difficulty],
-            'total_available_time': [total_available_time],
-            'deadline_days': [deadline_days]
-        })
+        state = self.state
+        key = (state.stamp, course, task_type, float(difficulty),
+               float(total_available_time), float(deadline_days))
+        predicted_time = self.prediction_cache.get(key)
+        if predicted_time is not None:
+            return predicted_time
         
-        X, _ = self.preprocess_data(data)
-        predicted_time = self.model.predict(X)[0]
-        return max(0.5, predicted_time)
+        start = time.perf_counter()
+        features = state.pipeline.transform_row(
+            course, task_type, difficulty, total_available_time, deadline_days
+        )
+        transformed = time.perf_counter()
+        predicted_time = max(0.5, state.forest.predict_row(features))
+        INFERENCE_LATENCY.observe(transformed - start, 'preprocess')
+        INFERENCE_LATENCY.observe(time.perf_counter() - transformed, 'forest')
+        self.prediction_cache.put(key, predicted_time)
+        return predicted_time
+    
+    def predict_many(self, df_or_records):
+        """Predict time needed for many tasks with one vectorized pass"""
+        df = df_or_records if isinstance(df_or_records, pd.DataFrame) else pd.DataFrame(list(df_or_records))
+        if len(df) == 0:
+            return np.empty(0)
+        state = self.state
+        X = state.pipeline.transform_frame(df)
+        if len(X) <= COMPILED_BATCH_LIMIT:
+            predictions = state.forest.predict(X)
+        else:
+            # sklearn's threaded Cython traversal wins on large batches
+            predictions = state.model.predict(X)
+        return np.maximum(0.5, predictions)
     
     def add_task(self, user_id, course, task_type, difficulty, total_available_time, deadline_days, due_date, due_time):
         """Add a new task with user_id"""
+        due_date, due_time = parse_due(due_date, due_time)
         predicted_time = self.predict_time(
             course, task_type, difficulty, total_available_time, deadline_days
         )
         
-        conn = self.connect_db()
-        c = conn.cursor()
-        
-        c.execute('''
-            INSERT INTO tasks (
-                user_id, course, task_type, difficulty, total_available_time, 
-                deadline_days, predicted_time, due_date, due_time, status
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, course, task_type, difficulty, total_available_time, 
-            deadline_days, predicted_time, due_date, due_time, 'pending'))
-        
-        task_id = c.lastrowid
-        conn.commit()
-        conn.close()
+        with self.user_transaction(user_id) as conn:
+            c = conn.execute(INSERT_TASK_QUERY, (user_id, course, task_type, difficulty, total_available_time, 
+                deadline_days, predicted_time, None, due_date, due_time, due_date, due_time, 'pending'))
+            task_id = c.lastrowid
         
         return task_id, predicted_time
     
-    def update_task_status(self, task_id, status):
-        """Update task status (pending/completed/overdue)"""
-        conn = self.connect_db()
-        c = conn.cursor()
-        
-        c.execute('''
-            UPDATE tasks 
-            SET status = ? 
-            WHERE id = ?
-        ''', (status, task_id))
+    def add_tasks_bulk(self, user_id, tasks):
+        """Add many tasks in one transaction; returns (task_id, predicted_time) pairs.
+
+        Optional `status` ('completed' or pending) and `actual_time` columns
+        carry over finished tasks, e.g. from an export.
+        """
+        df = tasks if isinstance(tasks, pd.DataFrame) else pd.DataFrame(list(tasks))
+        if len(df) == 0:
+            return []
+        for column in ('course', 'task_type', 'due_date'):
+            if column not in df:
+                raise ValueError(f"missing {column}")
+            missing = df[column].isna() | (df[column].astype(str).str.strip() == '')
+            if missing.any():
+                raise ValueError(f"row {int(np.flatnonzero(missing.to_numpy())[0])}: missing {column}")
+        if 'due_time' not in df:
+            df = df.assign(due_time='23:59')
+        due = []
+        for i, (due_date, due_time) in enumerate(zip(df['due_date'], df['due_time'])):
+            try:
+                due.append(parse_due(due_date, due_time))
+            except ValueError as e:
+                raise ValueError(f"row {i}: {e}") from None
+        if 'status' not in df:
+            df = df.assign(status='pending')
+        if 'actual_time' not in df:
+            df = df.assign(actual_time=None)
+        predictions = self.predict_many(df)
+
+        rows = [
+            (user_id, str(course), str(task_type), int(difficulty), float(total_available_time),
+             int(deadline_days), float(predicted_time),
+             None if pd.isna(actual_time) else float(actual_time),
+             due_date, due_time, due_date, due_time,
+             'completed' if status == 'completed' else 'pending')
+            for (course, task_type, difficulty, total_available_time, deadline_days, (due_date, due_time),
+                 status, actual_time, predicted_time)
+            in zip(df['course'], df['task_type'], df['difficulty'], df['total_available_time'],
+                   df['deadline_days'], due, df['status'],
+                   df['actual_time'], predictions)
+        ]
+        with self.user_transaction(user_id) as conn:
+            conn.executemany(INSERT_TASK_QUERY, rows)
+            # We hold the write lock, so AUTOINCREMENT ids are consecutive
+            last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
         
-        conn.commit()
-        conn.close()
+        first_id = last_id - len(rows) + 1
+        return [(first_id + i, float(p)) for i, p in enumerate(predictions)]
+    
+    def update_task_status(self, task_id, status, user_id=None):
+        """Update task status (pending/completed/overdue); returns the rows changed.
+
+        With `user_id`, only a task owned by that user is updated; without
+        it every shard is tried (task ids are unique across shards).
+        """
+        if user_id is not None:
+            with self.user_transaction(user_id) as conn:
+                return conn.execute('UPDATE tasks SET status = ? WHERE id = ? AND user_id = ?',
+                                    (status, task_id, user_id)).rowcount
+        changed = 0
+        for db in self.router.shards:
+            with db.transaction() as conn:
+                changed += conn.execute('UPDATE tasks SET status = ? WHERE id = ?', (status, task_id)).rowcount
+        return changed
+    
+    def complete_tasks(self, user_id, updates):
+        """Mark many of a user's tasks completed, with optional actual times, in one transaction.
+
+        `updates` is a list of (task_id, actual_time or None); returns the ids
+        that were updated (tasks of other users or unknown ids are skipped).
+        """
+        updated = []
+        with self.user_transaction(user_id) as conn:
+            for task_id, actual_time in updates:
+                c = conn.execute('''
+                    UPDATE tasks
+                    SET status = 'completed', actual_time = COALESCE(?, actual_time)
+                    WHERE id = ? AND user_id = ?
+                ''', (actual_time, task_id, user_id))
+                if c.rowcount:
+                    updated.append(task_id)
+        return updated
+    
+    def sweep_overdue(self, now=None, batch_size=500):
+        """Mark pending tasks past their deadline as overdue, in small transactions.
+
+        Walks the (status, due_at) index of every shard; returns the number
+        of tasks changed.
+        """
+        now = now or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        swept = 0
+        for db in self.router.shards:
+            while True:
+                with db.transaction() as conn:
+                    changed = conn.execute(SWEEP_OVERDUE_QUERY, {'now': now, 'batch_size': batch_size}).rowcount
+                swept += changed
+                if changed < batch_size:
+                    break
+        return swept
+    
+    def archive_completed(self, older_than_days=ARCHIVE_AFTER_DAYS, now=None, batch_size=500):
+        """Move completed tasks due more than `older_than_days` ago to tasks_archive.
+
+        Each batch is copied and deleted in its own short transaction, so
+        writers are never blocked for long; returns the number moved.
+        Insight aggregates are unchanged, and all_tasks sees both tables.
+        """
+        cutoff = ((now or datetime.now()) - timedelta(days=older_than_days)).strftime('%Y-%m-%d %H:%M:%S')
+        columns = ', '.join(TASK_COLUMNS)
+        moved = 0
+        for db in self.router.shards:
+            while True:
+                with db.transaction() as conn:
+                    ids = [row[0] for row in conn.execute(ARCHIVE_BATCH_QUERY, (cutoff, batch_size))]
+                    if ids:
+                        marks = ', '.join('?' * len(ids))
+                        conn.execute(f'INSERT INTO tasks_archive ({columns}) '
+                                     f'SELECT {columns} FROM tasks WHERE id IN ({marks})', ids)
+                        conn.execute(f'DELETE FROM tasks WHERE id IN ({marks})', ids)
+                moved += len(ids)
+                if len(ids) < batch_size:
+                    break
+        return moved
+
+    def next_due_at(self):
+        """Earliest due time among pending tasks on any shard, or None"""
+        due = []
+        for db in self.router.shards:
+            with db.connection() as conn:
+                due.append(conn.execute("SELECT MIN(due_at) FROM tasks WHERE status = 'pending'").fetchone()[0])
+        return min((due_at for due_at in due if due_at is not None), default=None)
+    
+    def count_overdue(self, user_id):
+        """Number of a user's overdue tasks"""
+        with self.connect_db(user_id) as conn:
+            return conn.execute("SELECT COUNT(*) FROM tasks WHERE user_id = ? AND status = 'overdue'",
+                                (user_id,)).fetchone()[0]
     
     def get_schedule(self, user_id):
         """Get tasks ordered by due date with status for specific user"""
-        conn = self.connect_db()
-        df = pd.read_sql_query('''
-            SELECT *, 
-                CASE 
-                    WHEN status = 'completed' THEN 'completed'
-                    WHEN datetime(due_date || ' ' || due_time) < datetime('now', 'localtime') THEN 'overdue'
-                    ELSE 'pending'
-                END as current_status,
-                CASE
-                    WHEN datetime(due_date || ' ' || due_time) < datetime('now', 'localtime')
-                    THEN ROUND((julianday('now', 'localtime') - julianday(due_date || ' ' || due_time)) * 24, 1)
-                    ELSE 0
-                END as hours_overdue
-            FROM tasks 
-            WHERE user_id = ?
-            ORDER BY 
-                CASE status
-                    WHEN 'completed' THEN 3
-                    WHEN 'pending' THEN 1
-                    ELSE 2  -- overdue tasks
-                END,
-                datetime(due_date || ' ' || due_time) ASC
-        ''', conn, params=(user_id,))
-        conn.close()
+        with self.connect_db(user_id) as conn:
+            df = pd.read_sql_query(SCHEDULE_QUERY, conn, params=(user_id,))
         
         return df
     
-    def update_actual_time(self, task_id, actual_time):
-        """Update task with actual completion time"""
-        conn = self.connect_db()
-        c = conn.cursor()
-        
-        c.execute('''
-            UPDATE tasks 
-            SET actual_time = ? 
-            WHERE id = ?
-        ''', (actual_time, task_id))
+    def iter_schedule(self, user_id, limit=None, cursor=None, now=None):
+        """Stream a user's schedule page straight from the cursor.
+
+        Rows come in display order (pending, overdue, completed, then by
+        due time and id) using keyset pagination; pass the cursor built from
+        the last row of one page to get the next. Overdue is judged against
+        `now` (default: the current local time, or the time stored in the
+        cursor). Returns a generator of dicts that also carry
+        `current_status` and `hours_overdue`.
+        """
+        if cursor is not None:
+            now, start_rank, after_due_at, after_id = decode_schedule_cursor(cursor)
+        else:
+            now = now or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            start_rank, after_due_at, after_id = 1, '', 0
         
-        conn.commit()
-        conn.close()
+        remaining = -1 if limit is None else limit
+        with self.connect_db(user_id) as conn:
+            for rank, current_status, condition in SCHEDULE_RANKS:
+                if rank < start_rank or remaining == 0:
+                    continue
+                if rank > start_rank:
+                    after_due_at, after_id = '', 0
+                rows = conn.execute(SCHEDULE_PAGE_QUERY.format(condition=condition, due_key=SCHEDULE_DUE_KEY), {
+                    'now': now, 'user_id': user_id, 'limit': remaining,
+                    'after_due_at': after_due_at, 'after_id': after_id,
+                })
+                columns = [d[0] for d in rows.description]
+                for row in rows:
+                    task = dict(zip(columns, row))
+                    task['current_status'] = current_status
+                    remaining -= 1
+                    yield task
+    
+    def iter_export_rows(self, user_id):
+        """Stream a user's tasks as tuples in EXPORT_COLUMNS order, oldest first"""
+        with self.connect_db(user_id) as conn:
+            yield from conn.execute(EXPORT_TASKS_QUERY, (user_id,))
+
+    def get_dashboard_tasks(self, user_id):
+        """Get a user's tasks, newest first, with their current status"""
+        with self.connect_db(user_id) as conn:
+            return pd.read_sql_query(DASHBOARD_TASKS_QUERY, conn, params=(user_id,))
+    
+    def get_plan_tasks(self, user_id):
+        """A user's unfinished tasks as dicts of id, due_at and predicted hours"""
+        with self.connect_db(user_id) as conn:
+            return [
+                {'id': task_id, 'due_at': due_at, 'hours': hours}
+                for task_id, due_at, hours in conn.execute(PLAN_TASKS_QUERY, (user_id,))
+            ]
+    
+    def update_actual_time(self, task_id, actual_time, user_id=None):
+        """Update task with actual completion time; returns the rows changed.
+
+        With `user_id`, only a task owned by that user is updated; without
+        it every shard is tried.
+        """
+        if user_id is not None:
+            with self.user_transaction(user_id) as conn:
+                return conn.execute('UPDATE tasks SET actual_time = ? WHERE id = ? AND user_id = ?',
+                                    (actual_time, task_id, user_id)).rowcount
+        changed = 0
+        for db in self.router.shards:
+            with db.transaction() as conn:
+                changed += conn.execute('UPDATE tasks SET actual_time = ? WHERE id = ?',
+                                        (actual_time, task_id)).rowcount
+        return changed
+    
+    def get_labeled_tasks(self):
+        """Training rows for every task with a reported actual_time, with their due_at.
+
+        Rows come shard by shard in no particular order; sort on due_at
+        where order matters.
+        """
+        frames = []
+        for db in self.router.shards:
+            with db.connection() as conn:
+                frames.append(pd.read_sql_query(DUE_LABELED_TASKS_QUERY, conn))
+        return pd.concat(frames, ignore_index=True)
+    
+    def iter_labeled_tasks(self, chunksize=100000):
+        """Training rows in chunks of compact dtypes, shard by shard, oldest first"""
+        for db in self.router.shards:
+            with db.connection() as conn:
+                yield from pd.read_sql_query(LABELED_TASKS_QUERY, conn, chunksize=chunksize,
+                                             dtype=TRAINING_DTYPES)
+    
+    def count_labeled_tasks(self):
+        """Number of tasks with a reported actual_time, over all shards"""
+        count = 0
+        for db in self.router.shards:
+            with db.connection() as conn:
+                count += conn.execute('SELECT COUNT(*) FROM all_tasks WHERE actual_time IS NOT NULL').fetchone()[0]
+        return count
+    
+    def rebuild_user_stats(self):
+        """Recompute the insight aggregates of every shard from scratch, archive included"""
+        for db in self.router.shards:
+            with db.transaction() as conn:
+                for statement in rebuild_stats_statements('all_tasks'):
+                    conn.execute(statement)
+    
+    def move_user(self, user_id, target, source=None):
+        """Move a user's live and archived tasks to shard `target` and route them there.
+
+        The source shard stays write-locked while rows are copied, so no
+        write of that user is lost. Rows get fresh ids from the target
+        shard's range, the user's aggregates are rebuilt there, and the
+        write version is bumped past the old one so every cache keyed on it
+        refreshes. Rows the target already holds for the user are kept
+        (this merges leftovers written through a stale placement).
+
+        The copied id range is recorded in the target's moves_in table in
+        the same transaction as the rows and cleared once the source is
+        drained. A move that died in between is undone when it is retried
+        and finished or rolled back by recover_moves.
+        Returns the number of rows moved.
+        """
+        if not 0 <= target < len(self.router):
+            raise ValueError(f"No shard {target}; there are {len(self.router)}")
+        source = self.router.shard_for(user_id) if source is None else source
+        if source == target:
+            self.router.place(user_id, target)
+            return 0
+        columns = ', '.join(TASK_COLUMNS[1:])
+        marks = ', '.join('?' * (len(TASK_COLUMNS) - 1))
+        next_id = '''
+            SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'tasks'), 0),
+                       COALESCE((SELECT MAX(id) FROM tasks), 0))
+        '''
+        with self.router.shards[source].transaction() as src:
+            live = src.execute(f'SELECT {columns} FROM tasks WHERE user_id = ? ORDER BY id', (user_id,)).fetchall()
+            archived = src.execute(f'SELECT {columns} FROM tasks_archive WHERE user_id = ? ORDER BY id',
+                                   (user_id,)).fetchall()
+            row = src.execute('SELECT write_version FROM user_versions WHERE user_id = ?', (user_id,)).fetchone()
+            version = row[0] if row else 0
+            with self.router.shards[target].transaction() as dst:
+                # Rows an earlier attempt copied are replaced, so retrying never duplicates them
+                self._undo_copy(dst, user_id)
+                first_id = dst.execute(next_id).fetchone()[0] + 1
+                dst.executemany(f'INSERT INTO tasks ({columns}) VALUES ({marks})', live)
+                # Archived rows take ids reserved from the target's task sequence
+                base = dst.execute(next_id).fetchone()[0]
+                dst.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'tasks'", (base + len(archived),))
+                dst.executemany(f'INSERT INTO tasks_archive (id, {columns}) VALUES (?, {marks})',
+                                [(base + i + 1,) + tuple(task) for i, task in enumerate(archived)])
+                dst.execute('INSERT INTO moves_in (user_id, source, first_id, last_id) VALUES (?, ?, ?, ?)',
+                            (user_id, source, first_id, base + len(archived)))
+                for statement in rebuild_stats_statements('all_tasks', per_user=True):
+                    dst.execute(statement, {'user_id': user_id})
+                dst.execute('INSERT OR IGNORE INTO user_versions (user_id) VALUES (?)', (user_id,))
+                dst.execute('''
+                    UPDATE user_versions
+                    SET write_version = MAX(write_version, ?) + 1, last_write_at = CURRENT_TIMESTAMP
+                    WHERE user_id = ?
+                ''', (version, user_id))
+                dst.execute('DELETE FROM moved_users WHERE user_id = ?', (user_id,))
+            self._drain_source(src, user_id, target)
+            self.router.place(user_id, target)
+        with self.router.shards[target].transaction() as dst:
+            dst.execute('DELETE FROM moves_in WHERE user_id = ?', (user_id,))
+        return len(live) + len(archived)
+
+    def _drain_source(self, src, user_id, target):
+        """Delete a moved user's rows from the source shard and leave a tombstone"""
+        for table in ('tasks', 'tasks_archive', 'user_stats', 'user_course_stats',
+                      'user_task_type_stats', 'user_versions'):
+            src.execute(f'DELETE FROM {table} WHERE user_id = ?', (user_id,))
+        # Processes still routing here see the tombstone once this commits;
+        # the directory already names the target by then
+        src.execute('INSERT OR REPLACE INTO moved_users (user_id, shard) VALUES (?, ?)', (user_id, target))
+
+    def _undo_copy(self, dst, user_id):
+        """Delete the rows an unfinished move copied onto a shard; False if there was none"""
+        row = dst.execute('SELECT first_id, last_id FROM moves_in WHERE user_id = ?', (user_id,)).fetchone()
+        if row is None:
+            return False
+        for table in ('tasks', 'tasks_archive'):
+            dst.execute(f'DELETE FROM {table} WHERE user_id = ? AND id BETWEEN ? AND ?', (user_id,) + tuple(row))
+        dst.execute('DELETE FROM moves_in WHERE user_id = ?', (user_id,))
+        for statement in rebuild_stats_statements('all_tasks', per_user=True):
+            dst.execute(statement, {'user_id': user_id})
+        return True
+
+    def recover_moves(self):
+        """Finish or roll back moves that died after copying; returns how many were resolved.
+
+        A move whose source had committed (it holds the tombstone, or the
+        directory already routes to the target) is finished. Otherwise the
+        source still has every row, so the copy is deleted. Both shards are
+        locked in move_user's order, so a move in progress is waited for.
+        """
+        if len(self.router) == 1:
+            return 0
+        resolved = 0
+        for target, db in enumerate(self.router.shards):
+            with db.connection() as conn:
+                pending = conn.execute('SELECT user_id, source FROM moves_in').fetchall()
+            for user_id, source in pending:
+                with self.router.shards[source].transaction() as src:
+                    with db.transaction() as dst:
+                        if dst.execute('SELECT 1 FROM moves_in WHERE user_id = ? AND source = ?',
+                                       (user_id, source)).fetchone() is None:
+                            continue  # finished meanwhile
+                        tombstone = src.execute('SELECT shard FROM moved_users WHERE user_id = ?',
+                                                (user_id,)).fetchone()
+                        with self.router.directory.connection() as directory:
+                            placed = directory.execute('SELECT shard FROM user_shards WHERE user_id = ?',
+                                                       (user_id,)).fetchone()
+                        finish = tombstone == (target,) or placed == (target,)
+                        if not finish:
+                            self._undo_copy(dst, user_id)
+                            # Stale placements that still reach the target are sent back
+                            dst.execute('INSERT OR REPLACE INTO moved_users (user_id, shard) VALUES (?, ?)',
+                                        (user_id, source))
+                    if finish:
+                        self._drain_source(src, user_id, target)
+                        self.router.place(user_id, target)
+                if finish:
+                    with db.transaction() as dst:
+                        dst.execute('DELETE FROM moves_in WHERE user_id = ?', (user_id,))
+                resolved += 1
+        return resolved
     
     def get_user_insights(self, user_id):
         """Generate insights based on user's task history"""
-        conn = self.connect_db()
-        df = pd.read_sql_query('''
-            SELECT * FROM tasks 
-            WHERE user_id = ? AND actual_time IS NOT NULL
-        ''', conn, params=(user_id,))
-        conn.close()
-        
-        if len(df) == 0:
-            return "No completed tasks yet. Update some tasks with actual completion times to see insights!"
+        with self.connect_db(user_id) as conn:
+            stats = conn.execute('''
+                SELECT labeled_count, error_count, sum_abs_error, sum_time_ratio
+                FROM user_stats WHERE user_id = ?
+            ''', (user_id,)).fetchone()
+            if not stats or stats[0] == 0:
+                return "No completed tasks yet. Update some tasks with actual completion times to see insights!"
+            
+            course_errors = conn.execute('''
+                SELECT course, sum_abs_error / error_count FROM user_course_stats
+                WHERE user_id = ? AND labeled_count > 0 ORDER BY course
+            ''', (user_id,)).fetchall()
+            task_durations = conn.execute('''
+                SELECT task_type, sum_actual_time / labeled_count FROM user_task_type_stats
+                WHERE user_id = ? AND labeled_count > 0 ORDER BY task_type
+            ''', (user_id,)).fetchall()
+            recent_tasks = conn.execute('''
+                SELECT ABS(predicted_time - actual_time) FROM all_tasks
+                WHERE user_id = ? AND actual_time IS NOT NULL
+                ORDER BY created_at DESC, id DESC LIMIT 3
+            ''', (user_id,)).fetchall()
         
+        completed_tasks, error_count, sum_abs_error, sum_time_ratio = stats
         insights = []
         
         # Basic completion stats
-        completed_tasks = len(df)
         insights.append(f"You have completed {completed_tasks} task{'s' if completed_tasks != 1 else ''}.")
         
         # Prediction accuracy
-        df['prediction_error'] = abs(df['predicted_time'] - df['actual_time'])
-        avg_error = df['prediction_error'].mean()
+        avg_error = sum_abs_error / error_count if error_count else float('nan')
         insights.append(f"Average prediction error: {avg_error:.2f} hours")
         
         # Time usage patterns
-        df['time_ratio'] = df['actual_time'] / df['total_available_time'] * 100
-        avg_time_ratio = df['time_ratio'].mean()
+        avg_time_ratio = sum_time_ratio / completed_tasks
         insights.append(f"On average, you use {avg_time_ratio:.1f}% of your available time")
         
         # Course-specific insights (if there are at least 2 courses)
-        if len(df['course'].unique()) >= 2:
-            course_errors = df.groupby('course')['prediction_error'].mean()
-            best_course = course_errors.idxmin()
-            worst_course = course_errors.idxmax()
-            insights.append(f"Most accurate predictions are for: {best_course}")
-            insights.append(f"Less accurate predictions are for: {worst_course}")
+        if len(course_errors) >= 2:
+            scored = [(course, error) for course, error in course_errors if error is not None]
+            if scored:
+                best_course = min(scored, key=lambda item: item[1])[0]
+                worst_course = max(scored, key=lambda item: item[1])[0]
+                insights.append(f"Most accurate predictions are for: {best_course}")
+                insights.append(f"Less accurate predictions are for: {worst_course}")
         
         # Task type patterns (if there are at least 2 task types)
-        if len(df['task_type'].unique()) >= 2:
-            task_durations = df.groupby('task_type')['actual_time'].mean()
-            longest_task = task_durations.idxmax()
-            shortest_task = task_durations.idxmin()
-            insights.append(f"On average, {longest_task}s take the longest ({task_durations[longest_task]:.1f} hours)")
-            insights.append(f"while {shortest_task}s take the shortest ({task_durations[shortest_task]:.1f} hours)")
+        if len(task_durations) >= 2:
+            longest_task, longest_time = max(task_durations, key=lambda item: item[1])
+            shortest_task, shortest_time = min(task_durations, key=lambda item: item[1])
+            insights.append(f"On average, {longest_task}s take the longest ({longest_time:.1f} hours)")
+            insights.append(f"while {shortest_task}s take the shortest ({shortest_time:.1f} hours)")
         
         # Time management tips based on patterns
         if avg_time_ratio > 90:
@@ -224,9 +1107,9 @@ class SmartScheduler:
             insights.append("Tip: You're finishing tasks quickly. You might be able to take on more work.")
         
         # Recent trends (if there are at least 3 tasks)
-        if len(df) >= 3:
-            recent_tasks = df.sort_values('created_at').tail(3)
-            recent_accuracy = recent_tasks['prediction_error'].mean()
+        recent_errors = [error for (error,) in recent_tasks if error is not None]
+        if completed_tasks >= 3 and recent_errors:
+            recent_accuracy = sum(recent_errors) / len(recent_errors)
             if recent_accuracy < avg_error:
                 insights.append("Good news! Your recent tasks are more accurately predicted than earlier ones.")
         
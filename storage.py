@@ -0,0 +1,116 @@
+# storage.py
+import os
+import zlib
+
+from db import get_database
+from ttl_cache import TTLCache
+
+# Task ids of shard i start above i << SHARD_ID_BITS, so ids stay unique across shards
+SHARD_ID_BITS = 40
+
+
+def shard_paths(directory_path, count):
+    """Database files for `count` shards; shard 0 is the directory database itself"""
+    root, ext = os.path.splitext(directory_path)
+    return [directory_path] + [f'{root}.shard{index}{ext or ".db"}' for index in range(1, count)]
+
+
+def hash_shard(user_id, count):
+    """Home shard of a user for a given shard count"""
+    return zlib.crc32(str(int(user_id)).encode()) % count
+
+
+class ShardRouter:
+    """Routes each user's task data to one of several SQLite shard databases.
+
+    Users and their shard placements live in the directory database. A
+    user is placed on the shard their id hashes to the first time they are
+    looked up, and the placement is recorded, so changing the shard count
+    never strands data: existing users stay put until `rebalance` moves
+    them. Placements are cached for `placement_ttl` seconds; a process
+    that routes a moved user to their old shard finds the tombstone
+    SmartScheduler.move_user left there and looks the placement up again.
+    """
+
+    def __init__(self, directory_path='scheduler.db', shards=None, placement_ttl=30):
+        self.directory_path = directory_path
+        self.directory = get_database(directory_path)
+        self.shard_paths = list(shards) if shards else [directory_path]
+        self.shards = [get_database(path) for path in self.shard_paths]
+        self._placements = TTLCache(maxsize=100000, ttl=placement_ttl)
+        with self.directory.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS user_shards (
+                    user_id INTEGER PRIMARY KEY,
+                    shard INTEGER NOT NULL
+                )
+            ''')
+
+    @classmethod
+    def from_count(cls, directory_path, count, placement_ttl=30):
+        """Router over `count` shard files next to the directory database"""
+        return cls(directory_path, shard_paths(directory_path, max(1, count)), placement_ttl)
+
+    def __len__(self):
+        return len(self.shards)
+
+    def shard_for(self, user_id):
+        """Index of the shard holding a user's tasks, placing new users by hash"""
+        shard = self._placements.get(user_id)
+        if shard is None:
+            with self.directory.connection() as conn:
+                row = conn.execute('SELECT shard FROM user_shards WHERE user_id = ?', (user_id,)).fetchone()
+            if row is None:
+                with self.directory.transaction() as conn:
+                    conn.execute('INSERT OR IGNORE INTO user_shards (user_id, shard) VALUES (?, ?)',
+                                 (user_id, hash_shard(user_id, len(self.shards))))
+                    row = conn.execute('SELECT shard FROM user_shards WHERE user_id = ?', (user_id,)).fetchone()
+            shard = row[0]
+            if shard >= len(self.shards):
+                raise LookupError(f"User {user_id} is placed on shard {shard}, but only "
+                                  f"{len(self.shards)} shards are configured")
+            self._placements.put(user_id, shard)
+        return shard
+
+    def database_for(self, user_id):
+        """The shard Database holding a user's tasks"""
+        return self.shards[self.shard_for(user_id)]
+
+    def place(self, user_id, shard):
+        """Record that a user's tasks now live on `shard`"""
+        with self.directory.transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO user_shards (user_id, shard) VALUES (?, ?)', (user_id, shard))
+        self._placements.invalidate(user_id)
+
+    def forget(self, user_id):
+        """Drop a user's cached placement so the next lookup reads the directory"""
+        self._placements.invalidate(user_id)
+
+    def users_on(self, shard):
+        """Ids of users with live or archived tasks on a shard"""
+        with self.shards[shard].connection() as conn:
+            return [row[0] for row in conn.execute(
+                'SELECT user_id FROM tasks UNION SELECT user_id FROM tasks_archive ORDER BY user_id')]
+
+
+def rebalance(scheduler):
+    """Move every user to their hash shard for the current shard count.
+
+    Users are found by scanning each shard, so rows written to an old
+    shard by a process with a stale placement are merged in as well.
+    Returns the number of users moved.
+    """
+    router = scheduler.router
+    moved = 0
+    for shard in range(len(router)):
+        for user_id in router.users_on(shard):
+            target = hash_shard(user_id, len(router))
+            if target != shard:
+                scheduler.move_user(user_id, target, source=shard)
+                moved += 1
+    with router.directory.connection() as conn:
+        placements = conn.execute('SELECT user_id, shard FROM user_shards').fetchall()
+    for user_id, shard in placements:
+        if shard != hash_shard(user_id, len(router)):
+            router.place(user_id, hash_shard(user_id, len(router)))
+    return moved
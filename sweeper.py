@@ -0,0 +1,69 @@
+# sweeper.py
+import threading
+from datetime import datetime
+
+
+class OverdueSweeper(threading.Thread):
+    """Background thread that moves pending tasks to 'overdue' as deadlines pass.
+
+    It sleeps until the earliest pending due time (an index lookup), capped
+    at `max_interval` so tasks added meanwhile are picked up too.
+    """
+
+    def __init__(self, scheduler, max_interval=60, batch_size=500):
+        super().__init__(name='overdue-sweeper', daemon=True)
+        self.scheduler = scheduler
+        self.max_interval = max_interval
+        self.batch_size = batch_size
+        self.last_swept = 0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """Ask the sweeper to exit"""
+        self._stop_event.set()
+
+    def seconds_until_next_due(self):
+        """How long to sleep before the next pending task falls due"""
+        next_due = self.scheduler.next_due_at()
+        if next_due is None:
+            return self.max_interval
+        wait = (datetime.strptime(next_due, '%Y-%m-%d %H:%M:%S') - datetime.now()).total_seconds()
+        return min(self.max_interval, max(1.0, wait + 1))
+
+    def run(self):
+        while True:
+            try:
+                self.last_swept = self.scheduler.sweep_overdue(batch_size=self.batch_size)
+                wait = self.seconds_until_next_due()
+            except Exception as e:
+                print(f"Warning: overdue sweep failed: {e}")
+                wait = self.max_interval
+            if self._stop_event.wait(wait):
+                return
+
+
+class TaskArchiver(threading.Thread):
+    """Background thread that moves old completed tasks into tasks_archive"""
+
+    def __init__(self, scheduler, older_than_days, interval=3600, batch_size=500):
+        super().__init__(name='task-archiver', daemon=True)
+        self.scheduler = scheduler
+        self.older_than_days = older_than_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.last_archived = 0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """Ask the archiver to exit"""
+        self._stop_event.set()
+
+    def run(self):
+        while True:
+            try:
+                self.last_archived = self.scheduler.archive_completed(
+                    self.older_than_days, batch_size=self.batch_size)
+            except Exception as e:
+                print(f"Warning: task archiving failed: {e}")
+            if self._stop_event.wait(self.interval):
+                return
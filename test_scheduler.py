@@ -1,39 +1,1249 @@
-from smart_scheduler import SmartScheduler
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
 import pandas as pd
+import pytest
+
+from smart_scheduler import (
+    SmartScheduler, SCHEDULE_QUERY, DASHBOARD_TASKS_QUERY, SCHEDULE_RANKS, SCHEDULE_PAGE_QUERY,
+    SCHEDULE_DUE_KEY, encode_schedule_cursor,
+)
+from models import User
+import analytics
+from model_store import ModelStore
+from prediction_cache import PredictionCache
+from retrainer import RetrainWorker
+from reloader import ModelReloader
+from warmup import Warmup
+import metrics
+from db import TimedConnection
+import benchmark
+import generate_dataset
+import training
+import auth
+from sweeper import OverdueSweeper
+from backends import BACKENDS
+from planner import Planner, daily_availability
+import storage
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TRAINING_CSV = os.path.join(HERE, 'training_data.csv')
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    scheduler = SmartScheduler(db_path=str(tmp_path / 'test.db'))
+    scheduler.train_model(pd.read_csv(TRAINING_CSV))
+    return scheduler
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """Import app.py against scratch storage instead of the repo's files"""
+    root = tmp_path_factory.mktemp('app')
+    os.environ['SCHEDULER_DB'] = str(root / 'app.db')
+    os.environ['SCHEDULER_MODEL_DIR'] = str(root / 'artifacts')
+    os.environ['SCHEDULER_TRAINING_DATA'] = TRAINING_CSV
+    os.environ['SCHEDULER_RETRAIN'] = '0'
+    os.environ['SCHEDULER_SWEEP'] = '0'
+    os.environ['SCHEDULER_ARCHIVE_DAYS'] = '0'
+    os.environ['SCHEDULER_RELOAD_INTERVAL'] = '0'
+    os.environ['SCHEDULER_WARMUP'] = 'eager'
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module, scheduler, monkeypatch):
+    monkeypatch.setattr(app_module, 'scheduler', scheduler)
+    monkeypatch.setattr(app_module, 'user_model', User(db_path=scheduler.db_path))
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+    return client
+
+
+def add_sample_task(scheduler, user_id=1, **overrides):
+    task = dict(
+        user_id=user_id, course="Computer Science", task_type="Assignment",
+        difficulty=3, total_available_time=5, deadline_days=7,
+        due_date="2030-01-15", due_time="23:59",
+    )
+    task.update(overrides)
+    return scheduler.add_task(**task)
+
+
+def test_connections_use_wal_and_are_reused(scheduler):
+    with scheduler.connect_db() as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        with scheduler.connect_db() as inner:
+            assert inner is conn
+
+    with scheduler.connect_db() as again:
+        assert again is conn
+
+
+def test_scheduler_and_user_share_pool(scheduler):
+    user = User(db_path=scheduler.db_path)
+    assert user.db is scheduler.db
+    assert user.create_user('alice', 'secret', 'alice@example.com')
+    assert not user.create_user('alice', 'secret', 'other@example.com')
+    assert user.verify_user('alice', 'secret') is not None
+
+
+def test_concurrent_writers_do_not_fail(scheduler):
+    errors = []
+
+    def worker(user_id):
+        try:
+            for _ in range(20):
+                task_id, _ = add_sample_task(scheduler, user_id=user_id)
+                scheduler.update_actual_time(task_id, 2.0)
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    with scheduler.connect_db() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0] == 160
+
+
+def query_plan(scheduler, query, params):
+    with scheduler.connect_db() as conn:
+        return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + query, params)]
+
+
+@pytest.mark.parametrize('query', [SCHEDULE_QUERY, DASHBOARD_TASKS_QUERY])
+def test_task_queries_use_indexes(scheduler, query):
+    plan = query_plan(scheduler, query, (1,))
+    assert not any(step.startswith('SCAN tasks') for step in plan), plan
+    assert any('USING INDEX' in step for step in plan), plan
+
+
+def test_dashboard_query_needs_no_sort(scheduler):
+    plan = query_plan(scheduler, DASHBOARD_TASKS_QUERY, (1,))
+    assert not any('TEMP B-TREE' in step for step in plan), plan
+
+
+def test_due_at_is_backfilled_and_kept_in_sync(tmp_path):
+    db_path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+            course TEXT NOT NULL, task_type TEXT NOT NULL, difficulty INTEGER NOT NULL,
+            total_available_time REAL NOT NULL, deadline_days INTEGER NOT NULL,
+            predicted_time REAL, actual_time REAL, due_date DATE NOT NULL,
+            due_time TIME NOT NULL DEFAULT '23:59', status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute("INSERT INTO tasks (user_id, course, task_type, difficulty, total_available_time, "
+                 "deadline_days, due_date, due_time) VALUES (1, 'Math', 'Quiz', 2, 3, 4, '2030-02-01', '09:30')")
+    conn.commit()
+    conn.close()
+
+    scheduler = SmartScheduler(db_path=db_path)
+    with scheduler.connect_db() as conn:
+        assert conn.execute('SELECT due_at FROM tasks').fetchone()[0] == '2030-02-01 09:30:00'
+        conn.execute("UPDATE tasks SET due_time = '18:00'")
+        assert conn.execute('SELECT due_at FROM tasks').fetchone()[0] == '2030-02-01 18:00:00'
+        conn.execute("INSERT INTO tasks (user_id, course, task_type, difficulty, total_available_time, "
+                     "deadline_days, due_date, due_time) VALUES (1, 'Math', 'Quiz', 2, 3, 4, '2030-03-01', '08:00')")
+        assert conn.execute('SELECT MAX(due_at) FROM tasks').fetchone()[0] == '2030-03-01 08:00:00'
+
+
+def test_pipeline_row_matches_frame(scheduler):
+    frame = pd.read_csv(TRAINING_CSV).drop(columns='actual_time')
+    X = scheduler.pipeline.transform_frame(frame)
+    for i, row in enumerate(frame.itertuples(index=False)):
+        assert scheduler.pipeline.transform_row(*row) == list(X[i])
+
+
+def test_unknown_category_uses_frozen_bucket(scheduler):
+    classes = list(scheduler.label_encoders['course'].classes_)
+    known = scheduler.pipeline.transform_row("Biology", "Quiz", 3, 4.0, 5)
+
+    features = scheduler.pipeline.transform_row("Astrology", "Quiz", 3, 4.0, 5)
+    assert features[0] == scheduler.pipeline.unknown_codes['course'] == len(classes)
+    assert scheduler.predict_time("Astrology", "Quiz", 3, 4.0, 5) >= 0.5
+
+    # Predicting unseen categories must not refit or renumber the vocabulary
+    assert list(scheduler.label_encoders['course'].classes_) == classes
+    assert scheduler.pipeline.transform_row("Biology", "Quiz", 3, 4.0, 5) == known
+
+
+def test_predict_many_matches_predict_time(scheduler):
+    records = pd.read_csv(TRAINING_CSV).drop(columns='actual_time').to_dict('records')
+    predictions = scheduler.predict_many(records)
+    assert len(predictions) == len(records)
+    for record, predicted in zip(records, predictions):
+        assert predicted == pytest.approx(scheduler.predict_time(**record))
+
+
+def test_add_tasks_bulk_returns_ids_in_order(scheduler):
+    add_sample_task(scheduler)
+    tasks = [
+        dict(course="Physics", task_type="Quiz", difficulty=d, total_available_time=4.0,
+             deadline_days=3, due_date="2030-05-0%d" % d)
+        for d in range(1, 6)
+    ]
+    results = scheduler.add_tasks_bulk(2, tasks)
+    assert [task_id for task_id, _ in results] == [2, 3, 4, 5, 6]
+
+    with scheduler.connect_db() as conn:
+        rows = conn.execute('SELECT id, difficulty, predicted_time, due_at FROM tasks WHERE user_id = 2 ORDER BY id').fetchall()
+    assert [(r[0], r[1]) for r in rows] == [(2, 1), (3, 2), (4, 3), (5, 4), (6, 5)]
+    assert [r[2] for r in rows] == pytest.approx([p for _, p in results])
+    assert rows[0][3] == '2030-05-01 23:59:00'
+
+
+def test_bulk_route(client, scheduler):
+    tasks = [
+        dict(course="History", task_type="Assignment", difficulty=2, total_available_time=6,
+             deadline_days=5, due_date="2030-06-01", due_time="12:00")
+    ] * 300
+    response = client.post('/api/tasks/bulk', json={'tasks': tasks})
+    assert response.status_code == 200
+    assert len(response.get_json()['tasks']) == 300
+
+    response = client.post('/api/tasks/bulk', json={'tasks': [{'course': 'History'}]})
+    assert response.status_code == 400
+
+    # Mixed records: a missing due_time defaults, a missing due_date is rejected by row
+    mixed = [dict(tasks[0]), dict(tasks[0])]
+    del mixed[0]['due_time']
+    del mixed[1]['due_date']
+    response = client.post('/api/tasks/bulk', json={'tasks': mixed})
+    assert response.status_code == 400 and 'row 1: missing due_date' in response.get_json()['error']
+    response = client.post('/api/tasks/bulk', json={'tasks': mixed[:1]})
+    task_id = response.get_json()['tasks'][0]['task_id']
+    with scheduler.connect_db() as conn:
+        due_at = conn.execute('SELECT due_at FROM tasks WHERE id = ?', (task_id,)).fetchone()[0]
+    assert due_at == '2030-06-01 23:59:00'
+
+    # Dates and times SQLite's datetime() cannot read are rejected rather than stored with no due_at
+    for bad in (dict(due_time="9:00"), dict(due_date="June 1")):
+        response = client.post('/api/tasks/bulk', json={'tasks': [tasks[0], dict(tasks[0], **bad)]})
+        assert response.status_code == 400 and 'row 1: invalid due_' in response.get_json()['error']
+        response = client.post('/add_task', data=dict(tasks[0], **bad))
+        assert response.status_code == 400 and 'invalid due_' in response.get_json()['error']
+    with pytest.raises(ValueError):
+        scheduler.add_task(1, "History", "Quiz", 2, 6.0, 5, "2030-06-01", "noon")
+    with scheduler.connect_db() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM tasks WHERE due_at IS NULL').fetchone()[0] == 0
+
+
+def test_compiled_forest_matches_sklearn(scheduler):
+    rng = np.random.default_rng(0)
+    X = np.column_stack([
+        rng.integers(0, 10, 2000), rng.integers(0, 6, 2000), rng.normal(scale=2, size=(2000, 3)),
+    ])
+    X = np.vstack([X, scheduler.pipeline.transform_frame(pd.read_csv(TRAINING_CSV))])
+    expected = scheduler.model.predict(X)
+
+    assert np.array_equal(scheduler.forest.predict(X), expected)
+    for row, value in zip(X[:200], expected[:200]):
+        assert scheduler.forest.predict_row(row) == value
+
+
+def test_prediction_cache_hits_and_invalidation(scheduler, monkeypatch):
+    args = ("Biology", "Quiz", 3, 4.0, 5)
+    first = scheduler.predict_time(*args)
+
+    def fail(features):
+        raise AssertionError("cached prediction should skip the forest")
+
+    monkeypatch.setattr(scheduler.forest, 'predict_row', fail)
+    assert scheduler.predict_time("Biology", "Quiz", 3.0, 4, 5) == first
+    stats = scheduler.prediction_cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+    monkeypatch.undo()
+    scheduler.train_model(pd.read_csv(TRAINING_CSV).iloc[:20])
+    assert scheduler.prediction_cache.stats()['size'] == 0
+    scheduler.predict_time(*args)
+    assert scheduler.prediction_cache.stats()['misses'] == 2
+
+
+def test_prediction_cache_is_bounded():
+    cache = PredictionCache(maxsize=2)
+    for i in range(3):
+        cache.put(i, float(i))
+    assert cache.get(0) is None
+    assert cache.get(2) == 2.0
+
+
+def test_swap_state_is_atomic_for_predictions(scheduler):
+    old_state = scheduler.state
+    new_state = scheduler.fit_state(pd.read_csv(TRAINING_CSV).iloc[:15])
+    args = ("Biology", "Quiz", 3, 4.0, 5)
+    before = scheduler.predict_time(*args)
+
+    scheduler.swap_state(new_state)
+    assert scheduler.state is new_state and scheduler.model is new_state.model
+    expected = max(0.5, new_state.forest.predict_row(new_state.pipeline.transform_row(*args)))
+    assert scheduler.predict_time(*args) == expected
+    assert old_state.forest.predict_row(old_state.pipeline.transform_row(*args)) == before
+
+
+def test_retrain_worker_learns_from_actual_times(scheduler, tmp_path):
+    store = ModelStore(str(tmp_path / 'artifacts'))
+    # The live model learned from hours ten times too long
+    skewed = pd.read_csv(TRAINING_CSV).assign(actual_time=lambda df: df['actual_time'] * 10)
+    scheduler.train_model(skewed)
+    worker = RetrainWorker(scheduler, base_data=None, store=store, min_new_labels=10)
+    assert not worker.should_retrain()
+
+    for i in range(20):
+        task_id, _ = add_sample_task(scheduler, difficulty=1 + i % 5)
+        scheduler.update_actual_time(task_id, 1.0 + i % 5)
+    assert worker.should_retrain()
+
+    old_state = scheduler.state
+    result = worker.retrain_once()
+    assert result['labels'] == 20 and result['holdout'] == 4
+    assert result['accepted'] and result['candidate_mae'] < result['live_mae']
+    assert scheduler.state is not old_state
+    assert store.metadata()['source'] == 'tasks'
+    assert not worker.should_retrain()
+
+    # Labels the live model was trained on are never held out
+    assert len(worker.split(scheduler.get_labeled_tasks())[1]) == 0
+
+    # A candidate that misses the (here impossible) bar is rejected
+    for i in range(20):
+        task_id, _ = add_sample_task(scheduler, difficulty=1 + i % 5)
+        scheduler.update_actual_time(task_id, 1.0 + i * 7 % 9)
+    worker.tolerance = -1
+    live_state = scheduler.state
+    result = worker.retrain_once()
+    assert result['holdout'] == 8 and not result['accepted']
+    assert scheduler.state is live_state and store.metadata()['version'] == 1
+
+    # The holdout is the latest-due rows, whatever order their ids are in
+    labeled = pd.DataFrame({'actual_time': [1.0, 2.0, 3.0, 4.0, 5.0],
+                            'due_at': ['2030-01-05', '2030-01-01', None, '2030-01-04', '2030-01-02']})
+    worker.trained_labels, worker.holdout_fraction = 3, 0.4
+    train, holdout = worker.split(labeled)
+    assert list(holdout['actual_time']) == [4.0, 1.0]
+    assert list(train['actual_time']) == [3.0, 2.0, 5.0]
+
+
+def pandas_insight_numbers(scheduler, user_id):
+    """The figures get_user_insights used to compute with pandas over every task"""
+    with scheduler.connect_db() as conn:
+        df = pd.read_sql_query('SELECT * FROM tasks WHERE user_id = ? AND actual_time IS NOT NULL',
+                               conn, params=(user_id,))
+    error = abs(df['predicted_time'] - df['actual_time'])
+    return {
+        'completed': len(df),
+        'avg_error': error.mean(),
+        'avg_ratio': (df['actual_time'] / df['total_available_time'] * 100).mean(),
+        'best_course': error.groupby(df['course']).mean().idxmin(),
+        'longest_type': df.groupby('task_type')['actual_time'].mean().idxmax(),
+    }
+
+
+def seed_labeled_tasks(scheduler, n=40, seed=0):
+    rng = np.random.default_rng(seed)
+    courses = ["Biology", "Physics", "History"]
+    task_types = ["Quiz", "Project", "Assignment"]
+    for i in range(n):
+        task_id, _ = add_sample_task(
+            scheduler, user_id=1 + i % 2, course=courses[rng.integers(3)],
+            task_type=task_types[rng.integers(3)], difficulty=int(rng.integers(1, 6)),
+            total_available_time=float(rng.integers(2, 12)),
+        )
+        if i % 4 != 3:
+            scheduler.update_actual_time(task_id, float(rng.integers(1, 8)))
+        if i % 5 == 0:
+            scheduler.update_actual_time(task_id, float(rng.integers(1, 8)))
+            scheduler.update_task_status(task_id, 'completed')
+
+
+def test_insights_from_aggregates_match_full_scan(scheduler):
+    seed_labeled_tasks(scheduler)
+    for user_id in (1, 2):
+        expected = pandas_insight_numbers(scheduler, user_id)
+        insights = scheduler.get_user_insights(user_id).split("\n")
+        assert insights[0] == f"You have completed {expected['completed']} tasks."
+        assert insights[1] == f"Average prediction error: {expected['avg_error']:.2f} hours"
+        assert insights[2] == f"On average, you use {expected['avg_ratio']:.1f}% of your available time"
+        assert f"Most accurate predictions are for: {expected['best_course']}" in insights
+        assert any(line.startswith(f"On average, {expected['longest_type']}s take") for line in insights)
+
+    assert scheduler.get_user_insights(3).startswith("No completed tasks yet")
+
+
+def test_rebuild_user_stats_matches_incremental(scheduler):
+    seed_labeled_tasks(scheduler)
+    tables = ['user_stats', 'user_course_stats', 'user_task_type_stats']
+
+    def snapshot():
+        with scheduler.connect_db() as conn:
+            return {t: [tuple(round(v, 6) if isinstance(v, float) else v for v in row)
+                        for row in conn.execute(f'SELECT * FROM {t} WHERE labeled_count > 0 ORDER BY 1, 2')]
+                    for t in tables}
+
+    incremental = snapshot()
+    scheduler.rebuild_user_stats()
+    assert snapshot() == incremental
+
+
+def test_analytics_match_dashboard_frame(scheduler):
+    seed_labeled_tasks(scheduler)
+    data = analytics.compute_analytics(scheduler, 1)
+
+    tasks_df = scheduler.get_dashboard_tasks(1)
+    completed = tasks_df[tasks_df['actual_time'].notna()]
+    assert data['accuracy']['labels'] == completed['course'].tolist()
+    assert data['accuracy']['actual'] == completed['actual_time'].tolist()
+    assert data['utilization']['used'] == pytest.approx(completed['actual_time'].sum())
+    assert data['utilization']['available'] == pytest.approx(completed['total_available_time'].sum())
+    by_type = completed.groupby('task_type')['actual_time'].mean()
+    assert data['taskType']['labels'] == by_type.index.tolist()
+    assert data['taskType']['data'] == pytest.approx(by_type.tolist())
+    assert data['difficulty']['data'] == [
+        {'x': int(d), 'y': float(a)} for d, a in zip(completed['difficulty'], completed['actual_time'])
+    ]
+
+
+def test_analytics_endpoint_revalidates(client, scheduler, monkeypatch):
+    task_id, _ = add_sample_task(scheduler)
+    scheduler.update_actual_time(task_id, 3.0)
+
+    response = client.get('/api/analytics')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert response.get_json()['utilization']['used'] == 3.0
+
+    def fail(*args):
+        raise AssertionError("a 304 must not recompute analytics")
+
+    compute_analytics = analytics.compute_analytics
+    monkeypatch.setattr(analytics, 'compute_analytics', fail)
+    response = client.get('/api/analytics', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    monkeypatch.setattr(analytics, 'compute_analytics', compute_analytics)
+    scheduler.update_actual_time(task_id, 4.0)
+    response = client.get('/api/analytics', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['utilization']['used'] == 4.0
+
+
+def seed_schedule(scheduler, user_id=1):
+    tasks = []
+    for i in range(25):
+        due_date = "2020-01-%02d" % (1 + i % 28) if i % 3 == 0 else "2031-02-%02d" % (1 + i % 28)
+        tasks.append(dict(course="Physics", task_type="Quiz", difficulty=1 + i % 5,
+                          total_available_time=4.0, deadline_days=3, due_date=due_date,
+                          due_time="10:00" if i % 2 else "09:00"))
+    ids = [task_id for task_id, _ in scheduler.add_tasks_bulk(user_id, tasks)]
+    for task_id in ids[::4]:
+        scheduler.update_task_status(task_id, 'completed')
+    add_sample_task(scheduler, user_id=user_id + 1)
+    return ids
+
+
+def test_schedule_pages_cover_everything_in_order(scheduler):
+    seed_schedule(scheduler)
+    now = '2025-06-01 12:00:00'
+    everything = list(scheduler.iter_schedule(1, now=now))
+    assert len(everything) == 25
+    ranks = {'pending': 1, 'overdue': 2, 'completed': 3}
+    assert [(ranks[t['current_status']], t['due_at'], t['id']) for t in everything] == sorted(
+        (ranks[t['current_status']], t['due_at'], t['id']) for t in everything)
+    assert all(t['hours_overdue'] > 0 for t in everything if t['current_status'] == 'overdue')
+
+    paged, cursor = [], None
+    while True:
+        page = list(scheduler.iter_schedule(1, limit=7, cursor=cursor, now=now))
+        paged.extend(page)
+        if len(page) < 7:
+            break
+        cursor = encode_schedule_cursor(now, page[-1])
+    assert [t['id'] for t in paged] == [t['id'] for t in everything]
+
+
+def test_schedule_page_queries_use_index(scheduler):
+    for _, _, condition in SCHEDULE_RANKS:
+        query = SCHEDULE_PAGE_QUERY.format(condition=condition, due_key=SCHEDULE_DUE_KEY)
+        params = {'now': '2025-01-01', 'user_id': 1, 'limit': 10, 'after_due_at': '', 'after_id': 0}
+        plan = query_plan(scheduler, query, params)
+        assert not any(step.startswith('SCAN tasks') for step in plan), plan
+        assert not any('TEMP B-TREE' in step for step in plan), plan
+
+
+def test_schedule_api_streams_ndjson(client, scheduler):
+    ids = seed_schedule(scheduler)
+    # Legacy rows whose due_at could not be computed still list, last within their status
+    with scheduler.connect_db() as conn:
+        conn.execute('UPDATE tasks SET due_at = NULL WHERE id IN (?, ?)', (ids[1], ids[4]))
+    seen, cursor = [], None
+    while True:
+        url = '/api/schedule?limit=10' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(url)
+        assert response.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        seen.extend(lines[:-1])
+        cursor = lines[-1]['next_cursor']
+        if cursor is None:
+            break
+    assert len(seen) == 25 and len({t['id'] for t in seen}) == 25
+    assert all(t['overdue_time'] for t in seen if t['current_status'] == 'overdue')
+    pending = [t['id'] for t in seen if t['current_status'] == 'pending']
+    assert pending[-1] == ids[1]
+    assert [t['id'] for t in seen if t['current_status'] == 'completed'][-1] == ids[4]
+
+    assert client.get('/api/schedule?cursor=garbage').status_code == 400
+    assert client.get('/api/schedule?limit=0').status_code == 400
+
+
+def test_schedule_page_renders_every_task(app_module, client, scheduler, monkeypatch):
+    for i in range(60):
+        add_sample_task(scheduler, due_date="2031-03-%02d" % (1 + i % 28))
+    monkeypatch.setattr(app_module, 'render_template',
+                        lambda name, tasks: json.dumps([task['id'] for task in tasks]))
+    assert sorted(json.loads(client.get('/schedule').get_data(as_text=True))) == list(range(1, 61))
+
+
+def test_model_store_round_trip(scheduler, tmp_path):
+    store = ModelStore(str(tmp_path / 'artifacts'))
+    metadata = store.save(scheduler.state, fingerprint='abc')
+    # Saving never relabels the live state; loading publishes the version
+    assert metadata['version'] == 1 and scheduler.model_version is None
+
+    fresh = SmartScheduler(db_path=scheduler.db_path)
+    store.load(fresh)
+    assert fresh.model_version == 1
+    args = ("Biology", "Quiz", 3, 4.0, 5)
+    assert fresh.predict_time(*args) == pytest.approx(scheduler.predict_time(*args))
+
+
+def test_reloader_swaps_in_versions_saved_elsewhere(scheduler, tmp_path):
+    store = ModelStore(str(tmp_path / 'artifacts'))
+    store.save(scheduler.state)
+    reloader = ModelReloader(scheduler, store)
+    assert reloader.reload_if_changed() == 1
+    assert reloader.reload_if_changed(force=True) is None
+
+    # Another process retrains and saves version 2
+    other = SmartScheduler(db_path=scheduler.db_path)
+    other.train_model(pd.read_csv(TRAINING_CSV).iloc[:15])
+    store.save(other.state)
+    old_state = scheduler.state
+    assert reloader.reload_if_changed() == 2
+    assert scheduler.model_version == 2 and scheduler.state is not old_state
+    assert isinstance(scheduler.forest.value, np.memmap)
+    args = ("Biology", "Quiz", 3, 4.0, 5)
+    assert scheduler.predict_time(*args) == pytest.approx(other.predict_time(*args))
+    assert reloader.reload_if_changed(force=True) is None
+
+
+def test_load_or_train_only_fits_when_data_changes(tmp_path, monkeypatch):
+    data_path = tmp_path / 'training.csv'
+    data_path.write_bytes(open(TRAINING_CSV, 'rb').read())
+    store = ModelStore(str(tmp_path / 'artifacts'))
+    scheduler = SmartScheduler(db_path=str(tmp_path / 'test.db'))
+    assert store.load_or_train(scheduler, str(data_path))['version'] == 1
+
+    def fail(df):
+        raise AssertionError("model should not be retrained")
+
+    monkeypatch.setattr(scheduler, 'train_model', fail)
+    assert store.load_or_train(scheduler, str(data_path))['version'] == 1
+
+    monkeypatch.undo()
+    data_path.write_text(data_path.read_text() + "Physics,Quiz,2,4.0,3,1.1\n")
+    assert store.load_or_train(scheduler, str(data_path))['version'] == 2
+
+
+def test_load_or_train_falls_back_to_sample_data(tmp_path):
+    store = ModelStore(str(tmp_path / 'artifacts'))
+    scheduler = SmartScheduler(db_path=str(tmp_path / 'test.db'))
+    metadata = store.load_or_train(scheduler, str(tmp_path / 'missing.csv'))
+    assert metadata['source'] == 'sample' and scheduler.model_version == 1
+    assert scheduler.predict_time(*benchmark.SAMPLE_TASK) >= 0.5
+    # Once real training data shows up it replaces the sample model
+    assert store.load_or_train(scheduler, TRAINING_CSV)['version'] == 2
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram('demo_seconds', 'Demo', ('route',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, '/a')
+    histogram.observe(0.5, '/a')
+    histogram.observe(5.0, '/a')
+    text = histogram.render()
+    assert 'demo_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{route="/a",le="1.0"} 2' in text
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{route="/a"} 3' in text
+
+
+def test_timed_cursor_counts_fetching_rows(monkeypatch):
+    observed = []
+    monkeypatch.setattr(metrics.SQL_LATENCY, 'observe', lambda value, kind: observed.append((kind, value)))
+    conn = sqlite3.connect(':memory:', factory=TimedConnection)
+    conn.create_function('nap', 0, lambda: time.sleep(0.01) or 1)
+    conn.execute('CREATE TABLE t (x)')
+    conn.executemany('INSERT INTO t VALUES (?)', [(1,), (2,), (3,)])
+    # SQLite steps to the first row on execute; the rest are computed while iterating
+    assert [row for row in conn.execute('SELECT nap() FROM t')] == [(1,)] * 3
+    assert conn.execute('SELECT nap() FROM t').fetchone() == (1,)
+    assert [kind for kind, _ in observed] == ['CREATE', 'INSERT', 'SELECT', 'SELECT']
+    assert observed[2][1] >= 0.03
+    conn.close()
+
+
+def test_metrics_endpoint_reports_hot_paths(client, scheduler):
+    add_sample_task(scheduler, course="Metrics 101")
+    # A streamed response is timed until its body has been sent and closed
+    labels = ('GET', '/api/schedule', 200)
+    before = metrics.REQUEST_LATENCY._series.get(labels, [None, 0])[1]
+    response = client.get('/api/schedule?limit=5')
+    assert metrics.REQUEST_LATENCY._series.get(labels, [None, 0])[1] == before
+    response.get_data()
+    response.close()
+    assert metrics.REQUEST_LATENCY._series[labels][1] == before + 1
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'scheduler_http_request_duration_seconds_count{method="GET",endpoint="/api/schedule",status="200"}' in text
+    assert 'scheduler_sql_statement_duration_seconds_count{statement="INSERT"}' in text
+    assert 'scheduler_inference_duration_seconds_count{stage="forest"}' in text
+    assert 'scheduler_inference_duration_seconds_count{stage="preprocess"}' in text
+    assert 'scheduler_training_duration_seconds_count' in text
+    assert 'scheduler_db_connection_wait_seconds_count' in text
+
+
+def test_benchmark_harness_reports_latency(app_module, scheduler, monkeypatch):
+    user_model = User(db_path=scheduler.db_path)
+    monkeypatch.setattr(app_module, 'scheduler', scheduler)
+    monkeypatch.setattr(app_module, 'user_model', user_model)
+    user_ids = benchmark.seed_database(scheduler, user_model, users=3, tasks_per_user=20)
+    with scheduler.connect_db() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0] == 60
+
+    storage = benchmark.bench_storage(scheduler, user_ids, repeat=5)
+    routes = benchmark.bench_routes(app_module, user_ids, ['/api/schedule'], repeat=5)
+    for result in list(storage.values()) + list(routes.values()):
+        assert result['calls'] == 5
+        assert result['p50_us'] <= result['p99_us']
+    assert routes['/api/schedule']['statuses'] == {'200': 5}
+
+    # The baseline refits private copies of the encoders, never the live ones
+    encoders = {col: list(encoder.classes_) for col, encoder in scheduler.label_encoders.items()}
+    preprocessing = benchmark.bench_feature_pipeline(scheduler, repeat=5)
+    assert preprocessing['dataframe']['calls'] == preprocessing['compiled']['calls'] == 5
+    assert {col: list(e.classes_) for col, e in scheduler.label_encoders.items()} == encoders
+
+
+def test_generated_dataset_is_independent_of_worker_count():
+    single = pd.concat(generate_dataset.iter_chunks(2500, seed=7, users=10, chunk_size=200))
+    # More chunks than the pool may hold in flight, so the bounded queue is exercised
+    pooled = pd.concat(generate_dataset.iter_chunks(2500, seed=7, users=10, chunk_size=200, workers=2))
+    pd.testing.assert_frame_equal(single, pooled)
+    assert len(single) == 2500
+    assert (single['actual_time'] >= 0.5).all()
+    assert (single['actual_time'] <= np.maximum(0.5, single['total_available_time'] * 0.9)).all()
+
+
+def test_generated_sqlite_rows_land_on_each_users_shard(tmp_path):
+    path = str(tmp_path / 'generated.db')
+    chunks = generate_dataset.iter_chunks(600, seed=3, users=12, chunk_size=200)
+    assert generate_dataset.write_sqlite(chunks, path, labeled_fraction=0.5, shards=3) == 600
+
+    scheduler = SmartScheduler(router=storage.ShardRouter.from_count(path, 3))
+    total = 0
+    for shard, db in enumerate(scheduler.router.shards):
+        with db.connection() as conn:
+            users = [row[0] for row in conn.execute('SELECT DISTINCT user_id FROM tasks')]
+            total += conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+        assert all(scheduler.router.shard_for(user_id) == shard for user_id in users)
+    assert total == 600
+
+
+def test_train_from_tasks_reads_compact_chunks(scheduler, tmp_path):
+    seed_labeled_tasks(scheduler, n=40)
+    df = training.load_labeled_tasks(scheduler, chunksize=7)
+    assert len(df) == scheduler.count_labeled_tasks()
+    assert df['course'].dtype == 'category'
+    assert df['total_available_time'].dtype == np.float32
+
+    sampled = training.load_labeled_tasks(scheduler, chunksize=7, fraction=0.5, stratify=['course'])
+    assert 0 < len(sampled) < len(df)
+
+    data_path = tmp_path / 'training.csv'
+    data_path.write_bytes(open(TRAINING_CSV, 'rb').read())
+    store = ModelStore(str(tmp_path / 'artifacts'))
+    report = training.train_from_tasks(scheduler, store, base_data=str(data_path), include_base=False,
+                                       chunksize=7, n_jobs=2)
+    assert report['rows'] == len(df)
+    assert store.metadata()['source'] == 'tasks'
+    assert scheduler.model.n_jobs is None
+    assert scheduler.predict_time(*benchmark.SAMPLE_TASK) >= 0.5
+
+    # Trained without the base CSV: the next start keeps it rather than refitting the CSV
+    fresh = SmartScheduler(db_path=scheduler.db_path)
+    assert store.load_or_train(fresh, str(data_path))['version'] == report['version']
+    assert fresh.predict_time(*benchmark.SAMPLE_TASK) == scheduler.predict_time(*benchmark.SAMPLE_TASK)
+
+    # ...until the CSV changes
+    with open(data_path, 'a') as f:
+        f.write("Biology,Quiz,2,3.0,4,1.5\n")
+    metadata = store.load_or_train(fresh, str(data_path))
+    assert metadata['version'] == report['version'] + 1 and metadata['source'] == str(data_path)
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_backends_serve_and_round_trip(backend, tmp_path):
+    scheduler = SmartScheduler(db_path=str(tmp_path / 'test.db'), backend=backend)
+    store = ModelStore(str(tmp_path / 'artifacts'))
+    store.load_or_train(scheduler, TRAINING_CSV)
+    assert store.metadata()['backend'] == backend
+
+    records = pd.read_csv(TRAINING_CSV).drop(columns='actual_time').to_dict('records')
+    expected = [scheduler.predict_time(**record) for record in records]
+    assert scheduler.predict_many(records) == pytest.approx(expected)
+
+    reloaded = SmartScheduler(db_path=str(tmp_path / 'test.db'), backend=backend)
+    store.load_or_train(reloaded, TRAINING_CSV)
+    assert reloaded.model_version == 1
+    assert [reloaded.predict_time(**record) for record in records] == pytest.approx(expected)
+
+
+def test_evaluate_backends_reports_each_backend():
+    df = pd.read_csv(TRAINING_CSV)
+    results = training.evaluate_backends(df, ['ridge', 'small-forest'], folds=2, repeat=3, batch_size=10)
+    assert set(results) == {'ridge', 'small-forest'}
+    for result in results.values():
+        assert len(result['fold_mae']) == 2
+        assert result['artifact_bytes'] > 0
+        assert result['batch_10']['calls'] == 1
+
+
+PLAN_START = datetime(2030, 1, 7, 9, 0)  # a Monday
+
+
+def test_planner_allocates_earliest_deadline_first():
+    planner = Planner(daily_availability(2, '18:00'), start=PLAN_START).plan([
+        {'id': 1, 'due_at': '2030-01-09 23:59', 'hours': 3},
+        {'id': 2, 'due_at': '2030-01-07 23:59', 'hours': 1.5},
+        {'id': 3, 'due_at': '2030-01-08 12:00', 'hours': 1},
+    ])
+    plan = planner.to_dict()
+    assert [task['id'] for task in plan['tasks']] == [2, 3, 1]
+    assert plan['blocks'] == [
+        {'task_id': 2, 'start': '2030-01-07T18:00', 'end': '2030-01-07T19:30'},
+        {'task_id': 3, 'start': '2030-01-07T19:30', 'end': '2030-01-07T20:00'},
+        {'task_id': 3, 'start': '2030-01-08T18:00', 'end': '2030-01-08T18:30'},
+        {'task_id': 1, 'start': '2030-01-08T18:30', 'end': '2030-01-08T20:00'},
+        {'task_id': 1, 'start': '2030-01-09T18:00', 'end': '2030-01-09T19:30'},
+    ]
+    assert plan['infeasible'] == [3]
+    assert plan['tasks'][1]['late_hours'] == 6.5
+
+
+def test_plan_goes_stale_once_study_time_passes():
+    availability = daily_availability(3, '19:00')
+    planner = Planner(availability, start=PLAN_START)
+    assert planner.is_current(PLAN_START.replace(hour=19))
+    assert not planner.is_current(PLAN_START.replace(hour=19, minute=1))
+    # Started mid-window, the plan books time from its start minute on
+    planner = Planner(availability, start=PLAN_START.replace(hour=20, minute=30))
+    assert planner.is_current(PLAN_START.replace(hour=20, minute=30))
+    assert not planner.is_current(PLAN_START.replace(hour=20, minute=31))
+    # Started after the day's window, it holds until the next one opens
+    planner = Planner(availability, start=PLAN_START.replace(hour=23))
+    assert planner.is_current(PLAN_START + timedelta(days=1, hours=10))
+    assert not planner.is_current(PLAN_START + timedelta(days=1, hours=11))
+
+
+def test_plan_api_replans_from_the_current_time(client, scheduler, monkeypatch):
+    import planner as planner_module
+
+    clock = [PLAN_START]
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock[0]
+
+    monkeypatch.setattr(planner_module, 'datetime', FakeDatetime)
+    add_sample_task(scheduler, due_date="2030-01-20")
+    first = client.get('/api/plan?hours_per_day=3&day_start=19:00').get_json()
+    assert first['start'] == '2030-01-07T09:00'
+    clock[0] = PLAN_START.replace(hour=18)
+    assert client.get('/api/plan?hours_per_day=3&day_start=19:00').get_json() == first
+    clock[0] = PLAN_START.replace(hour=19, minute=30)
+    plan = client.get('/api/plan?hours_per_day=3&day_start=19:00').get_json()
+    assert plan['start'] == '2030-01-07T19:30' and plan['blocks'][0]['start'] == '2030-01-07T19:30'
+
+
+def test_incremental_replanning_matches_full_plan():
+    rng = np.random.default_rng(3)
+    tasks = [
+        {'id': i, 'due_at': (PLAN_START + timedelta(hours=int(rng.integers(1, 24 * 60)))).isoformat(),
+         'hours': float(rng.uniform(0.5, 5))}
+        for i in range(300)
+    ]
+    availability = {0: [(540, 600), (1200, 1320)], 2: [(600, 900)], 5: [(480, 1080)]}
+
+    planner = Planner(availability, start=PLAN_START).plan(tasks[:200])
+    for task in tasks[200:]:
+        planner.add(task)
+    for task_id in range(0, 300, 7):
+        assert planner.complete(task_id)
+    assert not planner.complete(0)
+
+    remaining = [task for task in tasks if task['id'] % 7]
+    assert planner.to_dict() == Planner(availability, start=PLAN_START).plan(remaining).to_dict()
+
+
+def test_plan_api_follows_task_changes(client, scheduler):
+    task_id, _ = add_sample_task(scheduler, due_date="2030-01-20")
+    response = client.get('/api/plan?hours_per_day=3&day_start=19:00')
+    assert response.status_code == 200
+    assert [task['id'] for task in response.get_json()['tasks']] == [task_id]
+
+    new = client.post('/add_task', data=dict(
+        course="Physics", task_type="Quiz", difficulty=2, total_available_time=3,
+        deadline_days=2, due_date="2030-01-10", due_time="12:00",
+    )).get_json()['task_id']
+    client.post(f'/update_status/{task_id}', data={'status': 'completed'})
+    plan = client.get('/api/plan?hours_per_day=3&day_start=19:00').get_json()
+    assert [task['id'] for task in plan['tasks']] == [new]
+    assert client.get('/api/plan?hours_per_day=0').status_code == 400
+
+
+def test_plan_cache_survives_writes_that_bump_the_version_twice(client, scheduler):
+    assert client.get('/api/plan').status_code == 200
+    task = dict(course="Physics", task_type="Quiz", difficulty=2, total_available_time=3,
+                deadline_days=2, due_time="12:00")
+    # A past-due task is also marked overdue by a trigger: two version bumps
+    response = client.post('/add_task', data=dict(task, due_date="2020-01-10"))
+    assert response.status_code == 200
+    response = client.post('/add_task', data=dict(task, due_date="2030-01-10"))
+    assert response.status_code == 200
+    plan = client.get('/api/plan').get_json()
+    assert response.get_json()['task_id'] in [task['id'] for task in plan['tasks']]
+    with scheduler.connect_db() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0] == 2
+
+
+def test_user_rows_are_cached_until_invalidated(scheduler):
+    user = User(db_path=scheduler.db_path)
+    assert user.get_user_by_id(1) is None
+    assert user.create_user('carol', 'secret', 'carol@example.com')
+    row = user.get_user_by_id(1)
+    assert row[1] == 'carol'
+
+    with user.db.transaction() as conn:
+        conn.execute("UPDATE users SET email = 'new@example.com' WHERE id = 1")
+    assert user.get_user_by_id(1)[2] == 'carol@example.com'
+    user.invalidate(1)
+    assert user.get_user_by_id(1)[2] == 'new@example.com'
+
+
+def test_login_stores_identity_in_session(client, app_module, monkeypatch):
+    app_module.user_model.create_user('dave', 'secret', 'dave@example.com')
+    response = client.post('/login', data={'username': 'dave', 'password': 'secret'})
+    assert response.status_code == 302
+    with client.session_transaction() as sess:
+        assert sess['username'] == 'dave'
+
+    def no_lookup(user_id):
+        raise AssertionError('user row looked up on a logged-in request')
+    monkeypatch.setattr(app_module.user_model, 'get_user_by_id', no_lookup)
+    assert client.get('/api/schedule').status_code == 200
+
+
+def test_login_throttle_locks_out_repeated_failures():
+    throttle = auth.LoginThrottle(max_failures=3, window=60)
+    for _ in range(3):
+        assert throttle.retry_after('eve') == 0
+        throttle.record_failure('eve')
+    assert 0 < throttle.retry_after('eve') <= 60
+    assert throttle.retry_after('frank') == 0
+    throttle.record_success('eve')
+    assert throttle.retry_after('eve') == 0
+
+
+def test_password_pool_rejects_when_full():
+    pool = auth.PasswordPool(workers=1, max_pending=1)
+    started, release = threading.Event(), threading.Event()
+
+    def hold_slot():
+        # Runs on the pool, so the only slot is taken while this waits
+        started.set()
+        release.wait(5)
+
+    worker = threading.Thread(target=pool.run, args=(hold_slot,))
+    worker.start()
+    assert started.wait(5)
+    with pytest.raises(auth.Busy):
+        pool.run(lambda: None)
+    release.set()
+    worker.join(5)
+    assert not worker.is_alive()
+    assert pool.check(pool.hash('pw'), 'pw')
+
+
+def test_updates_only_touch_own_tasks(client, scheduler):
+    own, _ = add_sample_task(scheduler, user_id=1)
+    other, _ = add_sample_task(scheduler, user_id=2)
+
+    assert client.post(f'/update_task/{other}', data={'actual_time': '3'}).status_code == 403
+    assert client.post(f'/update_status/{other}', data={'status': 'completed'}).status_code == 403
+    assert client.post(f'/update_status/{own}', data={'status': 'completed'},
+                       headers={'X-Requested-With': 'XMLHttpRequest'}).get_json() == {'success': True}
+    with scheduler.connect_db() as conn:
+        statuses = dict(conn.execute('SELECT id, status FROM tasks').fetchall())
+    assert statuses == {own: 'completed', other: 'pending'}
+
+
+def test_bulk_complete_records_actual_times(client, scheduler):
+    ids = [add_sample_task(scheduler, user_id=1)[0] for _ in range(3)]
+    foreign, _ = add_sample_task(scheduler, user_id=2)
+
+    response = client.post('/api/tasks/complete', json={'tasks': [
+        {'task_id': ids[0], 'actual_time': 2.5},
+        {'task_id': ids[1]},
+        {'task_id': foreign, 'actual_time': 1.0},
+        {'task_id': 9999, 'actual_time': 1.0},
+    ]})
+    assert response.get_json() == {'updated': ids[:2], 'not_found': [foreign, 9999]}
+    with scheduler.connect_db() as conn:
+        rows = conn.execute('SELECT id, status, actual_time FROM tasks ORDER BY id').fetchall()
+    assert rows == [(ids[0], 'completed', 2.5), (ids[1], 'completed', None),
+                    (ids[2], 'pending', None), (foreign, 'pending', None)]
+    assert client.post('/api/tasks/complete', json={'tasks': [{'actual_time': 1}]}).status_code == 400
+
+
+def test_overdue_status_is_stored_and_swept(scheduler):
+    past, _ = add_sample_task(scheduler, due_date="2020-01-01")
+    soon, _ = add_sample_task(scheduler, due_date="2030-01-01")
+    later, _ = add_sample_task(scheduler, due_date="2031-01-01")
+    statuses = lambda: dict(scheduler.get_schedule(1)[['id', 'status']].values.tolist())
+    assert statuses() == {past: 'overdue', soon: 'pending', later: 'pending'}
+    assert scheduler.next_due_at() == '2030-01-01 23:59:00'
+
+    assert scheduler.sweep_overdue(now='2030-06-01 00:00:00', batch_size=1) == 1
+    assert statuses()[soon] == 'overdue'
+    assert scheduler.count_overdue(1) == 2
+
+    with scheduler.db.transaction() as conn:
+        conn.execute("UPDATE tasks SET due_date = '2032-01-01' WHERE id = ?", (past,))
+    assert statuses()[past] == 'pending'
+
+    sweeper = OverdueSweeper(scheduler, max_interval=30)
+    assert sweeper.seconds_until_next_due() == 30
+
+
+def test_status_queries_use_indexes(scheduler):
+    sweep = query_plan(scheduler, "SELECT id FROM tasks WHERE status = 'pending' AND due_at < ? ORDER BY due_at",
+                       ('2030-01-01',))
+    assert any('idx_tasks_status_due' in step for step in sweep), sweep
+    count = query_plan(scheduler, "SELECT COUNT(*) FROM tasks WHERE user_id = ? AND status = 'overdue'", (1,))
+    assert any('COVERING INDEX' in step for step in count), count
+
+
+def test_import_and_export_round_trip(client, scheduler):
+    lines = ['course,task_type,difficulty,total_available_time,deadline_days,due_date,due_time,status,actual_time']
+    lines += [f'History,Quiz,{i % 5 + 1},4.5,3,2030-02-{i % 28 + 1:02d},10:00,,' for i in range(25)]
+    lines += ['History,Quiz,hard,4.5,3,2030-02-01,10:00,,', 'Physics,Exam Preparation,4,8,,2030-03-01,,completed,6.5']
+    upload = {'file': (io.BytesIO('\n'.join(lines).encode()), 'tasks.csv')}
+    response = client.post('/api/tasks/import', data=upload, content_type='multipart/form-data')
+    report = json.loads(response.get_data(as_text=True).strip().splitlines()[-1])
+    assert report['done'] and report['imported'] == 26 and report['failed'] == 1
+    assert report['errors'][0]['line'] == 27
+
+    exported = client.get('/api/tasks/export?format=csv').get_data(as_text=True)
+    rows = list(pd.read_csv(io.StringIO(exported)).itertuples())
+    assert len(rows) == 26
+    assert [row.id for row in rows] == sorted(row.id for row in rows)
+    completed = [row for row in rows if row.status == 'completed']
+    assert len(completed) == 1 and completed[0].actual_time == 6.5
+
+    calendar = client.get('/api/tasks/export?format=ics').get_data(as_text=True)
+    assert calendar.startswith('BEGIN:VCALENDAR\r\n') and calendar.count('BEGIN:VTODO') == 26
+    upload = {'file': (io.BytesIO(calendar.encode()), 'tasks.ics')}
+    with client.session_transaction() as sess:
+        sess['user_id'] = 2
+    response = client.post('/api/tasks/import', data=upload, content_type='multipart/form-data')
+    report = json.loads(response.get_data(as_text=True).strip().splitlines()[-1])
+    assert report['imported'] == 26 and report['failed'] == 0
+    reimported = pd.read_csv(io.StringIO(client.get('/api/tasks/export').get_data(as_text=True)))
+    columns = ['course', 'task_type', 'difficulty', 'due_at', 'status', 'actual_time', 'predicted_time']
+    pd.testing.assert_frame_equal(reimported[columns], pd.read_csv(io.StringIO(exported))[columns])
+
+    response = client.post('/api/tasks/import', data={'file': (io.BytesIO(b'course\nHistory\n'), 'bad.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+
+    # A malformed date fails only its own calendar entry
+    entry = 'BEGIN:VTODO\r\nCATEGORIES:History\r\nSUMMARY:Quiz\r\nX-SCHEDULER-DIFFICULTY:2\r\n' \
+            'X-SCHEDULER-AVAILABLE-HOURS:4\r\nDUE:{}\r\nEND:VTODO\r\n'
+    calendar = 'BEGIN:VCALENDAR\r\n' + entry.format('20300101T100000') + entry.format('2030-01-02') + 'END:VCALENDAR\r\n'
+    with client.session_transaction() as sess:
+        sess['user_id'] = 3
+    upload = {'file': (io.BytesIO(calendar.encode()), 'tasks.ics')}
+    response = client.post('/api/tasks/import', data=upload, content_type='multipart/form-data')
+    report = json.loads(response.get_data(as_text=True).strip().splitlines()[-1])
+    assert report['imported'] == 1 and report['failed'] == 1
+    assert report['errors'] == [{'line': 9, 'error': "invalid due date '2030-01-02' (expected YYYYMMDD or YYYYMMDDTHHMMSS)"}]
+
+
+def test_archive_moves_old_completed_tasks_out_of_the_live_table(scheduler):
+    old_ids = [add_sample_task(scheduler, due_date="2020-01-15")[0] for _ in range(5)]
+    recent_id, _ = add_sample_task(scheduler, due_date="2030-01-15")
+    assert scheduler.complete_tasks(1, [(task_id, 2.0) for task_id in old_ids + [recent_id]])
+    insights = scheduler.get_user_insights(1)
+    labeled = scheduler.count_labeled_tasks()
+
+    assert scheduler.archive_completed(older_than_days=30, batch_size=2) == 5
+    with scheduler.connect_db() as conn:
+        live = [row[0] for row in conn.execute('SELECT id FROM tasks')]
+        archived = [row[0] for row in conn.execute('SELECT id FROM tasks_archive ORDER BY id')]
+    assert live == [recent_id] and archived == old_ids
+    assert [task['id'] for task in scheduler.iter_schedule(1)] == [recent_id]
+
+    # Historical reads span both partitions; aggregates are unchanged
+    assert scheduler.count_labeled_tasks() == labeled == 6
+    assert len(scheduler.get_labeled_tasks()) == 6
+    assert [row[0] for row in scheduler.iter_export_rows(1)] == sorted(old_ids + [recent_id])
+    assert scheduler.get_user_insights(1) == insights
+    scheduler.rebuild_user_stats()
+    assert scheduler.get_user_insights(1) == insights
+    assert scheduler.archive_completed(older_than_days=30) == 0
+
+
+def test_sharded_tasks_route_by_user_and_rebalance(tmp_path):
+    directory = str(tmp_path / 'directory.db')
+    single = SmartScheduler(router=storage.ShardRouter.from_count(directory, 1))
+    single.train_model(pd.read_csv(TRAINING_CSV))
+    for user_id in range(1, 9):
+        for _ in range(3):
+            add_sample_task(single, user_id=user_id)
+        task_id, _ = add_sample_task(single, user_id=user_id, due_date="2020-01-01")
+        single.complete_tasks(user_id, [(task_id, 1.5)])
+    single.archive_completed(older_than_days=30)
+    insights = {user_id: single.get_user_insights(user_id) for user_id in range(1, 9)}
+
+    # Growing the shard count keeps recorded placements until a rebalance
+    sharded = SmartScheduler(router=storage.ShardRouter.from_count(directory, 3))
+    sharded.state = single.state
+    assert all(sharded.router.shard_for(user_id) == 0 for user_id in range(1, 9))
+    assert len(list(sharded.iter_schedule(5))) == 3
+
+    homes = {user_id: storage.hash_shard(user_id, 3) for user_id in range(1, 9)}
+    assert storage.rebalance(sharded) == sum(home != 0 for home in homes.values())
+    for user_id, home in homes.items():
+        assert sharded.router.shard_for(user_id) == home
+        assert user_id in sharded.router.users_on(home)
+        assert len(list(sharded.iter_schedule(user_id))) == 3
+        assert len(list(sharded.iter_export_rows(user_id))) == 4
+        assert sharded.get_user_insights(user_id) == insights[user_id]
+    assert sharded.count_labeled_tasks() == 8
+    assert len(pd.concat(sharded.iter_labeled_tasks(chunksize=3))) == 8
+
+    # New writes land on the user's shard with ids unique across shards
+    new_user = next(user_id for user_id in range(9, 100) if storage.hash_shard(user_id, 3) == 2)
+    task_id, _ = add_sample_task(sharded, user_id=new_user)
+    assert task_id >> storage.SHARD_ID_BITS == 2
+    assert sharded.update_task_status(task_id, 'completed') == 1
+    assert storage.rebalance(sharded) == 0
+
+
+def test_moves_reach_processes_with_stale_placements(tmp_path):
+    directory = str(tmp_path / 'directory.db')
+    mover = SmartScheduler(router=storage.ShardRouter.from_count(directory, 2))
+    mover.train_model(pd.read_csv(TRAINING_CSV))
+    # A second process, with its own placement cache that never expires
+    worker = SmartScheduler(router=storage.ShardRouter.from_count(directory, 2, placement_ttl=3600))
+    worker.state = mover.state
+    add_sample_task(worker, user_id=1)
+    source = worker.router.shard_for(1)
+
+    assert mover.move_user(1, 1 - source) == 1
+    assert worker.router.shard_for(1) == source  # still cached
+    assert len(list(worker.iter_schedule(1))) == 1
+    task_id, _ = add_sample_task(worker, user_id=1)
+    assert task_id >> storage.SHARD_ID_BITS == 1 - source
+    assert worker.router.shard_for(1) == 1 - source
+    assert mover.router.users_on(source) == []
+    assert len(list(mover.iter_schedule(1))) == 2
+
+    # Moving back clears the tombstone on the returning shard
+    assert mover.move_user(1, source) == 2
+    assert len(list(worker.iter_schedule(1))) == 2
+    assert len(list(mover.iter_schedule(1))) == 2
+
+
+def test_interrupted_moves_are_retried_or_recovered(tmp_path, monkeypatch):
+    directory = str(tmp_path / 'directory.db')
+    mover = SmartScheduler(router=storage.ShardRouter.from_count(directory, 2))
+    mover.train_model(pd.read_csv(TRAINING_CSV))
+    for _ in range(3):
+        add_sample_task(mover, user_id=1)
+    source = mover.router.shard_for(1)
+    target = 1 - source
+
+    def count(shard):
+        with mover.router.shards[shard].connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM tasks WHERE user_id = 1').fetchone()[0]
+
+    def crash(user_id, shard):
+        raise RuntimeError("killed mid-move")
+
+    # Dies after the copy committed but before the source was drained
+    monkeypatch.setattr(mover.router, 'place', crash)
+    with pytest.raises(RuntimeError):
+        mover.move_user(1, target)
+    monkeypatch.undo()
+    assert (count(source), count(target)) == (3, 3)
+
+    # Retrying replaces the earlier copy instead of adding to it
+    assert mover.move_user(1, target) == 3
+    assert (count(source), count(target)) == (0, 3)
+    assert len(list(mover.iter_schedule(1))) == 3
+
+    # On startup an unfinished copy is rolled back while the source still routes...
+    monkeypatch.setattr(mover.router, 'place', crash)
+    with pytest.raises(RuntimeError):
+        mover.move_user(1, source)
+    monkeypatch.undo()
+    restarted = SmartScheduler(router=storage.ShardRouter.from_count(directory, 2))
+    assert (count(source), count(target)) == (0, 3)
+    assert restarted.recover_moves() == 0
+    assert len(list(restarted.iter_schedule(1))) == 3
+
+    # ...and finished once the directory already routes to the target
+    with pytest.raises(RuntimeError):
+        monkeypatch.setattr(mover.router, 'place', crash)
+        mover.move_user(1, source)
+    monkeypatch.undo()
+    mover.router.place(1, source)
+    assert mover.recover_moves() == 1
+    assert (count(source), count(target)) == (3, 0)
+    assert len(list(restarted.iter_schedule(1))) == 3
+    with mover.router.shards[source].connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM moves_in').fetchone()[0] == 0
+
+
+# Modules that make importing app.py slow; only the warm-up may load them
+ML_MODULES = {'pandas', 'numpy', 'sklearn', 'scipy', 'joblib'}
+
+
+def test_importing_app_defers_the_ml_stack(tmp_path):
+    env = dict(os.environ, SCHEDULER_DB=str(tmp_path / 'app.db'), SCHEDULER_WARMUP='off')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=HERE, env=env, capture_output=True, text=True, check=True)
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        fields = line.removeprefix('import time:').split('|')
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            cumulative[fields[2].strip()] = int(fields[1])
+    assert 'app' in cumulative
+    assert not {name.split('.')[0] for name in cumulative} & ML_MODULES
+
+
+def test_readiness_tracks_warmup(client, app_module, monkeypatch):
+    gate = threading.Event()
+    warmup = Warmup([('model', gate.wait)])
+    monkeypatch.setattr(app_module, 'warmup', warmup)
+    monkeypatch.setattr(app_module, 'WARMUP_WAIT', 0)
+    warmup.start()
+
+    assert client.get('/healthz').status_code == 200
+    response = client.get('/readyz')
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'warming' and response.get_json()['step'] == 'model'
+    response = client.get('/api/schedule')
+    assert response.status_code == 503 and response.headers['Retry-After'] == '1'
+    # Logged-out visitors are sent to log in rather than told to retry
+    with client.session_transaction() as sess:
+        sess.clear()
+    response = client.get('/api/schedule')
+    assert response.status_code == 302 and response.headers['Location'].endswith('/login')
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+
+    gate.set()
+    assert warmup.wait(5)
+    response = client.get('/readyz')
+    assert response.status_code == 200 and response.get_json()['status'] == 'ready'
+    assert client.get('/api/schedule').status_code == 200
+
+
+def test_failed_model_load_fails_readiness(client, app_module, monkeypatch):
+    def broken(self, scheduler, data_path):
+        raise OSError("artifact store unreadable")
+
+    monkeypatch.setattr(ModelStore, 'load_or_train', broken)
+    monkeypatch.setattr(app_module, 'model_store', app_module.model_store)  # load_model replaces it
+    warmup = Warmup([('model', app_module.load_model)])
+    monkeypatch.setattr(app_module, 'warmup', warmup)
+    monkeypatch.setattr(app_module, 'WARMUP_WAIT', 0)
+    warmup.run()
+
+    response = client.get('/readyz')
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'failed'
+    assert response.get_json()['error'] == 'model: artifact store unreadable'
+    assert client.get('/api/schedule').status_code == 503
+
 
 def main():
     # Initialize the scheduler
     scheduler = SmartScheduler()
-    
+
     # Load the real training data
     print("Loading training data...")
     training_data = pd.read_csv('training_data.csv')
-    
+
     # Train the model with real data
     print("Training model...")
     scheduler.train_model(training_data)
-    
+
     # Add a test task
     print("\nAdding a test task...")
     task_id, predicted_time = scheduler.add_task(
+        user_id=1,
         course="Computer Science",
         task_type="Assignment",
         difficulty=3,
         total_available_time=5,
-        deadline_days=7
+        deadline_days=7,
+        due_date="2030-01-15",
+        due_time="23:59"
     )
-    
+
     print(f"Task ID: {task_id}")
     print(f"Predicted time needed: {predicted_time:.2f} hours")
-    
+
     # Simulate completing the task
     print("\nUpdating with actual completion time...")
     scheduler.update_actual_time(task_id, 4.5)
-    
+
     # Get insights
     print("\nGetting insights...")
-    insights = scheduler.get_user_insights()
+    insights = scheduler.get_user_insights(1)
     print(insights)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,20 @@
+# timing.py
+import time
+
+
+def time_call(fn, repeat=1000):
+    """Per-call latency of fn in microseconds, plus throughput"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    total = sum(samples)
+    return {
+        'calls': repeat,
+        'mean_us': round(total / repeat, 2),
+        'p50_us': round(samples[repeat // 2], 2),
+        'p99_us': round(samples[min(repeat - 1, int(repeat * 0.99))], 2),
+        'throughput_per_s': round(repeat / (total / 1e6), 1) if total else None,
+    }
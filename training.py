@@ -0,0 +1,143 @@
+# training.py
+import io
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from backends import BACKENDS, make_model
+from feature_pipeline import CATEGORICAL_FEATURES, FEATURES
+from model_store import fingerprint_file
+from retrainer import mean_absolute_error
+from smart_scheduler import ModelState
+from timing import time_call
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def peak_memory_mb():
+    """Peak resident set size of this process in MiB, or None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return round(peak / (1 << 20 if os.uname().sysname == 'Darwin' else 1 << 10), 1)
+
+
+def sample_chunk(chunk, fraction, stratify=None, rng=None):
+    """Keep `fraction` of a chunk, optionally the same fraction of every stratum"""
+    if fraction >= 1:
+        return chunk
+    rng = rng or np.random.default_rng()
+    if not stratify:
+        return chunk[rng.random(len(chunk)) < fraction]
+    return chunk.groupby(stratify, observed=True, group_keys=False).sample(frac=fraction, random_state=rng)
+
+
+def concat_chunks(chunks):
+    """Concatenate chunks, keeping categorical columns categorical"""
+    if not chunks:
+        return pd.DataFrame()
+    df = pd.concat(chunks, ignore_index=True)
+    for col in CATEGORICAL_FEATURES:
+        # pandas falls back to object when chunk categories differ
+        df[col] = union_categoricals([chunk[col] for chunk in chunks])
+    return df
+
+
+def load_labeled_tasks(scheduler, chunksize=100000, fraction=1.0, stratify=None, seed=42):
+    """Labeled tasks read chunk by chunk with compact dtypes, optionally subsampled"""
+    rng = np.random.default_rng(seed)
+    return concat_chunks([
+        sample_chunk(chunk, fraction, stratify, rng)
+        for chunk in scheduler.iter_labeled_tasks(chunksize)
+    ])
+
+
+def train_from_tasks(scheduler, store, base_data=None, chunksize=100000, fraction=1.0,
+                     stratify=None, n_jobs=-1, seed=42, include_base=True):
+    """Fit on the tasks table (plus the base CSV), publish and save; returns a report.
+
+    With include_base=False the CSV is left out of training but still
+    fingerprinted, so the app refits once the CSV changes.
+    """
+    started = time.perf_counter()
+    df = load_labeled_tasks(scheduler, chunksize, fraction, stratify, seed)
+    fingerprint = None
+    if base_data is not None and os.path.exists(base_data):
+        fingerprint = fingerprint_file(base_data)
+        if include_base:
+            df = pd.concat([pd.read_csv(base_data), df], ignore_index=True)
+    if len(df) == 0:
+        raise ValueError("No labeled tasks to train on")
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    state = scheduler.fit_state(df, n_jobs=n_jobs)
+    fit_seconds = time.perf_counter() - started
+
+    # Keyed to the base CSV so the app loads this model until the CSV changes
+    metadata = store.publish(scheduler, state, fingerprint=fingerprint, source='tasks')
+    return {
+        'rows': len(df),
+        'load_seconds': round(load_seconds, 2),
+        'fit_seconds': round(fit_seconds, 2),
+        'peak_memory_mb': peak_memory_mb(),
+        'version': metadata['version'],
+    }
+
+
+def time_ordered_splits(n_rows, folds=3, min_train=0.4):
+    """Expanding-window (train, test) index ranges; test data is always newer"""
+    start = int(n_rows * min_train)
+    step = (n_rows - start) // folds
+    if start == 0 or step == 0:
+        raise ValueError(f"Need more labeled rows to evaluate {folds} folds (have {n_rows})")
+    for fold in range(folds):
+        cut = start + fold * step
+        yield slice(0, cut), slice(cut, cut + step if fold < folds - 1 else n_rows)
+
+
+def artifact_bytes(state):
+    """Size of a state's saved payload, as ModelStore would write it"""
+    buffer = io.BytesIO()
+    joblib.dump({
+        'model': state.model,
+        'label_encoders': state.label_encoders,
+        'scaler': state.scaler,
+        'forest': state.forest.arrays(),
+    }, buffer)
+    return buffer.tell()
+
+
+def evaluate_backends(df, backends=None, folds=3, repeat=200, batch_size=1000):
+    """Replay labeled history through each backend: MAE, fit time, size and latency"""
+    backends = backends or list(BACKENDS)
+    results = {}
+    for name in backends:
+        errors, fit_seconds = [], []
+        for train, test in time_ordered_splits(len(df), folds):
+            started = time.perf_counter()
+            state = ModelState.fit(df.iloc[train], make_model(name))
+            fit_seconds.append(time.perf_counter() - started)
+            errors.append(mean_absolute_error(state, df.iloc[test]))
+
+        # Size and latency of the model refit on all rows, as it would be served
+        state = ModelState.fit(df, make_model(name))
+        features = state.pipeline.transform_row(*df[FEATURES].iloc[-1].tolist())
+        batch = state.pipeline.transform_frame(df[FEATURES].iloc[-batch_size:])
+        results[name] = {
+            'mae': round(float(np.mean(errors)), 4),
+            'fold_mae': [round(e, 4) for e in errors],
+            'fit_seconds': round(float(np.mean(fit_seconds)), 4),
+            'artifact_bytes': artifact_bytes(state),
+            'single_row': time_call(lambda: state.forest.predict_row(features), repeat),
+            f'batch_{len(batch)}': time_call(lambda: state.forest.predict(batch), max(1, repeat // 10)),
+        }
+    return results
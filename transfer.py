@@ -0,0 +1,268 @@
+# transfer.py
+import csv
+import io
+import re
+from datetime import date, datetime, time, timezone
+
+import pandas as pd
+
+from smart_scheduler import EXPORT_COLUMNS, TASK_STATUSES
+
+# Columns add_tasks_bulk consumes; the rest of an import file is ignored
+IMPORT_COLUMNS = [
+    'course', 'task_type', 'difficulty', 'total_available_time', 'deadline_days',
+    'due_date', 'due_time', 'status', 'actual_time',
+]
+REQUIRED_CSV_COLUMNS = {'course', 'task_type', 'difficulty', 'total_available_time', 'due_date'}
+
+# Rows predicted and inserted per transaction (fits the compiled forest's batch size)
+IMPORT_CHUNK_SIZE = 1000
+# Row errors kept in an import report; later ones are only counted
+MAX_REPORTED_ERRORS = 100
+
+FORMATS = ('csv', 'ics')
+
+# Task fields carried in iCalendar extension properties
+ICS_PROPERTIES = {
+    'X-SCHEDULER-COURSE': 'course',
+    'X-SCHEDULER-TASK-TYPE': 'task_type',
+    'X-SCHEDULER-DIFFICULTY': 'difficulty',
+    'X-SCHEDULER-AVAILABLE-HOURS': 'total_available_time',
+    'X-SCHEDULER-DEADLINE-DAYS': 'deadline_days',
+    'X-SCHEDULER-PREDICTED-HOURS': 'predicted_time',
+    'X-SCHEDULER-ACTUAL-HOURS': 'actual_time',
+}
+ICS_COMPONENTS = ('VTODO', 'VEVENT')
+ICS_ESCAPE = re.compile(r'\\([\\;,nN])')
+
+
+def guess_format(filename, default='csv'):
+    """'ics' or 'csv' from a file name's extension"""
+    return 'ics' if str(filename or '').lower().endswith(('.ics', '.ical')) else default
+
+
+def _blank(value):
+    return value is None or str(value).strip() == ''
+
+
+def parse_task(record, today=None):
+    """Validate one imported record into an IMPORT_COLUMNS tuple; raises ValueError"""
+    if record.get('ics_due'):
+        record = dict(record)
+        record['due_date'], record['due_time'] = _ics_due(record.pop('ics_due'))
+    for column in REQUIRED_CSV_COLUMNS:
+        if _blank(record.get(column)):
+            raise ValueError(f"missing {column}")
+    due_date = date.fromisoformat(record['due_date'].strip())
+    if _blank(record.get('due_time')):
+        due_time = '23:59'
+    else:
+        due_time = time.fromisoformat(record['due_time'].strip()).strftime('%H:%M')
+    if _blank(record.get('deadline_days')):
+        deadline_days = max(0, (due_date - (today or date.today())).days)
+    else:
+        deadline_days = int(record['deadline_days'])
+    status = 'pending' if _blank(record.get('status')) else record['status'].strip().lower()
+    if status not in TASK_STATUSES:
+        raise ValueError(f"unknown status {status!r}")
+    actual_time = None if _blank(record.get('actual_time')) else float(record['actual_time'])
+    return (
+        record['course'].strip(), record['task_type'].strip(), int(record['difficulty']),
+        float(record['total_available_time']), deadline_days, due_date.isoformat(), due_time,
+        status, actual_time,
+    )
+
+
+def read_csv_tasks(stream):
+    """(line number, record) pairs from a CSV text stream with a header row.
+
+    The header is checked immediately; rows are read lazily.
+    """
+    reader = csv.DictReader(stream)
+    missing = REQUIRED_CSV_COLUMNS - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+    return ((reader.line_num, record) for record in reader)
+
+
+def _ics_unescape(value):
+    return ICS_ESCAPE.sub(lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+
+
+def _ics_escape(value):
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+
+def _ics_lines(stream):
+    """Unfolded iCalendar content lines as (line number, line)"""
+    start, current = 0, None
+    for number, line in enumerate(stream, 1):
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield start, current
+        start, current = number, line
+    if current:
+        yield start, current
+
+
+def _ics_due(value):
+    """(due_date, due_time) from an iCalendar DATE or DATE-TIME value; raises ValueError"""
+    try:
+        if len(value) == 8:
+            return datetime.strptime(value, '%Y%m%d').date().isoformat(), '23:59'
+        moment = datetime.strptime(value[:15], '%Y%m%dT%H%M%S')
+    except ValueError:
+        raise ValueError(f"invalid due date {value!r} (expected YYYYMMDD or YYYYMMDDTHHMMSS)") from None
+    if value.endswith('Z'):
+        moment = moment.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    return moment.date().isoformat(), moment.strftime('%H:%M')
+
+
+def _ics_record(properties):
+    """Import record for one VTODO/VEVENT, falling back to standard properties"""
+    record = {field: properties[name] for name, field in ICS_PROPERTIES.items() if name in properties}
+    if 'course' not in record and 'CATEGORIES' in properties:
+        record['course'] = properties['CATEGORIES'].split(',')[0]
+    if 'task_type' not in record and 'SUMMARY' in properties:
+        record['task_type'] = properties['SUMMARY']
+    due = properties.get('DUE') or properties.get('DTEND') or properties.get('DTSTART')
+    if due:
+        # Parsed with the rest of the row in parse_task, so a bad date fails only its own task
+        record['ics_due'] = due
+    if properties.get('STATUS', '').upper() == 'COMPLETED':
+        record['status'] = 'completed'
+    return record
+
+
+def read_ics_tasks(stream):
+    """(line number, record) pairs for the VTODO and VEVENT components of a calendar"""
+    properties = None
+    for number, line in _ics_lines(stream):
+        name, _, value = line.partition(':')
+        name = name.split(';', 1)[0].upper()
+        if name == 'BEGIN' and value.upper() in ICS_COMPONENTS:
+            properties, start = {}, number
+        elif properties is None:
+            continue
+        elif name == 'END' and value.upper() in ICS_COMPONENTS:
+            yield start, _ics_record(properties)
+            properties = None
+        elif name not in properties:
+            properties[name] = _ics_unescape(value)
+
+
+def read_tasks(stream, fmt):
+    """Import records from a text stream in the given format"""
+    if fmt == 'ics':
+        return read_ics_tasks(stream)
+    return read_csv_tasks(stream)
+
+
+def iter_import(scheduler, user_id, records, chunk_size=IMPORT_CHUNK_SIZE, today=None):
+    """Validate, predict and insert streamed records, one chunk at a time.
+
+    Each chunk is predicted in one vectorized pass and inserted in its own
+    transaction, so memory stays flat however long the file is. Invalid
+    rows are skipped and reported by line number. Yields the running
+    report after every chunk; the last one is final.
+    """
+    report = {'rows': 0, 'imported': 0, 'failed': 0, 'errors': []}
+    chunk = []
+    for line, record in records:
+        report['rows'] += 1
+        try:
+            chunk.append(parse_task(record, today))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            report['failed'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append({'line': line, 'error': str(e)})
+        if len(chunk) >= chunk_size:
+            scheduler.add_tasks_bulk(user_id, pd.DataFrame.from_records(chunk, columns=IMPORT_COLUMNS))
+            report['imported'] += len(chunk)
+            chunk.clear()
+            yield report
+    if chunk:
+        scheduler.add_tasks_bulk(user_id, pd.DataFrame.from_records(chunk, columns=IMPORT_COLUMNS))
+        report['imported'] += len(chunk)
+    yield report
+
+
+def import_tasks(scheduler, user_id, records, chunk_size=IMPORT_CHUNK_SIZE, progress=None, today=None):
+    """Run iter_import to the end, calling `progress(report)` after each chunk"""
+    for report in iter_import(scheduler, user_id, records, chunk_size, today):
+        if progress is not None:
+            progress(report)
+    return report
+
+
+def iter_csv_export(rows, batch_size=500):
+    """CSV text for exported task rows, yielded a batch of rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _fold(line):
+    """An iCalendar content line folded at 75 octets, with CRLF"""
+    if len(line.encode()) <= 75:
+        return line + '\r\n'
+    parts, part, size = [], '', 0
+    for char in line:
+        width = len(char.encode())
+        if size + width > 75:
+            parts.append(part)
+            part, size = '', 1
+        part += char
+        size += width
+    parts.append(part)
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _ics_time(due_at):
+    return datetime.fromisoformat(due_at).strftime('%Y%m%dT%H%M%S')
+
+
+def iter_ics_export(rows, batch_size=500):
+    """An iCalendar of VTODOs for exported task rows, yielded in batches"""
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Smart Scheduler//Tasks//EN']
+    for count, row in enumerate(rows, 1):
+        task = dict(zip(EXPORT_COLUMNS, row))
+        lines += [
+            'BEGIN:VTODO',
+            f"UID:task-{task['id']}@smart-scheduler",
+            f'DTSTAMP:{stamp}',
+            f"SUMMARY:{_ics_escape(task['course'])} - {_ics_escape(task['task_type'])}",
+            f"CATEGORIES:{_ics_escape(task['course'])}",
+            'STATUS:' + ('COMPLETED' if task['status'] == 'completed' else 'NEEDS-ACTION'),
+        ]
+        if task['due_at']:
+            lines.append(f"DUE:{_ics_time(task['due_at'])}")
+        lines += [
+            f'{name}:{_ics_escape(task[field])}'
+            for name, field in ICS_PROPERTIES.items() if task[field] is not None
+        ]
+        lines.append('END:VTODO')
+        if count % batch_size == 0:
+            yield ''.join(_fold(line) for line in lines)
+            lines = []
+    lines.append('END:VCALENDAR')
+    yield ''.join(_fold(line) for line in lines)
+
+
+def iter_export(rows, fmt):
+    """Export text chunks for task rows in the given format"""
+    if fmt == 'ics':
+        return iter_ics_export(rows)
+    return iter_csv_export(rows)
@@ -0,0 +1,68 @@
+# warmup.py
+import threading
+import time
+
+
+class Warmup(threading.Thread):
+    """Background thread that runs the app's slow startup steps in order.
+
+    Each step is a (name, callable) pair. The app serves requests that do
+    not need the steps while they run; `wait()` blocks those that do, and
+    `status()` reports progress for the readiness check. A failing step
+    stops the warm-up and is reported as the error.
+    """
+
+    def __init__(self, steps):
+        super().__init__(name='warmup', daemon=True)
+        self.steps = list(steps)
+        self.step = None
+        self.error = None
+        self.timings = {}
+        self.started_at = None
+        self.finished_at = None
+        self._ready = threading.Event()
+        self._finished = threading.Event()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        """Block until warm-up finishes; True if it succeeded"""
+        self._finished.wait(timeout)
+        return self.ready
+
+    def status(self):
+        """Warm-up state for /readyz"""
+        if self.ready:
+            state = 'ready'
+        elif self.error is not None:
+            state = 'failed'
+        elif self.started_at is None:
+            state = 'pending'
+        else:
+            state = 'warming'
+        status = {'status': state, 'step': self.step, 'timings': dict(self.timings)}
+        if self.started_at is not None:
+            status['elapsed'] = round((self.finished_at or time.perf_counter()) - self.started_at, 3)
+        if self.error is not None:
+            status['error'] = self.error
+        return status
+
+    def run(self):
+        """Run every step; call directly to warm up synchronously"""
+        self.started_at = time.perf_counter()
+        try:
+            for name, step in self.steps:
+                self.step = name
+                start = time.perf_counter()
+                step()
+                self.timings[name] = round(time.perf_counter() - start, 3)
+            self.step = None
+            self._ready.set()
+        except Exception as e:
+            self.error = f'{self.step}: {e}'
+            print(f"Warning: warm-up failed during {self.error}")
+        finally:
+            self.finished_at = time.perf_counter()
+            self._finished.set()